@@ -19,3 +19,4 @@ HEAD_OF_MAPPING_ADDED_TO_COLLECTION = 'Added the latest versions of mapping to t
                                       'Future updates will not be added automatically.'
 CONCEPT_ADDED_TO_COLLECTION_FMT = 'The concept {} is successfully added to collection {}'
 MAPPING_ADDED_TO_COLLECTION_FMT = 'The mapping {} is successfully added to collection {}'
+ASYNC_REFERENCES_THRESHOLD = 100
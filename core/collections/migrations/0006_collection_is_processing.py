@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2020-07-28 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collections', '0005_collection_export_etag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='is_processing',
+            field=models.BooleanField(default=False),
+        ),
+    ]
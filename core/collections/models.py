@@ -1,11 +1,9 @@
-import json
-
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.db import models, transaction, connection
 from django.db.models import UniqueConstraint
+from django.urls import resolve, Resolver404
 from django.utils import timezone
-from pydash import compact
-from rest_framework.test import APIRequestFactory
+from pydash import compact, get
 
 from core.collections.constants import (
     COLLECTION_TYPE, EXPRESSION_INVALID, EXPRESSION_RESOURCE_URI_PARTS_COUNT,
@@ -15,14 +13,12 @@ from core.collections.constants import (
     CONCEPT_PREFERRED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE, ALL_SYMBOL)
 from core.collections.utils import is_concept, is_mapping, concepts_for, drop_version
 from core.common.constants import (
-    DEFAULT_REPOSITORY_TYPE, CUSTOM_VALIDATION_SCHEMA_OPENMRS, ACCESS_TYPE_VIEW, ACCESS_TYPE_EDIT
+    DEFAULT_REPOSITORY_TYPE, CUSTOM_VALIDATION_SCHEMA_OPENMRS, ACCESS_TYPE_VIEW, ACCESS_TYPE_EDIT, HEAD
 )
 from core.common.models import ConceptContainerModel
-from core.common.utils import reverse_resource, is_valid_uri
-from core.concepts.models import Concept
-from core.concepts.views import ConceptListView
+from core.common.utils import reverse_resource, is_valid_uri, get_query_params_from_url_string
+from core.concepts.models import Concept, LocalizedText
 from core.mappings.models import Mapping
-from core.mappings.views import MappingListView
 
 
 class Collection(ConceptContainerModel):
@@ -52,11 +48,11 @@ class Collection(ConceptContainerModel):
     references = models.ManyToManyField('collections.CollectionReference', blank=True, related_name='collections')
 
     @classmethod
-    def get_base_queryset(cls, params):
+    def get_base_queryset(cls, params, requesting_user=None):
         collection = params.pop('collection', None)
         contains_uri = params.pop('contains', None)
         include_references = params.pop('include_references', None)
-        queryset = super().get_base_queryset(params)
+        queryset = super().get_base_queryset(params, requesting_user)
         if collection:
             queryset = queryset.filter(mnemonic=collection)
         if contains_uri:
@@ -159,53 +155,80 @@ class Collection(ConceptContainerModel):
                 raise ValidationError(validation_error)
 
     @staticmethod
-    def __get_children_uris(url, view_klass):
-        view = view_klass.as_view()
-        request = APIRequestFactory().get(url)
-        response = view(request)
-        response.render()
-        data = json.loads(response.content)
-        return [child['url'] for child in data]
-
-    def __get_expressions_from(self, expressions, url, view_klass):
-        if expressions == ALL_SYMBOL:
-            return self.__get_children_uris(url, view_klass)
-
-        return expressions
-
-    @staticmethod
-    def __get_children_list_url(child_type, host_url, data):
-        return "{host_url}{uri}{child_type}?q={search_term}&limit=0".format(
-            host_url=host_url, uri=data.get('uri'), child_type=child_type, search_term=data.get('search_term', '')
-        )
+    def __get_container(uri):
+        from core.sources.models import Source
+        try:
+            kwargs = get(resolve(uri), 'kwargs', dict())
+        except Resolver404:
+            return None
+
+        kwargs['version'] = kwargs.get('version', None) or HEAD
+        klass = Collection if 'collection' in kwargs else Source
+        return klass.get_base_queryset(kwargs).first()
+
+    def __get_all_children_references(self, data, field_name):
+        """
+        Expands ALL_SYMBOL to the concepts/mappings of the repo at data['uri'] (optionally matching
+        data['search_term']) with one query, returning references that need no further resolution.
+        """
+        container = self.__get_container(data.get('uri', None) or '')
+        if not container:
+            return []
+
+        is_concept_field = field_name == 'concepts'
+        queryset = container.get_concepts_queryset() if is_concept_field else container.get_mappings_queryset()
+        queryset = queryset.filter(is_active=True, retired=False)
+        if not isinstance(container, Collection):
+            queryset = queryset.filter(is_latest_version=True)
+
+        search_term = data.get('search_term', None)
+        if search_term:
+            queryset = queryset.filter(
+                models.Q(mnemonic__icontains=search_term) | models.Q(names__name__icontains=search_term)
+                if is_concept_field else
+                models.Q(from_concept__mnemonic__icontains=search_term) |
+                models.Q(to_concept__mnemonic__icontains=search_term) |
+                models.Q(to_concept_code__icontains=search_term)
+            ).distinct()
+
+        references = []
+        for child in queryset.only('id', 'uri'):
+            reference = CollectionReference(expression=child.uri)
+            reference.original_expression = child.uri
+            reference.concepts = [child] if is_concept_field else []
+            reference.mappings = [] if is_concept_field else [child]
+            references.append(reference)
+
+        return references
 
     @transaction.atomic
-    def add_expressions(self, data, host_url, user, cascade_mappings=False):
+    def add_expressions(self, data, user, cascade_mappings=False):
         expressions = data.get('expressions', [])
-        concept_expressions = data.get('concepts', [])
-        mapping_expressions = data.get('mappings', [])
+        references = []
+        for field_name in ['concepts', 'mappings']:
+            field_expressions = data.get(field_name, [])
+            if field_expressions == ALL_SYMBOL:
+                references += self.__get_all_children_references(data, field_name)
+            else:
+                expressions.extend(field_expressions)
 
-        expressions.extend(
-            self.__get_expressions_from(
-                concept_expressions, self.__get_children_list_url('concepts', host_url, data), ConceptListView
-            )
-        )
-        expressions.extend(
-            self.__get_expressions_from(
-                mapping_expressions, self.__get_children_list_url('mappings', host_url, data), MappingListView
-            )
-        )
         if cascade_mappings:
-            all_related_mappings = self.get_all_related_mappings(expressions)
+            all_related_mappings = self.get_all_related_mappings(
+                expressions + [reference.expression for reference in references]
+            )
             expressions += all_related_mappings
 
-        return self.add_references_in_bulk(expressions, user)
+        return self.add_references_in_bulk(expressions, user, references)
 
-    def add_references_in_bulk(self, expressions, user=None):  # pylint: disable=too-many-locals  # Fixme: Sny
+    def add_references_in_bulk(self, expressions, user=None, references=None):
+        """
+        references: already resolved references (e.g. built from a queryset), they skip expression resolution.
+        """
         errors = {}
         collection_version = self.head
+        references = references or []
 
-        new_expressions = set(expressions)
+        new_expressions = set(expressions) | {reference.expression for reference in references}
         new_versionless_expressions = {drop_version(expression): expression for expression in new_expressions}
         for reference in collection_version.references.all():
             existing_versionless_expression = reference.without_version
@@ -214,43 +237,26 @@ class Collection(ConceptContainerModel):
                 new_expressions.discard(existing_expression)
                 errors[existing_expression] = [REFERENCE_ALREADY_EXISTS]
 
-        added_references = list()
-        for expression in new_expressions:
-            ref = CollectionReference(expression=expression)
-            try:
-                ref.clean()
-                ref.save()
-            except Exception as ex:
-                errors[expression] = ex.messages if hasattr(ex, 'messages') else ex
-                continue
+        references = [reference for reference in references if reference.expression in new_expressions]
+        resolved_references, resolution_errors = CollectionReference.resolve_in_bulk(
+            new_expressions - {reference.expression for reference in references}
+        )
+        references += resolved_references
+        errors.update(resolution_errors)
 
-            added = False
-            if ref.concepts:
-                for concept in ref.concepts:
-                    if self.custom_validation_schema == CUSTOM_VALIDATION_SCHEMA_OPENMRS:
-                        try:
-                            self.check_concept_uniqueness_in_collection_and_locale_by_name_attribute(
-                                concept, attribute='is_fully_specified', value=True,
-                                error_message=CONCEPT_FULLY_SPECIFIED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE
-                            )
-                            self.check_concept_uniqueness_in_collection_and_locale_by_name_attribute(
-                                concept, attribute='locale_preferred', value=True,
-                                error_message=CONCEPT_PREFERRED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE
-                            )
-                        except Exception as ex:
-                            errors[expression] = ex.messages if hasattr(ex, 'messages') else ex
-                            continue
-                    collection_version.add_concept(concept)
-                    added = True
-            if ref.mappings:
-                for mapping in ref.mappings:
-                    collection_version.add_mapping(mapping)
-                    added = True
-
-            if added:
-                collection_version.references.add(ref)
-                self.references.add(ref)
-                added_references.append(ref)
+        if self.custom_validation_schema == CUSTOM_VALIDATION_SCHEMA_OPENMRS:
+            errors.update(collection_version.exclude_concepts_with_non_unique_names(references))
+
+        added_references = [ref for ref in references if ref.concepts or ref.mappings]
+        CollectionReference.objects.bulk_create(added_references)
+        collection_version.add_links_in_bulk(
+            'concepts', {concept.id for ref in added_references for concept in ref.concepts}
+        )
+        collection_version.add_links_in_bulk(
+            'mappings', {mapping.id for ref in added_references for mapping in ref.mappings}
+        )
+        collection_version.references.add(*added_references)
+        self.references.add(*added_references)
 
         if user:
             collection_version.updated_by = user
@@ -259,6 +265,88 @@ class Collection(ConceptContainerModel):
         self.save()
         return added_references, errors
 
+    def add_links_in_bulk(self, field_name, ids):
+        if not ids:
+            return
+        field = self._meta.get_field(field_name)
+        through = field.remote_field.through
+        column, reverse_column = field.m2m_field_name() + '_id', field.m2m_reverse_field_name() + '_id'
+        new_ids = set(ids) - set(
+            through.objects.filter(**{column: self.id, reverse_column + '__in': ids}).values_list(
+                reverse_column, flat=True
+            )
+        )
+        through.objects.bulk_create(
+            [through(**{column: self.id, reverse_column: _id}) for _id in new_ids], ignore_conflicts=True
+        )
+        self.track_children_counts(field.related_model.objects.filter(id__in=new_ids))
+
+    def exclude_concepts_with_non_unique_names(self, references):
+        """
+        Drops from each reference the concepts whose fully specified or preferred names clash, per locale, with
+        the ones of concepts already in the collection or added before them. Names are fetched in bulk.
+        """
+        errors = {}
+        concept_ids = {concept.id for ref in references for concept in ref.concepts}
+        rules = [
+            ('is_fully_specified', CONCEPT_FULLY_SPECIFIED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE),
+            ('locale_preferred', CONCEPT_PREFERRED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE),
+        ]
+        rules = [
+            (
+                self.__get_names_by_concept(attribute, concept_ids),
+                self.__get_concepts_by_name(attribute, self.concepts.values('id')),
+                error_message
+            ) for attribute, error_message in rules
+        ]
+
+        for ref in references:
+            unique_concepts = []
+            for concept in ref.concepts:
+                error_message = self.__get_non_unique_name_error(concept, rules)
+                if error_message:
+                    errors[ref.expression] = [error_message]
+                    continue
+                for new_names, collection_names, _ in rules:
+                    for name_key in new_names.get(concept.id, []):
+                        collection_names.setdefault(name_key, set()).add(concept.id)
+                unique_concepts.append(concept)
+            ref.concepts = unique_concepts
+
+        return errors
+
+    @staticmethod
+    def __get_non_unique_name_error(concept, rules):
+        for new_names, collection_names, error_message in rules:
+            name_keys = new_names.get(concept.id, [])
+            if len(name_keys) != len(set(name_keys)):
+                return error_message
+            for name_key in name_keys:
+                if collection_names.get(name_key, set()) - {concept.id}:
+                    return error_message
+
+        return None
+
+    @staticmethod
+    def __get_names_by_concept(attribute, concept_ids):
+        criteria = LocalizedText.get_filter_criteria_for_attribute(attribute) or {attribute: True}
+        names = dict()
+        for concept_id, locale, name in LocalizedText.objects.filter(
+                name_locales__id__in=concept_ids, **criteria
+        ).values_list('name_locales__id', 'locale', 'name'):
+            names.setdefault(concept_id, []).append(locale + name)
+
+        return names
+
+    @classmethod
+    def __get_concepts_by_name(cls, attribute, concept_ids):
+        concepts = dict()
+        for concept_id, name_keys in cls.__get_names_by_concept(attribute, concept_ids).items():
+            for name_key in name_keys:
+                concepts.setdefault(name_key, set()).add(concept_id)
+
+        return concepts
+
     def add_references(self, expressions, user=None):
         errors = {}
 
@@ -281,9 +369,9 @@ class Collection(ConceptContainerModel):
         return errors
 
     @classmethod
-    def persist_changes(cls, obj, updated_by, **kwargs):
+    def persist_changes(cls, obj, updated_by, sync=True, **kwargs):
         col_reference = kwargs.pop('col_reference', False)
-        errors = super().persist_changes(obj, updated_by, **kwargs)
+        errors = super().persist_changes(obj, updated_by, sync, **kwargs)
         if col_reference and not errors:
             obj.fill_data_from_reference(col_reference)
         return errors
@@ -291,7 +379,21 @@ class Collection(ConceptContainerModel):
     def seed_concepts(self):
         head = self.head
         if head:
-            self.concepts.set(head.concepts.all())
+            self.copy_links_from(head, 'concepts')
+            self.copy_links_from(head, 'mappings')
+
+    def copy_links_from(self, collection, field_name):
+        """Copies the m2m rows of collection in one INSERT ... SELECT, without loading them in python."""
+        field = self._meta.get_field(field_name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} ({column}, {reverse_column}) "
+                "SELECT %s, {reverse_column} FROM {table} WHERE {column} = %s".format(
+                    table=field.m2m_db_table(), column=field.m2m_column_name(),
+                    reverse_column=field.m2m_reverse_name()
+                ),
+                [self.id, collection.id]
+            )
 
     def seed_references(self):
         head = self.head
@@ -411,6 +513,67 @@ class CollectionReference(models.Model):
             if not self.mappings:
                 raise ValidationError({'detail': ['Expression specified is not valid.']})
 
+    @classmethod
+    def resolve_in_bulk(cls, expressions):
+        """
+        Set based equivalent of clean() for many expressions: expressions are grouped by the repo they point to,
+        so each group resolves its concepts in one query, and all mappings are resolved in another one.
+        Returns the unsaved references with concepts/mappings assigned and the errors by expression.
+        """
+        errors = {}
+        references = {}
+        concept_groups = {}
+        for expression in expressions:
+            reference = cls(expression=expression)
+            reference.original_expression = expression
+            try:
+                kwargs = get(resolve(expression), 'kwargs', dict())
+            except Resolver404:
+                errors[expression] = [EXPRESSION_INVALID]
+                continue
+
+            reference.concepts = []
+            reference.mappings = []
+            references[expression] = reference
+            if 'mapping' not in kwargs:
+                kwargs.update(get_query_params_from_url_string(expression))
+                concept_criteria = (kwargs.pop('concept', None), kwargs.pop('concept_version', None))
+                concept_groups.setdefault(tuple(sorted(kwargs.items())), {})[expression] = concept_criteria
+
+        for group, expressions_criteria in concept_groups.items():
+            for expression, concepts in cls.__get_concepts_in_bulk(dict(group), expressions_criteria).items():
+                references[expression].concepts = concepts
+
+        unresolved = [expression for expression, ref in references.items() if not ref.concepts]
+        for mapping in Mapping.objects.filter(uri__in=unresolved):
+            references[mapping.uri].mappings.append(mapping)
+
+        for expression in unresolved:
+            if not references[expression].mappings:
+                errors[expression] = [EXPRESSION_INVALID]
+                references.pop(expression)
+
+        return list(references.values()), errors
+
+    @staticmethod
+    def __get_concepts_in_bulk(params, expressions_criteria):
+        queryset = Concept.get_base_queryset(params)
+        mnemonics = {mnemonic for mnemonic, _ in expressions_criteria.values()}
+        if None not in mnemonics:
+            queryset = queryset.filter(mnemonic__in=mnemonics)
+
+        concepts_by_mnemonic = {None: []}
+        for concept in queryset:
+            concepts_by_mnemonic.setdefault(concept.mnemonic, []).append(concept)
+            concepts_by_mnemonic[None].append(concept)
+
+        return {
+            expression: [
+                concept for concept in concepts_by_mnemonic.get(mnemonic, [])
+                if not version or concept.version == version
+            ] for expression, (mnemonic, version) in expressions_criteria.items()
+        }
+
     def get_related_mappings(self, exclude_mapping_uris):
         mappings = []
         concepts = self.get_concepts()
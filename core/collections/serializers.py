@@ -65,7 +65,7 @@ class CollectionCreateOrUpdateSerializer(ModelSerializer):
     def update(self, instance, validated_data):
         collection = self.prepare_object(validated_data, instance)
         user = self.context['request'].user
-        errors = Collection.persist_changes(collection, user)
+        errors = Collection.persist_changes(collection, user, sync=validated_data.get('sync', True))
         self._errors.update(errors)
         return collection
 
@@ -109,10 +109,10 @@ class CollectionCreateSerializer(CollectionCreateOrUpdateSerializer):
         self._errors.update(errors)
         return collection
 
-    def create_version(self, validated_data):
+    def create_version(self, validated_data, sync=True):
         collection = self.prepare_object(validated_data)
         user = self.context['request'].user
-        errors = Collection.persist_new_version(collection, user)
+        errors = Collection.persist_new_version(collection, user, sync=sync)
         self._errors.update(errors)
         return collection
 
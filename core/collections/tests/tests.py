@@ -1,13 +1,20 @@
 from django.core.exceptions import ValidationError
 from django.db.models import QuerySet
 
+from core.collections.constants import (
+    REFERENCE_ALREADY_EXISTS, EXPRESSION_INVALID, CONCEPT_FULLY_SPECIFIED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE,
+    ALL_SYMBOL
+)
 from core.collections.models import CollectionReference, Collection
 from core.collections.tests.factories import CollectionFactory
 from core.collections.utils import is_mapping, is_concept, drop_version, is_version_specified, \
     get_concept_by_expression
+from core.common.constants import CUSTOM_VALIDATION_SCHEMA_OPENMRS
 from core.common.tests import OCLTestCase
 from core.concepts.models import Concept
-from core.concepts.tests.factories import ConceptFactory
+from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+from core.mappings.models import Mapping
+from core.mappings.tests.factories import MappingFactory
 from core.sources.tests.factories import SourceFactory
 
 
@@ -32,6 +39,85 @@ class CollectionTest(OCLTestCase):
         self.assertEqual(collection.references.first().expression, concept_expression)
         self.assertEqual(collection.concepts.first(), concept)
 
+    def test_add_references_in_bulk(self):
+        collection = CollectionFactory()
+        source = SourceFactory()
+        concept1 = ConceptFactory(parent=source)
+        concept2 = ConceptFactory(parent=source)
+        mapping = MappingFactory(parent=source, from_concept=concept1, to_concept=concept2)
+        mapping.uri = '{}mappings/{}/'.format(source.uri, mapping.id)
+        Mapping.objects.filter(id=mapping.id).update(uri=mapping.uri)
+        collection.add_references([concept2.uri])
+        invalid_expression = source.uri + 'concepts/foobar/'
+
+        added_references, errors = collection.add_references_in_bulk(
+            [concept1.uri, concept2.uri, mapping.uri, invalid_expression, '/foo/']
+        )
+
+        self.assertEqual(
+            sorted([reference.expression for reference in added_references]), sorted([concept1.uri, mapping.uri])
+        )
+        self.assertTrue(all(reference.id for reference in added_references))
+        self.assertEqual(
+            errors,
+            {
+                concept2.uri: [REFERENCE_ALREADY_EXISTS],
+                invalid_expression: [EXPRESSION_INVALID],
+                '/foo/': [EXPRESSION_INVALID],
+            }
+        )
+        self.assertEqual(
+            sorted(collection.concepts.values_list('id', flat=True)), sorted([concept1.id, concept2.id])
+        )
+        self.assertEqual(list(collection.mappings.all()), [mapping])
+        self.assertEqual(collection.references.count(), 3)
+        self.assertEqual(collection.active_concepts, 2)
+        self.assertEqual(collection.active_mappings, 1)
+
+    def test_add_references_in_bulk_openmrs_unique_names(self):
+        collection = CollectionFactory(custom_validation_schema=CUSTOM_VALIDATION_SCHEMA_OPENMRS)
+        source = SourceFactory()
+        concept1 = ConceptFactory(parent=source, names=[LocalizedTextFactory(name='Malaria', locale='en')])
+        concept2 = ConceptFactory(parent=source, names=[LocalizedTextFactory(name='Malaria', locale='en')])
+        concept3 = ConceptFactory(parent=source, names=[LocalizedTextFactory(name='Malaria', locale='fr')])
+        collection.add_references_in_bulk([concept1.uri])
+
+        added_references, errors = collection.add_references_in_bulk([concept2.uri, concept3.uri])
+
+        self.assertEqual(errors, {concept2.uri: [CONCEPT_FULLY_SPECIFIED_NAME_UNIQUE_PER_COLLECTION_AND_LOCALE]})
+        self.assertEqual(
+            sorted(collection.concepts.values_list('id', flat=True)), sorted([concept1.id, concept3.id])
+        )
+        self.assertEqual([reference.expression for reference in added_references], [concept3.uri])
+
+    def test_add_expressions_all_concepts(self):
+        collection = CollectionFactory()
+        source = SourceFactory()
+        concept1 = ConceptFactory(parent=source, mnemonic='malaria')
+        concept2 = ConceptFactory(parent=source, mnemonic='fever')
+        ConceptFactory(parent=source, retired=True)
+        ConceptFactory()
+        collection.add_references([concept2.uri])
+
+        added_references, errors = collection.add_expressions(
+            dict(concepts=ALL_SYMBOL, uri=source.uri), collection.created_by
+        )
+
+        self.assertEqual([reference.expression for reference in added_references], [concept1.uri])
+        self.assertEqual(errors, {concept2.uri: [REFERENCE_ALREADY_EXISTS]})
+        self.assertEqual(
+            sorted(collection.concepts.values_list('id', flat=True)), sorted([concept1.id, concept2.id])
+        )
+
+        collection = CollectionFactory()
+        added_references, errors = collection.add_expressions(
+            dict(concepts=ALL_SYMBOL, uri=source.uri, search_term='MAL'), collection.created_by
+        )
+
+        self.assertEqual([reference.expression for reference in added_references], [concept1.uri])
+        self.assertEqual(errors, {})
+        self.assertEqual(list(collection.concepts.all()), [concept1])
+
     def test_seed_concepts(self):
         collection1 = CollectionFactory()
         collection2 = CollectionFactory(
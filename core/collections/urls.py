@@ -21,6 +21,11 @@ urlpatterns = [
         views.CollectionReferencesView.as_view(),
         name='collection-references'
     ),
+    re_path(
+        r'^(?P<collection>{pattern})/(?P<version>{pattern})/export/$'.format(pattern=NAMESPACE_PATTERN),
+        views.CollectionVersionExportView.as_view(),
+        name='collection-version-export'
+    ),
     re_path(
         r'^(?P<collection>{pattern})/(?P<version>{pattern})/$'.format(pattern=NAMESPACE_PATTERN),
         views.CollectionVersionRetrieveUpdateDestroyView.as_view(),
@@ -1,20 +1,28 @@
 from django.db import IntegrityError
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from rest_framework import status, mixins
 from rest_framework.generics import RetrieveAPIView, DestroyAPIView
 from rest_framework.response import Response
 
 from core.collections.constants import INCLUDE_REFERENCES_PARAM, HEAD_OF_CONCEPT_ADDED_TO_COLLECTION, \
-    HEAD_OF_MAPPING_ADDED_TO_COLLECTION, CONCEPT_ADDED_TO_COLLECTION_FMT, MAPPING_ADDED_TO_COLLECTION_FMT
+    HEAD_OF_MAPPING_ADDED_TO_COLLECTION, CONCEPT_ADDED_TO_COLLECTION_FMT, MAPPING_ADDED_TO_COLLECTION_FMT, \
+    ALL_SYMBOL, ASYNC_REFERENCES_THRESHOLD
 from core.collections.models import Collection, CollectionReference
 from core.collections.serializers import CollectionDetailSerializer, CollectionListSerializer, \
     CollectionCreateSerializer, CollectionReferenceSerializer, CollectionVersionDetailSerializer
 from core.collections.utils import is_concept, is_version_specified
 from core.common.constants import HEAD, RELEASED_PARAM, PROCESSING_PARAM
-from core.common.mixins import ConceptDictionaryCreateMixin, ListWithHeadersMixin, ConceptDictionaryUpdateMixin
-from core.common.permissions import CanViewConceptDictionary, CanEditConceptDictionary
+from core.common.mixins import (
+    ConceptDictionaryCreateMixin, ListWithHeadersMixin, ConceptDictionaryUpdateMixin, VersionExportMixin,
+    ConditionalVersionListMixin, ResponseCacheMixin
+)
+from core.common.permissions import CanViewConceptDictionary, CanEditConceptDictionary, HasAccessToVersionedObject
 from core.common.utils import compact_dict_by_values, parse_boolean_query_param
 from core.common.views import BaseAPIView
+from core.jobs.constants import ADD_REFERENCES
+from core.jobs.models import Job
+from core.jobs.serializers import JobSerializer
 
 
 class CollectionBaseView(BaseAPIView):
@@ -63,7 +71,7 @@ class CollectionBaseView(BaseAPIView):
         return params
 
     def get_queryset(self):
-        return Collection.get_base_queryset(compact_dict_by_values(self.get_filter_params()))
+        return Collection.get_base_queryset(compact_dict_by_values(self.get_filter_params()), self.request.user)
 
     def should_include_references(self):
         return self.request.query_params.get(INCLUDE_REFERENCES_PARAM, 'false').lower() == 'true'
@@ -89,37 +97,36 @@ class CollectionListView(CollectionBaseView, ConceptDictionaryCreateMixin, ListW
         return self.list(request, *args, **kwargs)
 
     def get_csv_rows(self, queryset=None):
-        if not queryset:
+        if queryset is None:
             queryset = self.get_queryset()
 
-        values = queryset.values('mnemonic', 'name', 'full_name', 'collection_type', 'description', 'default_locale',
-                                 'supported_locales', 'website', 'external_id', 'updated_at', 'updated_by', 'uri')
-
-        for value in values:
-            value['Owner'] = Collection.objects.get(uri=value['uri']).parent.mnemonic
-            value['Collection ID'] = value.pop('mnemonic')
-            value['Collection Name'] = value.pop('name')
-            value['Collection Full Name'] = value.pop('full_name')
-            value['Collection Type'] = value.pop('collection_type')
-            value['Description'] = value.pop('description')
-            value['Default Locale'] = value.pop('default_locale')
-            value['Supported Locales'] = ",".join(value.pop('supported_locales'))
-            value['Website'] = value.pop('website')
-            value['External ID'] = value.pop('external_id')
-            value['Last Updated'] = value.pop('updated_at')
-            value['Updated By'] = value.pop('updated_by')
-            value['URI'] = value.pop('uri')
-
-        values.field_names.extend([
-            'Owner', 'Collection ID', 'Collection Name', 'Collection Full Name', 'Collection Type', 'Description',
-            'Default Locale', 'Supported Locales', 'Website', 'External ID', 'Last Updated', 'Updated By', 'URI'
-        ])
-        del values.field_names[0:12]
-        return values
+        values = queryset.annotate(
+            owner=Coalesce('organization__mnemonic', 'user__username')
+        ).values(
+            'owner', 'mnemonic', 'name', 'full_name', 'collection_type', 'description', 'default_locale',
+            'supported_locales', 'website', 'external_id', 'updated_at', 'updated_by', 'uri'
+        )
+
+        for value in values.iterator():
+            yield {
+                'Owner': value['owner'],
+                'Collection ID': value['mnemonic'],
+                'Collection Name': value['name'],
+                'Collection Full Name': value['full_name'],
+                'Collection Type': value['collection_type'],
+                'Description': value['description'],
+                'Default Locale': value['default_locale'],
+                'Supported Locales': ",".join(value['supported_locales'] or []),
+                'Website': value['website'],
+                'External ID': value['external_id'],
+                'Last Updated': value['updated_at'],
+                'Updated By': value['updated_by'],
+                'URI': value['uri'],
+            }
 
 
 class CollectionRetrieveUpdateDestroyView(
-        CollectionBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView
+        ResponseCacheMixin, CollectionBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView
 ):
     serializer_class = CollectionDetailSerializer
 
@@ -143,7 +150,8 @@ class CollectionRetrieveUpdateDestroyView(
 
 
 class CollectionReferencesView(
-        CollectionBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView, ListWithHeadersMixin
+        ResponseCacheMixin, CollectionBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView,
+        ListWithHeadersMixin
 ):
     serializer_class = CollectionDetailSerializer
 
@@ -207,9 +215,11 @@ class CollectionReferencesView(
         expressions = data.get('expressions', [])
         cascade_mappings = self.cascade_mapping_resolver(cascade_mappings_flag)
 
-        (added_references, errors) = collection.add_expressions(
-            data, self.get_host_url(), request.user, cascade_mappings
-        )
+        if self.should_add_in_background(data):
+            job = Job.enqueue(ADD_REFERENCES, collection, request.user, data=data, cascade_mappings=cascade_mappings)
+            return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers=dict(Location=job.url))
+
+        (added_references, errors) = collection.add_expressions(data, request.user, cascade_mappings)
 
         all_expressions = expressions + concept_expressions + mapping_expressions
 
@@ -227,6 +237,11 @@ class CollectionReferencesView(
 
         return Response(response, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def should_add_in_background(data):
+        expressions = [data.get(field_name, []) for field_name in ['expressions', 'concepts', 'mappings']]
+        return ALL_SYMBOL in expressions or sum(map(len, expressions)) > ASYNC_REFERENCES_THRESHOLD
+
     def create_response_item(self, added_expressions, errors, expression):
         adding_expression_failed = len(errors) > 0 and expression in errors
         if adding_expression_failed:
@@ -308,7 +323,9 @@ class CollectionReferencesView(
         )
 
 
-class CollectionVersionListView(CollectionVersionBaseView, mixins.CreateModelMixin, ListWithHeadersMixin):
+class CollectionVersionListView(
+        ConditionalVersionListMixin, CollectionVersionBaseView, mixins.CreateModelMixin, ListWithHeadersMixin
+):
     released_filter = None
     processing_filter = None
 
@@ -338,10 +355,12 @@ class CollectionVersionListView(CollectionVersionBaseView, mixins.CreateModelMix
         serializer = self.get_serializer(data=payload)
         if serializer.is_valid():
             try:
-                instance = serializer.create_version(payload)
+                instance = serializer.create_version(payload, sync=False)
                 if serializer.is_valid():
                     serializer = CollectionDetailSerializer(instance, context={'request': request})
-                    return Response(serializer.data, status=status.HTTP_201_CREATED)
+                    return Response(
+                        serializer.data, status=status.HTTP_202_ACCEPTED, headers=dict(Location=instance.job.url)
+                    )
             except IntegrityError as ex:
                 return Response(
                     dict(
@@ -356,8 +375,14 @@ class CollectionVersionListView(CollectionVersionBaseView, mixins.CreateModelMix
         queryset = super().get_queryset()
         if self.released_filter is not None:
             queryset = queryset.filter(released=self.released_filter)
+        if self.processing_filter is not None:
+            queryset = queryset.filter(is_processing=self.processing_filter)
         return queryset.order_by('-created_at')
 
 
+class CollectionVersionExportView(VersionExportMixin, CollectionBaseView):
+    permission_classes = (HasAccessToVersionedObject,)
+
+
 class CollectionVersionRetrieveUpdateDestroyView(CollectionBaseView):
     pass
@@ -33,5 +33,11 @@ INCLUDE_RETIRED_PARAM = 'includeRetired'
 INCLUDE_MAPPINGS_PARAM = 'includeMappings'
 INCLUDE_INVERSE_MAPPINGS_PARAM = 'includeInverseMappings'
 LIMIT_PARAM = 'limit'
+CURSOR_PARAM = 'cursor'
+CURSOR_ORDER_PARAM = 'cursorOrder'
+SEARCH_PARAM = 'q'
+LOCALE_PARAM = 'locale'
+EXACT_MATCH_PARAM = 'exact_match'
+FACETS_PARAM = 'facets'
 UPDATED_SINCE_PARAM = 'updatedSince'
 LOOKUP_ATTRIBUTES_MUST_BE_IMPORTED = 'Lookup attributes must be imported'
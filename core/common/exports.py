@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.common.identity_map import identity_map
+from core.common.services import get_export_storage
+
+EXPORT_FILE_NAME = 'export.json.gz'
+CHUNK_SIZE = 1000
+MAPPING_FIELDS = dict(
+    id='versioned_object_id', uuid='id', version='version', map_type='map_type', retired='retired',
+    from_concept_url='from_concept__uri', to_concept_url='to_concept__uri', to_source_url='to_source__uri',
+    to_concept_code='to_concept_code', to_concept_name='to_concept_name', external_id='external_id',
+    extras='extras', url='uri', updated_on='updated_at',
+)
+
+
+class HashingStream:
+    """Writable stream passing bytes through to stream, keeping a sha256 of everything written."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def get_export_path(version):
+    return version.uri.strip('/') + '/' + EXPORT_FILE_NAME
+
+
+def iterate_concepts(version):
+    from core.concepts.serializers import ConceptVersionDetailSerializer
+    ids = list(version.get_concepts_queryset().order_by('id').values_list('id', flat=True).distinct())
+    for start in range(0, len(ids), CHUNK_SIZE):
+        concepts = version.get_concepts_queryset().model.objects.filter(
+            id__in=ids[start:start + CHUNK_SIZE]
+        ).select_related(
+            'created_by', 'parent__organization', 'parent__user'
+        ).prefetch_related('names', 'descriptions').order_by('id')
+        for concept in concepts:
+            yield ConceptVersionDetailSerializer(concept).data
+
+
+def iterate_mappings(version):
+    values = version.get_mappings_queryset().order_by('id').values(*MAPPING_FIELDS.values()).distinct()
+    for value in values.iterator(chunk_size=CHUNK_SIZE):
+        yield {key: value[field] for key, field in MAPPING_FIELDS.items()}
+
+
+def write_export(version, stream):
+    """
+    Writes version as gzipped JSON, {..version attributes.., "concepts": [...], "mappings": [...]}, one child at a
+    time, so memory stays bounded by a chunk of concepts whatever the size of the version.
+    mtime is fixed, so the same content always gives the same bytes and hence the same ETag.
+    """
+    header = dict(
+        type=version.resource_type, id=version.mnemonic, version=version.version, url=version.uri,
+        owner=version.parent_resource, owner_type=version.parent_resource_type, released=version.released,
+        created_on=version.created_at, updated_on=version.updated_at, extras=version.extras,
+    )
+    with gzip.GzipFile(fileobj=stream, mode='wb', mtime=0) as gzip_file:
+        gzip_file.write(json.dumps(header, cls=DjangoJSONEncoder)[:-1].encode())
+        for key, children in [('concepts', iterate_concepts(version)), ('mappings', iterate_mappings(version))]:
+            gzip_file.write(', "{}": ['.format(key).encode())
+            for index, child in enumerate(children):
+                gzip_file.write(((', ' if index else '') + json.dumps(child, cls=DjangoJSONEncoder)).encode())
+            gzip_file.write(b']')
+        gzip_file.write(b'}')
+
+
+def export_version(version):
+    """Renders version into export storage and records the sha256 of the artifact as its export_etag."""
+    with get_export_storage().open_upload(get_export_path(version)) as upload:
+        stream = HashingStream(upload)
+        write_export(version, stream)
+
+    version.export_etag = stream.hexdigest()
+    version.__class__.objects.filter(id=version.id).update(export_etag=version.export_etag)
+    identity_map.invalidate(version)
+    return version.export_etag
+
+
+def schedule_export(version):
+    """Queues the export of version, run by a worker once the transaction marking it released is committed."""
+    from core.jobs.constants import EXPORT_VERSION
+    from core.jobs.models import Job
+    Job.enqueue(EXPORT_VERSION, version, unique=True)
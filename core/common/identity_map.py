@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+
+
+class IdentityMap:
+    """
+    Request (or job) scoped map of the heads and latest versions loaded so far, keyed on (model, parent, mnemonic),
+    so a request resolves each of them once however many times head is read. Nothing is kept outside a scope.
+    The entries of a resource are dropped whenever one of its versions is saved or deleted, or its latest version
+    changes. Like any instance already loaded, cached ones don't see the children counts updated in bulk.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def entries(self):
+        return getattr(self._local, 'entries', None)
+
+    @contextmanager
+    def scope(self):
+        previous = self.entries
+        self._local.entries = dict()
+        try:
+            yield
+        finally:
+            self._local.entries = previous
+
+    @staticmethod
+    def get_resource_key(instance):
+        return instance.__class__, instance.mnemonic
+
+    @staticmethod
+    def get_parent_key(instance):
+        return tuple(getattr(instance, field, None) for field in ['parent_id', 'organization_id', 'user_id'])
+
+    def get(self, instance, kind, loader):
+        entries = self.entries
+        if entries is None:
+            return loader()
+
+        resource_entries = entries.setdefault(self.get_resource_key(instance), dict())
+        key = (kind, self.get_parent_key(instance))
+        if key not in resource_entries:
+            resource_entries[key] = loader()
+        return resource_entries[key]
+
+    def invalidate(self, instance):
+        if self.entries is not None:
+            self.entries.pop(self.get_resource_key(instance), None)
+
+    def clear(self):
+        if self.entries is not None:
+            self.entries.clear()
+
+
+identity_map = IdentityMap()
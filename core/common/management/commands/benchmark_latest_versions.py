@@ -0,0 +1,68 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction, connection
+
+from core.common.constants import HEAD
+from core.concepts.models import Concept
+from core.sources.models import Source
+from core.users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'benchmark Concept.get_latest_versions_for_queryset for growing input sizes (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000,100000', help='comma separated concept counts')
+        parser.add_argument('--runs', type=int, default=3, help='runs per size, the best one is reported')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        user = UserProfile.objects.filter(username='ocladmin').get()
+
+        with transaction.atomic():
+            source = Source(
+                name='latest-versions-benchmark', mnemonic='latest-versions-benchmark', user=user,
+                created_by=user, updated_by=user, version=HEAD
+            )
+            source.save()
+            created = 0
+            self.stdout.write('{:>10} {:>12} {:>10} {:>10}'.format('concepts', 'sql (bytes)', 'rows', 'ms'))
+            for size in sizes:
+                self.create_concepts(source, user, created, size)
+                created = max(created, size)
+                queryset = Concept.objects.filter(
+                    parent=source, is_latest_version=False, mnemonic__lt=self.get_mnemonic(size)
+                )
+                self.stdout.write('{:>10} {:>12} {:>10} {:>10.1f}'.format(size, *self.run(queryset, options['runs'])))
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_concepts(source, user, start, end):
+        concepts = []
+        for index in range(start, end):
+            for version, is_latest_version in [('v1', False), ('v2', True)]:
+                concepts.append(Concept(
+                    mnemonic=Command.get_mnemonic(index), version=version, is_latest_version=is_latest_version,
+                    parent=source, concept_class='Misc', datatype='None', created_by=user, updated_by=user
+                ))
+        Concept.objects.bulk_create(concepts, batch_size=5000)
+
+    @staticmethod
+    def get_mnemonic(index):
+        return 'concept-{:09d}'.format(index)
+
+    @staticmethod
+    def run(queryset, runs):
+        latest_versions = Concept.get_latest_versions_for_queryset(queryset).values_list('id', flat=True)
+        sql, params = latest_versions.query.sql_with_params()
+        sql_size = len(connection.cursor().mogrify(sql, params))
+        timings = []
+        rows = 0
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            rows = len(list(latest_versions.all()))
+            timings.append((time.perf_counter() - started_at) * 1000)
+
+        return sql_size, rows, min(timings)
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from core.common.constants import HEAD
+from core.concepts.services import BulkConceptImporter
+from core.sources.models import Source
+from core.users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'bulk import concepts, one JSON object per line, into the HEAD of a source'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='path to a JSON lines file')
+        parser.add_argument('--source', required=True, help='source mnemonic')
+        parser.add_argument('--org', help='owner organization mnemonic')
+        parser.add_argument('--user', help='owner username')
+        parser.add_argument('--username', default='ocladmin', help='user creating the concepts')
+        parser.add_argument('--batch-size', type=int, default=1000, help='concepts validated and inserted at once')
+
+    def handle(self, *args, **options):
+        if bool(options['org']) == bool(options['user']):
+            raise CommandError('Specify exactly one of --org or --user')
+
+        owner_filter = dict(organization__mnemonic=options['org']) if options['org'] else dict(
+            user__username=options['user']
+        )
+        source = Source.objects.filter(mnemonic=options['source'], version=HEAD, **owner_filter).first()
+        if not source:
+            raise CommandError('Source {} not found'.format(options['source']))
+        user = UserProfile.objects.filter(username=options['username']).first()
+        if not user:
+            raise CommandError('User {} not found'.format(options['username']))
+
+        importer = BulkConceptImporter(source, user, options['batch_size'])
+        with open(options['file']) as lines:
+            created, errors = importer.run(lines)
+
+        for line_number, error in sorted(errors.items()):
+            self.stderr.write(json.dumps(dict(line=line_number, errors=error)))
+        self.stdout.write('Created {} concepts, {} lines failed'.format(created, len(errors)))
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from core.concepts.services import compact_localized_texts
+
+
+class Command(BaseCommand):
+    help = 'deduplicate identical localized texts of each concept, linking its versions to a single row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='duplicate rows merged per transaction')
+
+    def handle(self, *args, **options):
+        deleted = compact_localized_texts(options['batch_size'])
+        self.stdout.write('Deleted {} duplicate localized texts'.format(deleted))
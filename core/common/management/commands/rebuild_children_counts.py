@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from core.collections.models import Collection
+from core.sources.models import Source
+
+
+class Command(BaseCommand):
+    help = 'rebuild active concepts/mappings counts and last child updates of sources and collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='only rebuild the versions of this source mnemonic')
+        parser.add_argument('--collection', help='only rebuild the versions of this collection mnemonic')
+
+    def handle(self, *args, **options):
+        querysets = []
+        if not options['collection']:
+            querysets.append(Source.objects.filter(**self.get_filters(options['source'])))
+        if not options['source']:
+            querysets.append(Collection.objects.filter(**self.get_filters(options['collection'])))
+
+        for queryset in querysets:
+            for container in queryset.iterator():
+                container.rebuild_children_counts()
+                self.stdout.write('{}: {} concepts, {} mappings'.format(
+                    container.uri, container.active_concepts, container.active_mappings
+                ))
+
+    @staticmethod
+    def get_filters(mnemonic):
+        return dict(mnemonic=mnemonic) if mnemonic else dict()
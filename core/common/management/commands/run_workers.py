@@ -0,0 +1,42 @@
+import multiprocessing
+import time
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from core.jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'run background job workers, each one runs one job at a time, so --workers bounds the concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            self.work(options['poll_interval'], options['burst'])
+            return
+
+        connections.close_all()  # forked workers must not share the connection of the parent
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options['poll_interval'], options['burst']))
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def work(self, poll_interval, burst):
+        while True:
+            job = Job.claim()
+            if job:
+                job.run()
+                self.stdout.write('{} {}'.format(job, job.status))
+                continue
+            if burst:
+                return
+            time.sleep(poll_interval)
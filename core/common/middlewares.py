@@ -0,0 +1,12 @@
+from core.common.identity_map import identity_map
+
+
+class IdentityMapMiddleware:
+    """Scopes the identity map of heads and latest versions to the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map.scope():
+            return self.get_response(request)
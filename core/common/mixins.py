@@ -1,19 +1,34 @@
-from django.db.models import Q
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q, Case, When, IntegerField, Count, Max, F
+from django.db.models.query import QuerySet
+from django.http import FileResponse, HttpResponse
 from django.urls import resolve, reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_etags, quote_etag, http_date
 from pydash import compact, get
 from rest_framework import status
 from rest_framework.mixins import ListModelMixin, CreateModelMixin
 from rest_framework.response import Response
 
-from core.common.constants import HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW, ACCESS_TYPE_NONE
-from core.common.permissions import HasPrivateAccess, HasOwnership
-from .utils import write_csv_to_s3, get_csv_from_s3
+from core.common.constants import HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW, ACCESS_TYPE_NONE, FACETS_PARAM, \
+    LIMIT_PARAM, CURSOR_PARAM, CURSOR_ORDER_PARAM
+from core.common.exports import get_export_path, EXPORT_FILE_NAME
+from core.common.pagination import KeysetPagination
+from core.common.permissions import HasPrivateAccess, HasOwnership, is_owner
+from core.common.services import get_export_storage, LocalStorage
+from .utils import write_csv_to_s3, get_csv_from_s3, parse_boolean_query_param
 
 
 class ListWithHeadersMixin(ListModelMixin):
     verbose_param = 'verbose'
     default_filters = {'is_active': True}
     object_list = None
+    cursor_pagination = False
 
     def is_verbose(self, request):
         return request.query_params.get(self.verbose_param, False)
@@ -35,9 +50,7 @@ class ListWithHeadersMixin(ListModelMixin):
             self.object_list = self.filter_queryset(self.get_queryset())
 
         if is_csv and search_string:
-            klass = type(self.object_list[0])
-            queryset = klass.objects.filter(id__in=self.get_object_ids())
-            return self.get_csv(request, queryset)
+            return self.get_csv(request, self.object_list)
 
         # Skip pagination if compressed results are requested
         meta = request._request.META  # pylint: disable=protected-access
@@ -46,8 +59,13 @@ class ListWithHeadersMixin(ListModelMixin):
         return_all = False  # self.get_paginate_by() == 0
         skip_pagination = compress or return_all
 
+        if self.cursor_pagination and KeysetPagination.is_requested(request):
+            paginator = KeysetPagination(request)
+            page = paginator.paginate_queryset(self.object_list)
+            return Response(self.get_serializer(page, many=True).data, headers=paginator.get_headers(page))
+
         # Switch between paginated or standard style responses
-        sorted_list = self.prepend_head(self.object_list) if len(self.object_list) > 0 else self.object_list
+        sorted_list = self.prepend_head(self.object_list)
 
         if not skip_pagination:
             page = self.paginate_queryset(sorted_list)
@@ -58,10 +76,6 @@ class ListWithHeadersMixin(ListModelMixin):
 
         return Response(self.get_serializer(sorted_list, many=True).data)
 
-    def get_object_ids(self):
-        self.object_list.limit_iter = False
-        return map(lambda o: o.id, self.object_list[0:100])
-
     def get_csv(self, request, queryset=None):
         filename, url, prepare_new_file, is_member = None, None, True, False
 
@@ -69,8 +83,7 @@ class ListWithHeadersMixin(ListModelMixin):
 
         if parent:
             prepare_new_file = False
-            user = request.query_params.get('user', None)
-            is_member = self._is_member(parent, user)
+            is_member = self._is_member(parent, request.user)
 
         try:
             path = request.__dict__.get('_request').path
@@ -85,7 +98,7 @@ class ListWithHeadersMixin(ListModelMixin):
             url = get_csv_from_s3(filename, is_member)
 
         if not url:
-            queryset = queryset or self._get_query_set_from_view(is_member)
+            queryset = self.get_queryset() if queryset is None else queryset
             data = self.get_csv_rows(queryset) if hasattr(self, 'get_csv_rows') else queryset.values()
             url = write_csv_to_s3(data, is_member, **kwargs)
 
@@ -95,13 +108,12 @@ class ListWithHeadersMixin(ListModelMixin):
     def _is_member(parent, requesting_user):
         if not parent or type(parent).__name__ in ['UserProfile', 'Organization']:
             return False
+        if not requesting_user.is_authenticated:
+            return False
 
         owner = parent.owner
-        return owner.members.filter(username=requesting_user).exists() if type(owner).__name__ == 'Organization' else \
-            requesting_user == parent.created_by
-
-    def _get_query_set_from_view(self, is_member):
-        return self.get_queryset() if is_member else self.get_queryset()[0:100]
+        return owner.is_member(requesting_user) if type(owner).__name__ == 'Organization' else \
+            requesting_user.id == parent.created_by_id
 
     def get_parent(self):
         if hasattr(self, 'parent_resource'):
@@ -115,6 +127,15 @@ class ListWithHeadersMixin(ListModelMixin):
 
     @staticmethod
     def prepend_head(objects):
+        if isinstance(objects, QuerySet) and not objects.query.is_sliced:
+            # orders HEAD first in the database instead of loading the whole queryset to look for it
+            if not hasattr(objects.model, 'mnemonic'):
+                return objects
+            return objects.order_by(
+                Case(When(mnemonic=HEAD, then=0), default=1, output_field=IntegerField()),
+                *(objects.query.order_by or objects.model._meta.ordering)  # pylint: disable=protected-access
+            )
+
         if len(objects) > 0 and hasattr(objects[0], 'mnemonic'):
             head_el = [el for el in objects if hasattr(el, 'mnemonic') and el.mnemonic == HEAD]
             if head_el:
@@ -130,6 +151,252 @@ class ListWithHeadersMixin(ListModelMixin):
         return prev
 
 
+class VersionExportMixin:
+    """
+    Serves the export artifact of a released version (see core.common.exports) with a strong ETag, which is the
+    sha256 of the artifact. 202 while the artifact is being rendered.
+    """
+    def get_object(self, queryset=None):  # pylint: disable=unused-argument
+        return self.get_queryset().first()
+
+    def get(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        version = self.get_object()
+        if not version or not version.is_exportable:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        self.check_object_permissions(request, version)
+        if not version.export_etag:
+            return Response(status=status.HTTP_202_ACCEPTED)
+
+        etag = '"{}"'.format(version.export_etag)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            storage = get_export_storage()
+            url = storage.url_for(get_export_path(version))
+            if not url:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if storage is LocalStorage:
+                artifact = open(url, 'rb')  # pylint: disable=consider-using-with
+                response = FileResponse(
+                    artifact, as_attachment=True, filename=EXPORT_FILE_NAME, content_type='application/gzip'
+                )
+            else:
+                response = Response(status=status.HTTP_303_SEE_OTHER, headers=dict(Location=url))
+
+        response['ETag'] = etag
+        return response
+
+
+class ConditionalResponse(Exception):
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified for responses that only change with a source or collection version.
+    The validators come from the container (its own updates, last_child_update and processing state) and the request
+    (URL with query params, media type and user), and are checked right after authentication and permissions,
+    so a 304 is answered before any child queryset is built.
+    """
+    conditional_container = None
+    conditional_validators = None
+
+    def get_conditional_container(self):
+        return self.get_object()
+
+    def get_conditional_state(self):
+        """Everything besides the request the response depends on, and when it last changed."""
+        self.conditional_container = self.get_conditional_container()
+        container = self.conditional_container
+        if not container:
+            return None
+
+        return [container.id, container.is_processing], max(container.updated_at, container.last_child_update)
+
+    def hash_request(self, values):
+        request = self.request
+        values = [*values, request.build_absolute_uri(), request.accepted_media_type]
+        return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+    def get_conditional_validators(self):
+        state = self.get_conditional_state()
+        if not state:
+            return None
+
+        values, last_modified = state
+        etag = quote_etag(self.hash_request([*values, last_modified.isoformat(), self.request.user.id]))
+        return etag, last_modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in ['GET', 'HEAD']:
+            return
+
+        self.conditional_validators = self.get_conditional_validators()
+        if self.conditional_validators:
+            etag, last_modified = self.conditional_validators
+            response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+            if response is not None:
+                raise ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.conditional_validators and response.status_code in [status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED]:
+            etag, last_modified = self.conditional_validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+
+class ConditionalVersionListMixin(ConditionalGetMixin):
+    """A versions listing changes with any of its versions, including one being added, deleted or done processing."""
+    def get_conditional_state(self):
+        agg = self.get_queryset().aggregate(
+            count=Count('id'), last_id=Max('id'), processing=Count('id', filter=Q(is_processing=True)),
+            updated_at=Max('updated_at'), last_child_update=Max('last_child_update')
+        )
+        if not agg['count']:
+            return None
+
+        return [agg['count'], agg['last_id'], agg['processing']], max(agg['updated_at'], agg['last_child_update'])
+
+
+class ResponseCacheMixin(ConditionalGetMixin):
+    """
+    Shares rendered GET responses, in the 'responses' cache, between users with the same permission scope on the
+    container (staff, member or public).
+    Keys hold the container state (updates, last_child_update, released, retired, is_active) read on each request,
+    so any change to the container, saved or updated in bulk, moves to new keys.
+    Released versions are immutable and their entries never expire, the others expire after
+    RESPONSE_CACHE_HEAD_TIMEOUT seconds. Versions being processed and CSV downloads are not cached.
+    """
+    response_cache_key = None
+    response_cache_hit = False
+    uncached_headers = ['ETag', 'Last-Modified']
+
+    def get_permission_scope(self, container):
+        user = self.request.user
+        if user.is_staff:
+            return 'staff'
+        if user.is_authenticated and is_owner(user, container):
+            return 'member'
+        return 'public'
+
+    def get_response_cache_key(self, container):
+        return 'response:{}:{}'.format(container.id, self.hash_request([
+            container.updated_at, container.last_child_update, container.released, container.retired,
+            container.is_active, self.get_permission_scope(container)
+        ]))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        container = self.conditional_container
+        if not self.is_response_cacheable(request, container):
+            return
+
+        self.response_cache_key = self.get_response_cache_key(container)
+        cached = caches['responses'].get(self.response_cache_key)
+        if cached is not None:
+            self.response_cache_hit = True
+            raise ConditionalResponse(self.build_cached_response(cached))
+
+    @staticmethod
+    def is_response_cacheable(request, container):
+        # CSV responses point to expiring download URLs
+        return request.method == 'GET' and container and not container.is_processing and \
+            not request.query_params.get('csv', False)
+
+    @staticmethod
+    def build_cached_response(cached):
+        response = HttpResponse(cached['content'], status=cached['status'])
+        for header, value in cached['headers']:
+            response[header] = value
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.response_cache_key and not self.response_cache_hit and isinstance(response, Response) and \
+                response.status_code == status.HTTP_200_OK:
+            response.render()
+            container = self.conditional_container
+            caches['responses'].set(
+                self.response_cache_key,
+                dict(
+                    content=response.content, status=response.status_code,
+                    headers=[item for item in response.items() if item[0] not in self.uncached_headers]
+                ),
+                None if container.released and not container.is_head else settings.RESPONSE_CACHE_HEAD_TIMEOUT
+            )
+        return response
+
+
+class FacetsMixin:
+    """
+    With ?facets=true a listing answers {"facets": {facet: {value: count}}, "results": [...]}, counting the whole
+    filtered queryset by each of facet_fields (facet name: lookup) in a single GROUPING SETS query.
+    Used with ResponseCacheMixin, facets of a container are cached in the 'responses' cache, keyed on its
+    last_child_update and the permission scope, so pages of the same listing share them.
+    """
+    facet_fields = dict()
+    unfaceted_params = [FACETS_PARAM, LIMIT_PARAM, CURSOR_PARAM, CURSOR_ORDER_PARAM, 'page', 'verbose']
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if parse_boolean_query_param(request, FACETS_PARAM) and response.status_code == status.HTTP_200_OK and \
+                isinstance(response.data, list):
+            response.data = dict(facets=self.get_facets(), results=response.data)
+        return response
+
+    def get_facets(self):
+        container = self.conditional_container
+        if not container or container.is_processing:
+            return self.count_facets(self.object_list, self.facet_fields)
+
+        params = {key: value for key, value in self.get_filter_params().items() if key not in self.unfaceted_params}
+        key = 'facets:{}:{}'.format(container.id, hashlib.sha1(json.dumps([
+            container.last_child_update, container.retired, self.get_permission_scope(container), params
+        ], default=str, sort_keys=True).encode()).hexdigest())
+        facets = caches['responses'].get(key)
+        if facets is None:
+            facets = self.count_facets(self.object_list, self.facet_fields)
+            caches['responses'].set(
+                key, facets, None if container.released and not container.is_head else
+                settings.RESPONSE_CACHE_HEAD_TIMEOUT
+            )
+        return facets
+
+    @staticmethod
+    def count_facets(queryset, fields):
+        aliases = ['facet_{}'.format(index) for index in range(len(fields))]
+        rows = queryset.order_by().values(
+            facet_id=F('id'), **{alias: F(field) for alias, field in zip(aliases, fields.values())}
+        )
+        sql, params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT {groupings}, {columns}, COUNT(DISTINCT facet_id) FROM ({rows}) facets '
+                'GROUP BY GROUPING SETS ({sets})'.format(
+                    groupings=', '.join('GROUPING({})'.format(alias) for alias in aliases),
+                    columns=', '.join(aliases), rows=sql, sets=', '.join('({})'.format(alias) for alias in aliases)
+                ), params
+            )
+            results = cursor.fetchall()
+
+        names = list(fields)
+        facets = {name: dict() for name in names}
+        for row in results:
+            index = row[:len(names)].index(0)  # GROUPING() is 0 for the column the row is grouped by
+            facets[names[index]][row[len(names) + index]] = row[-1]
+        return facets
+
+
 class PathWalkerMixin:
     """
     A Mixin with methods that help resolve a resource path to a resource object
@@ -261,7 +528,7 @@ class ConceptDictionaryUpdateMixin(ConceptDictionaryMixin):
             return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         self.object = self.get_object()
-        save_kwargs = {'force_update': True, 'parent_resource': self.parent_resource}
+        save_kwargs = {'force_update': True, 'parent_resource': self.parent_resource, 'sync': False}
         success_status_code = status.HTTP_200_OK
 
         request.data['supported_locales'] = compact(request.data.pop('supported_locales', '').split(','))
@@ -271,6 +538,9 @@ class ConceptDictionaryUpdateMixin(ConceptDictionaryMixin):
             self.object = serializer.save(**save_kwargs)
             if serializer.is_valid():
                 serializer = self.get_detail_serializer(self.object)
+                job = getattr(self.object, 'job', None)
+                if job:
+                    return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers=dict(Location=job.url))
                 return Response(serializer.data, status=success_status_code)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -299,8 +569,8 @@ class SourceChildMixin:
     def is_head(self):
         return self.is_latest_version
 
-    def calculate_uri(self):
-        return "{}{}/".format(super().calculate_uri(), self.version)
+    def calculate_uri(self, head=None):
+        return "{}{}/".format(super().calculate_uri(head=head), self.version)
 
     @property
     def owner(self):
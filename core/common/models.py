@@ -2,10 +2,12 @@ from django.contrib.postgres.fields import JSONField, ArrayField
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models, IntegrityError
-from django.db.models import Max
+from django.db.models import Max, Count, F, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from pydash import get
 
+from core.common.identity_map import identity_map
 from core.common.utils import reverse_resource, reverse_resource_version
 from core.settings import DEFAULT_LOCALE
 from .constants import (
@@ -49,6 +51,19 @@ class BaseModel(models.Model):
     extras_have_been_encoded = False
     extras_have_been_decoded = False
     is_being_saved = False
+    _uri_state = None
+
+    # attributes the uri is built from, read from __dict__ so deferred fields are never loaded
+    URI_FIELDS = [
+        'id', 'mnemonic', 'username', 'versioned_object_id', 'version', 'is_latest_version', 'parent_id',
+        'organization_id', 'user_id'
+    ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._uri_state = instance.get_uri_state()  # pylint: disable=protected-access
+        return instance
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         if not self.internal_reference_id and self.id:
@@ -126,14 +141,24 @@ class BaseModel(models.Model):
 
         return self.calculate_uri()
 
-    def calculate_uri(self):
+    def calculate_uri(self, head=None):
         if self.is_versioned and not self.is_head:
-            uri = reverse_resource_version(self, self.view_name)
+            uri = reverse_resource_version(self, self.view_name, head=head)
         else:
             uri = reverse_resource(self, self.view_name)
 
         return uri
 
+    def get_uri_state(self):
+        return tuple(self.__dict__.get(field) for field in self.URI_FIELDS)
+
+    def stamp_uri(self, head=None):
+        """Recalculates the uri only if it is missing or one of URI_FIELDS changed since load (or the last stamp)."""
+        uri_state = self.get_uri_state()
+        if not self.uri or uri_state != self._uri_state:
+            self.uri = self.calculate_uri(head=head)
+            self._uri_state = uri_state
+
     @property
     def view_name(self):
         return self.get_default_view_name()
@@ -211,7 +236,7 @@ class VersionedModel(BaseResourceModel):
         return self.version == HEAD
 
     def get_head(self):
-        return self.active_versions.filter(version=HEAD).first()
+        return identity_map.get(self, HEAD, lambda: self.active_versions.filter(version=HEAD).first())
 
     head = property(get_head)
 
@@ -220,7 +245,9 @@ class VersionedModel(BaseResourceModel):
         return cls.objects.filter(**{cls.mnemonic_attr: mnemonic}, version=version).first()
 
     def get_latest_version(self):
-        return self.active_versions.filter(is_latest_version=True).order_by('-created_at').first()
+        return identity_map.get(
+            self, 'latest', lambda: self.active_versions.filter(is_latest_version=True).order_by('-created_at').first()
+        )
 
     def get_latest_released_version(self):
         return self.released_versions.order_by('-created_at').first()
@@ -252,18 +279,26 @@ class ConceptContainerModel(VersionedModel):
     last_concept_update = models.DateTimeField(default=timezone.now, null=True, blank=True)
     last_mapping_update = models.DateTimeField(default=timezone.now, null=True, blank=True)
     last_child_update = models.DateTimeField(default=timezone.now)
+    export_etag = models.TextField(null=True, blank=True)
+    is_processing = models.BooleanField(default=False)
+
+    CHILDREN_COUNT_FIELDS = [
+        'active_concepts', 'active_mappings', 'last_concept_update', 'last_mapping_update', 'last_child_update'
+    ]
 
     class Meta:
         abstract = True
 
     @classmethod
-    def get_base_queryset(cls, params):
+    def get_base_queryset(cls, params, requesting_user=None):
         username = params.get('user', None)
         org = params.get('org', None)
         version = params.get('version', None)
         is_latest = params.get('is_latest', None)
 
         queryset = cls.objects.filter(is_active=True)
+        if requesting_user:
+            queryset = queryset.filter(cls.get_visibility_criteria(requesting_user))
         if username:
             queryset = queryset.filter(user__username=username)
         if org:
@@ -275,6 +310,23 @@ class ConceptContainerModel(VersionedModel):
 
         return queryset
 
+    @staticmethod
+    def get_visibility_criteria(user, prefix=''):
+        """
+        Q matching the containers user can view, the queryset equivalent of CanViewConceptDictionary.
+        prefix reaches the container from a child, e.g. 'parent__' for concepts.
+        """
+        if user.is_staff:
+            return models.Q()
+
+        criteria = models.Q(**{prefix + 'public_access__in': [ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW]})
+        if user.is_authenticated:
+            criteria |= models.Q(**{prefix + 'user_id': user.id})
+            if user.organization_ids:
+                criteria |= models.Q(**{prefix + 'organization_id__in': user.organization_ids})
+
+        return criteria
+
     @property
     def concepts_url(self):
         return reverse_resource(self, 'concept-list')
@@ -383,7 +435,8 @@ class ConceptContainerModel(VersionedModel):
         return errors
 
     @classmethod
-    def persist_new_version(cls, obj, user=None, **kwargs):
+    def persist_new_version(cls, obj, user=None, sync=True, **kwargs):
+        """sync: seeds the version in place, otherwise a job seeds it and obj.job is set."""
         errors = dict()
 
         obj.is_active = True
@@ -391,28 +444,45 @@ class ConceptContainerModel(VersionedModel):
             obj.created_by = user
             obj.updated_by = user
         obj.update_version_data()
+        obj.copy_children_counts()
+        obj.is_processing = not sync
         obj.save(**kwargs)
-        obj.seed_concepts()
-        from core.collections.models import Collection
-        if isinstance(obj, Collection):
+        if sync:
+            obj.seed_concepts()
             obj.seed_references()
+        else:
+            from core.jobs.constants import SEED_VERSION
+            from core.jobs.models import Job
+            obj.job = Job.enqueue(SEED_VERSION, obj, user)
 
         if obj.id:
             obj.sibling_versions.update(is_latest_version=False)
+            identity_map.invalidate(obj)
 
         return errors
 
     @classmethod
-    def persist_changes(cls, obj, updated_by, **kwargs):
+    def persist_changes(cls, obj, updated_by, sync=True, **kwargs):
+        """
+        sync: validates the concepts against a new custom validation schema in place, otherwise the other changes
+        are saved and a job switches the schema once the concepts validate against it, obj.job is then set.
+        """
         errors = dict()
         parent_resource = kwargs.pop('parent_resource', obj.parent)
         if not parent_resource:
             errors['parent'] = 'Source parent cannot be None.'
 
+        new_validation_schema = None
         if obj.is_validation_necessary():
-            failed_concept_validations = obj.validate_child_concepts() or []
-            if len(failed_concept_validations) > 0:
-                errors.update({'failed_concept_validations': failed_concept_validations})
+            if sync:
+                failed_concept_validations = obj.validate_child_concepts() or []
+                if len(failed_concept_validations) > 0:
+                    errors.update({'failed_concept_validations': failed_concept_validations})
+            else:
+                new_validation_schema = obj.custom_validation_schema
+                obj.custom_validation_schema = cls.objects.filter(id=obj.id).values_list(
+                    'custom_validation_schema', flat=True
+                ).first()
 
         try:
             obj.full_clean()
@@ -429,6 +499,13 @@ class ConceptContainerModel(VersionedModel):
         except IntegrityError as ex:
             errors.update({'__all__': ex.args})
 
+        if new_validation_schema and not errors:
+            from core.jobs.constants import VALIDATE_SCHEMA
+            from core.jobs.models import Job
+            obj.job = Job.enqueue(
+                VALIDATE_SCHEMA, obj, updated_by, custom_validation_schema=new_validation_schema
+            )
+
         return errors
 
     def validate_child_concepts(self):
@@ -437,27 +514,76 @@ class ConceptContainerModel(VersionedModel):
         # according to the new schema
         from core.concepts.validators import ValidatorSpecifier
 
-        concepts = self.get_active_concepts()
-        failed_concept_validations = []
+        concepts = self.get_active_concepts().prefetch_related('names', 'descriptions')
 
         validator = ValidatorSpecifier().with_validation_schema(
             self.custom_validation_schema
         ).with_repo(self).with_reference_values().get()
 
-        for concept in concepts:
-            try:
-                validator.validate(concept)
-            except ValidationError as validation_error:
-                concept_validation_error = dict(
-                    mnemonic=concept.mnemonic, url=concept.url, errors=validation_error.message_dict
-                )
-                failed_concept_validations.append(concept_validation_error)
+        return [
+            dict(mnemonic=concept.mnemonic, url=concept.url, errors=validation_error.message_dict)
+            for concept, validation_error in validator.validate_in_batch(concepts)
+        ]
+
+    def seed_concepts(self):
+        pass
+
+    def seed_references(self):
+        pass
 
-        return failed_concept_validations
+    @property
+    def is_exportable(self):
+        """Released versions never change, so they are rendered once into an export artifact."""
+        return bool(self.released) and self.is_active and not self.is_head and not self.is_processing
+
+    def get_concepts_queryset(self):
+        return self.concepts.all()
+
+    def get_mappings_queryset(self):
+        return self.mappings.all()
+
+    def copy_children_counts(self):
+        """A new version is seeded with the children of HEAD, so it starts with its counts."""
+        head = self.head
+        if head:
+            for field in self.CHILDREN_COUNT_FIELDS:
+                setattr(self, field, getattr(head, field))
+
+    def track_children_counts(self, children, added=True):
+        """
+        Applies the delta of linking/unlinking children (concepts or mappings) to the counts, in the database,
+        so it costs the size of children and not the size of the container.
+        Unlinking counts as a change of the children at that time, so conditional GETs see the removal.
+        """
+        count_field = 'active_concepts' if children.model.__name__ == 'Concept' else 'active_mappings'
+        agg = children.aggregate(active=Count('id', filter=models.Q(retired=False)), last_update=Max('updated_at'))
+        updates = {count_field: F(count_field) + (agg['active'] if added else -agg['active'])}
+        last_update = agg['last_update'] if added else timezone.now()
+        if last_update:
+            updates.update(self.get_last_update_changes(children.model, last_update))
+
+        self.__class__.objects.filter(id=self.id).update(**updates)
+
+    @staticmethod
+    def get_last_update_changes(child_model, updated_at):
+        last_update_field = 'last_concept_update' if child_model.__name__ == 'Concept' else 'last_mapping_update'
+        last_update = Value(updated_at, output_field=models.DateTimeField())
+        return {
+            last_update_field: Greatest(last_update_field, last_update),
+            'last_child_update': Greatest('last_child_update', last_update),
+        }
+
+    def rebuild_children_counts(self):
+        self.update_active_counts()
+        self.update_last_updates()
+        self.__class__.objects.filter(id=self.id).update(
+            **{field: getattr(self, field) for field in self.CHILDREN_COUNT_FIELDS}
+        )
+        identity_map.invalidate(self)
 
     def update_active_counts(self):
-        self.active_concepts = self.concepts.filter(retired=False).count()
-        self.active_mappings = self.mappings.filter(retired=False).count()
+        self.active_concepts = self.get_concepts_queryset().filter(retired=False).count()
+        self.active_mappings = self.get_mappings_queryset().filter(retired=False).count()
 
     def update_last_updates(self):
         self.last_concept_update = self.__get_last_concept_updated_at()
@@ -465,14 +591,14 @@ class ConceptContainerModel(VersionedModel):
         self.last_child_update = self.__get_last_child_updated_at()
 
     def __get_last_concept_updated_at(self):
-        concepts = self.concepts
+        concepts = self.get_concepts_queryset()
         if not concepts.exists():
             return None
         agg = concepts.aggregate(Max('updated_at'))
         return agg.get('updated_at__max')
 
     def __get_last_mapping_updated_at(self):
-        mappings = self.mappings
+        mappings = self.get_mappings_queryset()
         if not mappings.exists():
             return None
         agg = mappings.aggregate(Max('updated_at'))
@@ -486,10 +612,16 @@ class ConceptContainerModel(VersionedModel):
         return last_concept_update or last_mapping_update or self.updated_at or timezone.now()
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        if self.id:
-            self.update_active_counts()
-            self.update_last_updates()
+        is_update = not self._state.adding and not force_insert
+        if is_update and update_fields is None:
+            # counts are kept by track_children_counts, so never write them back from a stale instance
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CHILDREN_COUNT_FIELDS
+            ]
         super().save(force_insert, force_update, using, update_fields)
+        if is_update:
+            self.refresh_from_db(fields=self.CHILDREN_COUNT_FIELDS)
 
     def update_version_data(self, obj=None):
         if obj:
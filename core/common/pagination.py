@@ -0,0 +1,100 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db import connection
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+from core.common.constants import CURSOR_PARAM, CURSOR_ORDER_PARAM, LIMIT_PARAM
+
+INVALID_CURSOR = 'Invalid cursor'
+
+
+class KeysetPagination:
+    """
+    Opt-in cursor pagination, enabled with ?cursor= (empty for the first page) and ordered by ?cursorOrder=updated
+    (newest first, default) or mnemonic.
+    Pages are read with WHERE (key, id) > (last key, last id) ORDER BY key, id LIMIT n, which the (key, id) indexes
+    serve directly, so there is no COUNT(*) or OFFSET scan and page 1000 costs the same as page 1.
+    """
+    default_page_size = 25
+    max_page_size = 1000
+    orderings = {
+        'updated': ('updated_at', True),
+        'mnemonic': ('mnemonic', False),
+    }
+    default_ordering = 'updated'
+
+    def __init__(self, request):
+        self.request = request
+        self.ordering = request.query_params.get(CURSOR_ORDER_PARAM, None) or self.default_ordering
+        if self.ordering not in self.orderings:
+            raise NotFound(INVALID_CURSOR)
+        self.key, self.descending = self.orderings[self.ordering]
+        self.page_size = self.get_page_size()
+        self.next_url = None
+
+    @staticmethod
+    def is_requested(request):
+        return CURSOR_PARAM in request.query_params
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.query_params.get(LIMIT_PARAM, self.default_page_size))
+        except ValueError:
+            page_size = self.default_page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset):
+        if self.key == 'mnemonic':
+            self.key = queryset.model.mnemonic_attr
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(prefix + self.key, prefix + 'id')
+        position = self.decode_cursor(self.request.query_params.get(CURSOR_PARAM, None))
+        if position:
+            queryset = queryset.extra(**self.get_position_criteria(queryset.model, *position))
+
+        page = list(queryset[:self.page_size + 1])
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_url = replace_query_param(
+                self.request.build_absolute_uri(), CURSOR_PARAM, self.encode_cursor(page[-1])
+            )
+
+        return page
+
+    def get_position_criteria(self, model, value, _id):
+        """A row comparison, which Postgres serves as a range scan of the (key, id) index."""
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)  # pylint: disable=protected-access
+        column = quote(model._meta.get_field(self.key).column)  # pylint: disable=protected-access
+        return dict(
+            where=['({table}.{column}, {table}."id") {operator} (%s, %s)'.format(
+                table=table, column=column, operator='<' if self.descending else '>'
+            )],
+            params=[value, _id]
+        )
+
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.key)
+        position = [value.isoformat() if hasattr(value, 'isoformat') else value, obj.id]
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            value, _id = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+            return value, int(_id)
+        except (TypeError, ValueError) as exc:
+            raise NotFound(INVALID_CURSOR) from exc
+
+    def get_headers(self, page):
+        headers = {'num_returned': len(page)}
+        if self.next_url:
+            headers['next'] = self.next_url
+            headers['Link'] = '<{}>; rel="next"'.format(self.next_url)
+
+        return headers
@@ -3,6 +3,11 @@ from rest_framework.permissions import BasePermission
 from core.common.constants import ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW
 
 
+def is_owner(user, container):
+    """user owns the source/collection container directly or through one of their organizations"""
+    return container.user_id == user.id or container.organization_id in user.organization_ids
+
+
 class IsSuperuser(BasePermission):
     """
     The request is authenticated, and the user is a superuser
@@ -15,18 +20,14 @@ class HasPrivateAccess(BasePermission):
     """
     Current user is authenticated as a staff user, or is designated as the referenced object's owner,
     or belongs to an organization that is designated as the referenced object's owner.
+    Ownership is read from the owner ids on the object and the organization ids cached on the user,
+    so no query is made per object.
     """
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff:
             return True
         if request.user.is_authenticated:
-            user = request.user
-            if hasattr(obj, 'parent') and user == obj.parent:
-                return True
-            if user.organizations.filter(id=obj.id):
-                return True
-            if hasattr(obj, 'parent_id') and user.organizations.filter(id=obj.parent_id):
-                return True
+            return is_owner(request.user, obj if hasattr(obj, 'organization_id') else obj.parent)
         return False
 
 
@@ -82,11 +83,6 @@ class HasAccessToVersionedObject(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff:
             return True
-        versioned_object = obj.head
-
-        from core.users.models import UserProfile
-        if isinstance(versioned_object.parent, UserProfile) and request.user.id == versioned_object.parent_id:
-            return True
         if request.user.is_authenticated:
-            return request.user.organizations.filter(id=versioned_object.parent_id).exists()
+            return is_owner(request.user, obj)  # versions share the owner of their head
         return False
@@ -1,3 +1,5 @@
+import os
+
 import boto3
 import requests
 from botocore.client import Config
@@ -56,6 +58,10 @@ class S3:
     def upload_file(cls, file_path, headers=None):
         return cls.upload(file_path, open(file_path, 'r').read(), headers)
 
+    @classmethod
+    def open_upload(cls, file_path):
+        return S3MultipartUpload(cls._conn(), settings.AWS_STORAGE_BUCKET_NAME, file_path)
+
     @classmethod
     def upload_public(cls, file_path, file_content):
         try:
@@ -115,3 +121,75 @@ class S3:
             )
         except NoCredentialsError: # pragma: no cover
             pass
+
+
+class S3MultipartUpload:
+    """
+    Writable stream uploading to S3 in parts of PART_SIZE (S3 needs at least 5MB for all but the last part),
+    so at most one part is held in memory. Completed on a clean exit of the with block, aborted otherwise.
+    """
+    PART_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, client, bucket, key):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = None
+        self.parts = []
+        self.buffer = bytearray()
+
+    def __enter__(self):
+        self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            return False
+
+        if self.buffer or not self.parts:
+            self.upload_part()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload=dict(Parts=self.parts)
+        )
+        return False
+
+    def write(self, data):
+        self.buffer.extend(data)
+        if len(self.buffer) >= self.PART_SIZE:
+            self.upload_part()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def upload_part(self):
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=bytes(self.buffer)
+        )
+        self.parts.append(dict(ETag=response['ETag'], PartNumber=part_number))
+        self.buffer = bytearray()
+
+
+class LocalStorage:
+    """Local filesystem stand-in for S3, files are kept under settings.EXPORT_LOCAL_ROOT."""
+
+    @staticmethod
+    def path_for(file_path):
+        return os.path.join(settings.EXPORT_LOCAL_ROOT, file_path)
+
+    @classmethod
+    def open_upload(cls, file_path):
+        path = cls.path_for(file_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, 'wb')
+
+    @classmethod
+    def url_for(cls, file_path):
+        path = cls.path_for(file_path) if file_path else None
+        return path if path and os.path.exists(path) else None
+
+
+def get_export_storage():
+    return LocalStorage if settings.EXPORT_STORAGE == 'local' else S3
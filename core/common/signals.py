@@ -1,15 +1,24 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-from core.common.models import BaseModel
+from core.collections.models import Collection
+from core.common.exports import schedule_export
+from core.common.identity_map import identity_map
+from core.common.models import BaseModel, ConceptContainerModel, VersionedModel
+from core.concepts.models import Concept
+from core.mappings.models import Mapping
 from core.orgs.models import Organization
+from core.sources.models import Source
+from core.users.authentication import invalidate_tokens
 from core.users.models import UserProfile
 
 
 @receiver(pre_save)
 def stamp_uri(sender, instance, **kwargs):  # pylint: disable=unused-argument
     if issubclass(sender, BaseModel):
-        instance.uri = instance.calculate_uri()
+        instance.stamp_uri()
 
 
 @receiver(post_save, sender=Organization)
@@ -18,3 +27,86 @@ def propagate_owner_status(sender, instance=None, created=False, **kwargs):  # p
     if not created and instance:
         instance.source_set.exclude(is_active=instance.is_active).update(is_active=instance.is_active)
         instance.collection_set.exclude(is_active=instance.is_active).update(is_active=instance.is_active)
+
+
+@receiver(m2m_changed, sender=Concept.sources.through)
+@receiver(m2m_changed, sender=Mapping.sources.through)
+@receiver(m2m_changed, sender=Collection.concepts.through)
+@receiver(m2m_changed, sender=Collection.mappings.through)
+def track_children_counts(
+        sender, instance=None, action=None, model=None, pk_set=None, **kwargs
+):  # pylint: disable=unused-argument
+    if action not in ['post_add', 'post_remove'] or not pk_set:
+        return
+
+    if isinstance(instance, ConceptContainerModel):
+        containers = [instance]
+        children = model.objects.filter(id__in=pk_set)
+    else:
+        containers = model.objects.filter(id__in=pk_set)
+        children = instance.__class__.objects.filter(id=instance.id)
+
+    for container in containers:
+        container.track_children_counts(children, action == 'post_add')
+
+
+@receiver(m2m_changed, sender=Collection.references.through)
+def track_references_update(
+        sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs
+):  # pylint: disable=unused-argument
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    collection_ids = pk_set if reverse else [instance.id]
+    if collection_ids:
+        Collection.objects.filter(id__in=collection_ids).update(last_child_update=timezone.now())
+
+
+@receiver(post_save, sender=Concept)
+@receiver(post_save, sender=Mapping)
+def track_children_last_update(sender, instance=None, created=False, **kwargs):  # pylint: disable=unused-argument
+    if not created and instance:
+        changes = ConceptContainerModel.get_last_update_changes(sender, instance.updated_at)
+        instance.sources.update(**changes)
+        instance.collection_set.update(**changes)
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=Collection)
+def export_released_version(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    if instance and instance.is_exportable and not instance.export_etag:
+        schedule_export(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_identity_map(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    if issubclass(sender, VersionedModel):
+        identity_map.invalidate(instance)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    if instance:
+        invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_cached_user_tokens(sender, instance=None, created=False, **kwargs):  # pylint: disable=unused-argument
+    if instance and not created:
+        invalidate_tokens(*Token.objects.filter(user_id=instance.id).values_list('key', flat=True))
+
+
+@receiver(m2m_changed, sender=UserProfile.organizations.through)
+def invalidate_organization_ids(
+        sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs
+):  # pylint: disable=unused-argument
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+
+    if reverse:
+        user_ids = pk_set if action != 'pre_clear' else instance.members.values_list('id', flat=True)
+    else:
+        user_ids = [instance.id]
+        instance.__dict__.pop('organization_ids', None)
+    UserProfile.invalidate_organization_ids(*user_ids)
@@ -1,3 +1,10 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
 from unittest.mock import patch, Mock, mock_open
 
 import boto3
@@ -7,16 +14,23 @@ from django.core.management import call_command
 from django.test import TestCase
 from django.test.runner import DiscoverRunner
 from moto import mock_s3
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
 from core.collections.models import Collection
 from core.common.constants import HEAD, OCL_ORG_ID, SUPER_ADMIN_USER_ID
-from core.common.utils import compact_dict_by_values
+from core.common.exports import export_version, get_export_path
+from core.common.identity_map import identity_map
+from core.common.pagination import KeysetPagination
+from core.common.utils import compact_dict_by_values, write_csv_zip, write_csv_to_s3, get_csv_from_s3
 from core.concepts.models import Concept, LocalizedText
+from core.concepts.validators import reference_values_registry
 from core.mappings.models import Mapping
 from core.orgs.models import Organization
 from core.sources.models import Source
 from core.users.models import UserProfile
-from .services import S3
+from .services import S3, S3MultipartUpload
 
 
 class CustomTestRunner(ColourRunnerMixin, DiscoverRunner):
@@ -29,6 +43,10 @@ class OCLTestCase(TestCase):
         super().setUpClass()
         call_command("loaddata", "core/fixtures/base_entities.yaml")
 
+    def setUp(self):
+        super().setUp()
+        reference_values_registry.invalidate()  # tests roll back instead of committing, see ReferenceValuesRegistry
+
     def tearDown(self):
         Collection.objects.all().delete()
         Mapping.objects.all().delete()
@@ -297,3 +315,353 @@ class UtilsTest(OCLTestCase):
             compact_dict_by_values(dict(foo=2, bar='')),
             dict(foo=2)
         )
+
+
+class KeysetPaginationTest(OCLTestCase):
+    @staticmethod
+    def get_request(**params):
+        return Request(APIRequestFactory().get('/concepts/', params))
+
+    def test_paginate_queryset(self):
+        from core.concepts.tests.factories import ConceptFactory
+        source = ConceptFactory().parent
+        for mnemonic in ['c', 'a', 'd', 'b']:
+            ConceptFactory(parent=source, mnemonic=mnemonic)
+        queryset = Concept.objects.filter(parent=source, mnemonic__in=['a', 'b', 'c', 'd'])
+
+        paginator = KeysetPagination(self.get_request(cursor='', cursorOrder='mnemonic', limit=3))
+        page = paginator.paginate_queryset(queryset)
+
+        self.assertEqual([concept.mnemonic for concept in page], ['a', 'b', 'c'])
+        self.assertEqual(paginator.get_headers(page)['num_returned'], 3)
+        next_url = paginator.get_headers(page)['next']
+
+        paginator = KeysetPagination(Request(APIRequestFactory().get(next_url)))
+        with self.assertNumQueries(1):
+            page = paginator.paginate_queryset(queryset)
+
+        self.assertEqual([concept.mnemonic for concept in page], ['d'])
+        self.assertEqual(paginator.get_headers(page), dict(num_returned=1))
+
+    def test_paginate_queryset_by_updated_at(self):
+        from core.concepts.tests.factories import ConceptFactory
+        concept1 = ConceptFactory()
+        concept2 = ConceptFactory()
+        Concept.objects.filter(id__in=[concept1.id, concept2.id]).update(updated_at=concept1.updated_at)
+        queryset = Concept.objects.filter(id__in=[concept1.id, concept2.id])
+
+        paginator = KeysetPagination(self.get_request(cursor='', limit=1))
+        first_page = paginator.paginate_queryset(queryset)
+        paginator = KeysetPagination(Request(APIRequestFactory().get(paginator.next_url)))
+        second_page = paginator.paginate_queryset(queryset)
+
+        self.assertEqual(first_page, [concept2])
+        self.assertEqual(second_page, [concept1])
+        self.assertIsNone(paginator.next_url)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            KeysetPagination(self.get_request(cursor='foobar')).paginate_queryset(Concept.objects.all())
+        with self.assertRaises(NotFound):
+            KeysetPagination(self.get_request(cursor='', cursorOrder='foobar'))
+
+
+class BaseModelTest(OCLTestCase):
+    def test_stamp_uri_only_when_uri_fields_change(self):
+        from core.sources.tests.factories import SourceFactory
+        source = Source.objects.get(id=SourceFactory(mnemonic='source1').id)
+        uri = source.uri
+
+        with patch.object(Source, 'calculate_uri', return_value='/foobar/') as calculate_uri_mock:
+            source.name = 'renamed'
+            source.save()
+            calculate_uri_mock.assert_not_called()
+            self.assertEqual(source.uri, uri)
+
+            source.mnemonic = 'source2'
+            source.save()
+            calculate_uri_mock.assert_called_once()
+            self.assertEqual(source.uri, '/foobar/')
+
+    def test_calculate_uri_with_loaded_head(self):
+        from core.sources.tests.factories import SourceFactory
+        head = SourceFactory(version=HEAD)
+        version = SourceFactory.build(
+            version='v1', mnemonic=head.mnemonic, organization=head.organization, is_latest_version=False
+        )
+
+        with self.assertNumQueries(0):
+            uri = version.calculate_uri(head=head)
+
+        self.assertEqual(uri, '{}v1/'.format(head.uri))
+
+
+class CSVExportTest(TestCase):
+    def test_write_csv_zip(self):
+        stream = io.BytesIO()
+        rows = ({'ID': str(index), 'Name': 'name,{}'.format(index)} for index in range(3))
+
+        write_csv_zip(rows, stream, 'export.csv')
+
+        with zipfile.ZipFile(stream) as zip_file:
+            self.assertEqual(zip_file.namelist(), ['export.csv'])
+            self.assertEqual(
+                zip_file.read('export.csv').decode(),
+                'ID,Name\r\n0,"name,0"\r\n1,"name,1"\r\n2,"name,2"\r\n'
+            )
+
+    def test_write_csv_to_local_storage(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as export_root:
+            with self.settings(EXPORT_STORAGE='local', EXPORT_LOCAL_ROOT=export_root):
+                url = write_csv_to_s3([{'ID': 'foo'}], True, filename='orgs_OCL_sources')
+                self.assertEqual(get_csv_from_s3('orgs_OCL_sources', True), url)
+                self.assertIsNone(get_csv_from_s3('orgs_OCL_sources', False))
+
+            self.assertEqual(url, os.path.join(export_root, 'downloads/creator/orgs_OCL_sources.csv.zip'))
+            with zipfile.ZipFile(url) as zip_file:
+                self.assertEqual(zip_file.read('orgs_OCL_sources.csv').decode(), 'ID\r\nfoo\r\n')
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_s3_multipart_upload(self):
+        client = Mock()
+        client.create_multipart_upload = Mock(return_value=dict(UploadId='upload-id'))
+        client.upload_part = Mock(side_effect=[dict(ETag='etag1'), dict(ETag='etag2')])
+
+        with patch.object(S3MultipartUpload, 'PART_SIZE', 4):
+            with S3MultipartUpload(client, 'ocl-api-dev', 'some/path') as upload:
+                upload.write(b'abc')
+                upload.write(b'def')
+                upload.write(b'g')
+
+        self.assertEqual(
+            [call.kwargs['Body'] for call in client.upload_part.call_args_list], [b'abcdef', b'g']
+        )
+        client.complete_multipart_upload.assert_called_once_with(
+            Bucket='ocl-api-dev', Key='some/path', UploadId='upload-id', MultipartUpload=dict(Parts=[
+                dict(ETag='etag1', PartNumber=1), dict(ETag='etag2', PartNumber=2)
+            ])
+        )
+        client.abort_multipart_upload.assert_not_called()
+
+    def test_s3_multipart_upload_aborts_on_error(self):
+        client = Mock()
+        client.create_multipart_upload = Mock(return_value=dict(UploadId='upload-id'))
+
+        with self.assertRaises(ValueError):
+            with S3MultipartUpload(client, 'ocl-api-dev', 'some/path'):
+                raise ValueError()
+
+        client.abort_multipart_upload.assert_called_once_with(
+            Bucket='ocl-api-dev', Key='some/path', UploadId='upload-id'
+        )
+        client.complete_multipart_upload.assert_not_called()
+
+
+class VersionExportTest(OCLTestCase):
+    def setUp(self):
+        super().setUp()
+        from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+        from core.mappings.tests.factories import MappingFactory
+        from core.sources.tests.factories import SourceFactory
+        self.head = SourceFactory(version=HEAD)
+        self.concept = ConceptFactory(parent=self.head, names=(LocalizedTextFactory(name='Malaria', locale='en'),))
+        self.mapping = MappingFactory(parent=self.head, from_concept=self.concept, to_concept=self.concept)
+        self.version = SourceFactory(
+            version='v1', mnemonic=self.head.mnemonic, organization=self.head.organization, released=True,
+            is_latest_version=False
+        )
+        self.version.concepts.add(self.concept)
+        self.version.mappings.add(self.mapping)
+
+    def test_export_version(self):
+        with tempfile.TemporaryDirectory() as export_root:
+            with self.settings(EXPORT_STORAGE='local', EXPORT_LOCAL_ROOT=export_root):
+                etag = export_version(self.version)
+                path = os.path.join(export_root, get_export_path(self.version))
+                with open(path, 'rb') as artifact:
+                    content = artifact.read()
+                self.assertEqual(export_version(self.version), etag)
+
+        self.assertEqual(etag, hashlib.sha256(content).hexdigest())
+        self.assertEqual(Source.objects.get(id=self.version.id).export_etag, etag)
+        export = json.loads(gzip.decompress(content))
+        self.assertEqual(export['url'], self.version.uri)
+        self.assertEqual([concept['id'] for concept in export['concepts']], [self.concept.mnemonic])
+        self.assertEqual([name['name'] for name in export['concepts'][0]['names']], ['Malaria'])
+        self.assertEqual([mapping['uuid'] for mapping in export['mappings']], [self.mapping.id])
+
+    def test_get_export(self):
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(UserProfile.objects.get(id=SUPER_ADMIN_USER_ID))
+        url = self.version.uri + 'export/'
+
+        self.assertEqual(client.get(url).status_code, 202)
+        self.assertEqual(client.get(self.head.uri + 'HEAD/export/').status_code, 404)
+
+        with tempfile.TemporaryDirectory() as export_root:
+            with self.settings(EXPORT_STORAGE='local', EXPORT_LOCAL_ROOT=export_root):
+                etag = '"{}"'.format(export_version(self.version))
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(b''.join(response.streaming_content)[:2], b'\x1f\x8b')
+
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+
+class IdentityMapTest(OCLTestCase):
+    def test_head_is_loaded_once_per_scope(self):
+        from core.sources.tests.factories import SourceFactory
+        head = SourceFactory(version=HEAD)
+        version = SourceFactory(
+            version='v1', mnemonic=head.mnemonic, organization=head.organization, is_latest_version=False
+        )
+
+        with self.assertNumQueries(2):
+            self.assertEqual(version.head, head)
+            self.assertEqual(version.head, head)
+
+        head_copy = Source.objects.get(id=head.id)
+        with identity_map.scope():
+            with self.assertNumQueries(1):
+                self.assertEqual(version.head, head)
+                self.assertIs(head_copy.head, version.head)
+
+            with self.assertNumQueries(1):
+                self.assertEqual(version.get_latest_version(), head)
+                version.get_latest_version()
+
+            head.name = 'renamed'
+            head.save()
+            with self.assertNumQueries(1):
+                self.assertEqual(version.head.name, 'renamed')
+
+        self.assertIsNone(identity_map.entries)
+
+    def test_latest_version_is_invalidated_by_new_concept_version(self):
+        from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+        concept = ConceptFactory(names=(LocalizedTextFactory(),))
+
+        with identity_map.scope():
+            self.assertEqual(concept.head, concept)
+            clone = concept.clone()
+            self.assertEqual(Concept.persist_clone(clone, concept.created_by), dict())
+
+            self.assertEqual(concept.head, clone)
+
+
+class ConditionalGetTest(OCLTestCase):
+    def setUp(self):
+        super().setUp()
+        from rest_framework.test import APIClient
+        from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+        from core.sources.tests.factories import SourceFactory
+        self.source = SourceFactory(version=HEAD)
+        self.concept = ConceptFactory(parent=self.source, names=(LocalizedTextFactory(),))
+        self.source.concepts.add(self.concept)
+        self.client = APIClient()
+        self.client.force_authenticate(UserProfile.objects.get(id=SUPER_ADMIN_USER_ID))
+
+    def test_not_modified_until_children_change(self):
+        url = self.source.uri + 'concepts/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url + '?limit=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.source.concepts.remove(self.concept)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_versions_not_modified_until_a_version_is_added(self):
+        from core.sources.tests.factories import SourceFactory
+        url = self.source.uri + 'versions/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        SourceFactory(
+            version='v1', mnemonic=self.source.mnemonic, organization=self.source.organization, is_latest_version=False
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTest(OCLTestCase):
+    def test_released_version_listing_is_shared_per_scope(self):
+        from rest_framework.test import APIClient
+        from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+        from core.sources.tests.factories import SourceFactory
+        from core.users.tests.factories import UserProfileFactory
+        head = SourceFactory(version=HEAD)
+        concept = ConceptFactory(parent=head, names=(LocalizedTextFactory(),))
+        version = SourceFactory(
+            version='v1', mnemonic=head.mnemonic, organization=head.organization, released=True,
+            is_latest_version=False
+        )
+        version.concepts.add(concept)
+        url = version.uri + 'concepts/'
+        member = UserProfileFactory()
+        member.organizations.add(head.organization)
+        client = APIClient()
+        client.force_authenticate(member)
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url).content, response.content)
+
+        with self.assertNumQueries(4):
+            self.assertEqual(APIClient().get(url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(APIClient().get(url).content, response.content)
+
+        Source.objects.filter(id=version.id).update(retired=True)
+        with self.assertNumQueries(4):
+            self.assertEqual(client.get(url).status_code, 200)
+
+
+class FacetsTest(OCLTestCase):
+    def test_concept_listing_facets(self):
+        from rest_framework.test import APIClient
+        from core.common.mixins import FacetsMixin
+        from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+        from core.sources.tests.factories import SourceFactory
+        source = SourceFactory(version=HEAD)
+        ConceptFactory(
+            parent=source, concept_class='Diagnosis', datatype='None',
+            names=(LocalizedTextFactory(locale='en'), LocalizedTextFactory(locale='fr'))
+        )
+        ConceptFactory(parent=source, concept_class='Drug', datatype='N/A', names=(LocalizedTextFactory(locale='en'),))
+        ConceptFactory(parent=source, concept_class='Drug', datatype='None', retired=True, names=(
+            LocalizedTextFactory(locale='es'),
+        ))
+        url = source.uri + 'concepts/?facets=true&includeRetired=true'
+
+        with patch('core.common.mixins.FacetsMixin.count_facets', side_effect=FacetsMixin.count_facets) as count_mock:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 3)
+            self.assertEqual(
+                response.data['facets'], dict(
+                    conceptClass={'Diagnosis': 1, 'Drug': 2}, datatype={'None': 2, 'N/A': 1},
+                    locale={'en': 2, 'fr': 1, 'es': 1}, retired={False: 2, True: 1}
+                )
+            )
+            self.assertEqual(APIClient().get(url + '&verbose=true').data['facets'], response.data['facets'])
+            self.assertEqual(count_mock.call_count, 1)
+
+            self.assertEqual(
+                APIClient().get(source.uri + 'concepts/?facets=true').data['facets']['retired'], {False: 2}
+            )
+            self.assertEqual(count_mock.call_count, 2)
+
+        ConceptFactory(parent=source, concept_class='Drug', names=(LocalizedTextFactory(locale='en'),))
+        self.assertEqual(APIClient().get(url).data['facets']['conceptClass'], {'Diagnosis': 1, 'Drug': 3})
+        self.assertIsInstance(APIClient().get(source.uri + 'concepts/').data, list)
@@ -1,36 +1,47 @@
-import os
-import tempfile
+import csv
+import io
 import zipfile
+from functools import lru_cache
 from urllib import parse
 
 from dateutil import parser
+from django.db import connection
 from django.urls import NoReverseMatch, reverse, get_resolver, resolve, Resolver404
-from djqscsv import csv_file_for
 from pydash import flatten
 
 from core.common.constants import UPDATED_SINCE_PARAM
-from core.common.services import S3
+from core.common.services import get_export_storage
 
 
-def cd_temp():
-    cwd = os.getcwd()
-    tmpdir = tempfile.mkdtemp()
-    os.chdir(tmpdir)
-    return cwd
+def write_csv_to_s3(data, is_owner, **kwargs):
+    storage = get_export_storage()
+    filename = kwargs.get('filename', None) or 'export'
+    file_path = get_downloads_path(is_owner) + filename + '.csv.zip'
+    with storage.open_upload(file_path) as upload:
+        write_csv_zip(data, upload, filename + '.csv')
 
+    return storage.url_for(file_path)
 
-def write_csv_to_s3(data, is_owner, **kwargs):
-    cwd = cd_temp()
-    csv_file = csv_file_for(data, **kwargs)
-    csv_file.close()
-    zip_file_name = csv_file.name + '.zip'
-    with zipfile.ZipFile(zip_file_name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.write(csv_file.name)
 
-    file_path = get_downloads_path(is_owner) + zip_file_name
-    S3.upload_file(file_path)
-    os.chdir(cwd)
-    return S3.url_for(file_path)
+def write_csv_zip(rows, stream, csv_name):
+    """
+    Writes rows (dicts, header taken from the first one) as a zipped csv into a writable stream, one row at a time.
+    Querysets are read through a server side cursor, so memory stays bounded whatever the number of rows.
+    """
+    if hasattr(rows, 'iterator'):
+        rows = rows.iterator(chunk_size=2000)
+
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with zip_file.open(csv_name, 'w', force_zip64=True) as csv_entry:
+            text = io.TextIOWrapper(csv_entry, encoding='utf-8', newline='')
+            writer = None
+            for row in rows:
+                if writer is None:
+                    writer = csv.DictWriter(text, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+            text.flush()
+            text.detach()
 
 
 def compact_dict_by_values(_dict):
@@ -48,7 +59,7 @@ def get_downloads_path(is_owner):
 
 def get_csv_from_s3(filename, is_owner):
     filename = get_downloads_path(is_owner) + filename + '.csv.zip'
-    return S3.url_for(filename)
+    return get_export_storage().url_for(filename)
 
 
 def get_owner_type(owner, resources_url):
@@ -60,11 +71,13 @@ def join_uris(resources):
     return ', '.join([resource.uri for resource in resources])
 
 
-def reverse_resource(resource, viewname, args=None, kwargs=None, **extra):
+def reverse_resource(resource, viewname, args=None, kwargs=None, head=None, **extra):
     """
     Generate the URL for the view specified as viewname of the object specified as resource.
+    head, when given, is used as the latest version of resource instead of loading it.
     """
     kwargs = kwargs or {}
+    allowed_kwargs = get_kwargs_for_view(viewname)
     parent = resource
     while parent is not None:
         if not hasattr(parent, 'get_url_kwarg'):
@@ -73,17 +86,14 @@ def reverse_resource(resource, viewname, args=None, kwargs=None, **extra):
         if parent.is_versioned and not parent.is_head:
             from core.collections.models import Collection
             from core.sources.models import Source
-            if isinstance(parent, (Source, Collection)):
-                head = parent.get_latest_version()
-            else:
-                head = parent.head
+            if parent is not resource or head is None:
+                head = parent.get_latest_version() if isinstance(parent, (Source, Collection)) else parent.head
             kwargs.update({head.get_url_kwarg(): head.mnemonic, parent.get_url_kwarg(): parent.version})
             if parent.get_resource_url_kwarg() not in kwargs:
                 kwargs.update({parent.get_resource_url_kwarg(): parent.mnemonic})
         else:
             kwargs.update({parent.get_url_kwarg(): parent.mnemonic})
         parent = parent.parent if hasattr(parent, 'parent') else None
-        allowed_kwargs = get_kwargs_for_view(viewname)
         for key in kwargs.copy():
             if key not in allowed_kwargs:
                 kwargs.pop(key)
@@ -91,7 +101,7 @@ def reverse_resource(resource, viewname, args=None, kwargs=None, **extra):
     return reverse(viewname=viewname, args=args, kwargs=kwargs, **extra)
 
 
-def reverse_resource_version(resource, viewname, args=None, kwargs=None, **extra):
+def reverse_resource_version(resource, viewname, args=None, kwargs=None, head=None, **extra):
     """
     Generate the URL for the view specified as viewname of the object that is
     versioned by the object specified as resource.
@@ -99,10 +109,8 @@ def reverse_resource_version(resource, viewname, args=None, kwargs=None, **extra
     """
     from core.collections.models import Collection
     from core.sources.models import Source
-    if isinstance(resource, (Source, Collection)):
-        head = resource.get_latest_version()
-    else:
-        head = resource.head
+    if head is None:
+        head = resource.get_latest_version() if isinstance(resource, (Source, Collection)) else resource.head
 
     kwargs = kwargs or {}
     kwargs.update({
@@ -114,13 +122,17 @@ def reverse_resource_version(resource, viewname, args=None, kwargs=None, **extra
     if resource_url_kwarg not in kwargs:
         kwargs[resource_url_kwarg] = resource.mnemonic
 
-    return reverse_resource(resource, viewname, args, kwargs, **extra)
+    return reverse_resource(resource, viewname, args, kwargs, head, **extra)
 
 
 def get_kwargs_for_view(view_name):
-    resolver = get_resolver()
+    return get_kwargs_for_resolver_view(get_resolver(), view_name)
+
+
+@lru_cache(maxsize=None)
+def get_kwargs_for_resolver_view(resolver, view_name):
     patterns = resolver.reverse_dict.getlist(view_name)
-    return list(set(flatten([p[0][0][1] for p in patterns])))
+    return frozenset(flatten([p[0][0][1] for p in patterns]))
 
 
 def parse_updated_since_param(params):
@@ -158,3 +170,10 @@ def is_valid_uri(uri):
         pass
 
     return False
+
+
+@lru_cache(maxsize=None)
+def has_db_extension(name):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_extension WHERE extname = %s', [name])
+        return cursor.fetchone() is not None
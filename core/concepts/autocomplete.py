@@ -0,0 +1,123 @@
+import re
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+WORD_START = re.compile(r'(?<!\w)\w')
+KEY_LENGTH = 32  # characters of an entry compared when sorting, longer prefixes are checked while scanning
+
+
+class ConceptAutocompleteIndex:
+    """
+    Sorted prefix index over the names and mnemonics of the concepts of a source version.
+    Each name is indexed from its start and from the start of each of its words, lowercased, so "mal" and "fev"
+    both find "Malaria Fever". An entry is a (text_indexes, offsets) pair pointing into texts, which holds every
+    distinct name of a concept once, and entries are sorted by the text from their offset, so the matches of a
+    prefix are a contiguous run found by bisection. text_positions, parallel to texts, point to the concept in
+    concepts. At most max_entries are indexed, name starts first, then the other word starts.
+    """
+    def __init__(self, stamp, concepts, names, max_entries):
+        self.stamp = stamp
+        self.concepts = []
+        texts = set()
+        position_by_id = dict()
+        for concept_id, mnemonic, display_name, url in concepts:
+            position_by_id[concept_id] = len(self.concepts)
+            self.concepts.append((mnemonic, display_name, url))
+            texts.add((mnemonic.lower(), position_by_id[concept_id]))
+        for concept_id, name in names:
+            position = position_by_id.get(concept_id, None)
+            if position is not None:
+                texts.add((name.lower(), position))
+
+        texts = sorted(texts)
+        self.texts = [text for text, _ in texts]
+        self.text_positions = array('I', [position for _, position in texts])
+
+        entries = [(text_index, 0) for text_index in range(len(self.texts))]
+        entries.extend(
+            (text_index, match.start()) for text_index, text in enumerate(self.texts)
+            for match in WORD_START.finditer(text) if match.start()
+        )
+        del entries[max_entries:]
+        entries.sort(key=lambda entry: (self.get_key(*entry, KEY_LENGTH), self.text_positions[entry[0]]))
+        self.text_indexes = array('I', [text_index for text_index, _ in entries])
+        self.offsets = array('I', [offset for _, offset in entries])
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, version):
+        from core.concepts.models import Concept
+        concepts = version.get_concepts_queryset().filter(is_active=True, retired=False, is_latest_version=True)
+        return cls(
+            version.last_concept_update,
+            concepts.values_list('id', 'mnemonic', 'preferred_name', 'uri'),
+            Concept.names.through.objects.filter(
+                concept_id__in=concepts.values('id')
+            ).values_list('concept_id', 'localizedtext__name'),
+            settings.AUTOCOMPLETE_ENTRIES
+        )
+
+    def get_key(self, text_index, offset, length):
+        return self.texts[text_index][offset:offset + length]
+
+    def get_entry_key(self, index, length):
+        return self.get_key(self.text_indexes[index], self.offsets[index], length)
+
+    def find(self, key):
+        """Returns the index of the first entry whose text from its offset is not lower than key."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_entry_key(middle, len(key)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def search(self, prefix, limit):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        key = prefix[:KEY_LENGTH]
+        results = []
+        seen = set()
+        index = self.find(key)
+        while index < len(self) and len(results) < limit and self.get_entry_key(index, len(key)) == key:
+            text_index = self.text_indexes[index]
+            position = self.text_positions[text_index]
+            if position not in seen and self.texts[text_index].startswith(prefix, self.offsets[index]):
+                seen.add(position)
+                mnemonic, display_name, url = self.concepts[position]
+                results.append(dict(id=mnemonic, display_name=display_name, url=url))
+            index += 1
+
+        return results
+
+
+class ConceptAutocompleteRegistry:
+    """
+    Keeps the autocomplete indexes of the most recently searched source versions in process memory,
+    evicting the least recently searched ones once they hold more than AUTOCOMPLETE_ENTRIES entries.
+    An index is rebuilt when last_concept_update of its version has changed since it was built.
+    """
+    def __init__(self):
+        self.indexes = OrderedDict()
+
+    def get(self, version):
+        index = self.indexes.pop(version.id, None)
+        if index is None or index.stamp != version.last_concept_update:
+            index = ConceptAutocompleteIndex.build(version)
+        self.indexes[version.id] = index
+        entries = sum(len(_index) for _index in self.indexes.values())
+        while entries > settings.AUTOCOMPLETE_ENTRIES:
+            entries -= len(self.indexes.popitem(last=False)[1])
+
+        return index
+
+
+concept_autocomplete_registry = ConceptAutocompleteRegistry()
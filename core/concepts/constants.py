@@ -27,3 +27,10 @@ CONCEPT_WAS_RETIRED = 'Concept was retired'
 CONCEPT_WAS_UNRETIRED = 'Concept was un-retired'
 CONCEPT_IS_ALREADY_RETIRED = 'Concept is already retired'
 CONCEPT_IS_ALREADY_NOT_RETIRED = 'Concept is already not retired'
+CONCEPT_MNEMONIC_ALREADY_EXISTS = 'Concept with this id already exists in the source'
+INVALID_JSON_LINE = 'Line is not a valid JSON object'
+INVALID_OPERATION = 'Operation must be add, update or delete on names, descriptions or extras'
+OPERATIONS_CANNOT_BE_EMPTY = 'Must specify a list of operations'
+LABEL_NOT_FOUND = 'Label not found'
+EXTRA_NOT_FOUND = 'Extra not found'
+EXTRA_KEY_CANNOT_BE_EMPTY = 'Must specify key and value of the extra'
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.core.exceptions import ValidationError
 
 from core.common.constants import LOOKUP_CONCEPT_CLASSES
@@ -18,6 +20,7 @@ class OpenMRSConceptValidator(BaseConceptValidator):
         super().__init__(**kwargs)
         self.repo = kwargs.pop('repo')
         self.reference_values = kwargs.pop('reference_values')
+        self.names_index = None
 
     def validate_concept_based(self, concept):
         self.must_have_exactly_one_preferred_name(concept)
@@ -32,6 +35,25 @@ class OpenMRSConceptValidator(BaseConceptValidator):
         self.fully_specified_name_should_be_unique_for_source_and_locale(concept)
         self.preferred_name_should_be_unique_for_source_and_locale(concept)
 
+    def validate_in_batch(self, concepts):
+        # source wide name checks are answered from one (locale, name) -> concept ids index instead of a query per name
+        self.names_index = self.build_names_index()
+        try:
+            return super().validate_in_batch(concepts)
+        finally:
+            self.names_index = None
+
+    def build_names_index(self):
+        names_index = defaultdict(set)
+        if self.repo:
+            names = self.repo.concepts_set.exclude(names__type__in=LOCALES_SHORT).filter(
+                is_active=True, retired=False, is_latest_version=True
+            ).values_list('names__locale', 'names__name', 'id')
+            for locale, name, concept_id in names:
+                names_index[(locale, name)].add(concept_id)
+
+        return names_index
+
     @staticmethod
     def must_have_exactly_one_preferred_name(concept):
         preferred_name_locales_in_concept = dict()
@@ -82,6 +104,9 @@ class OpenMRSConceptValidator(BaseConceptValidator):
         if not self.repo:
             return True
 
+        if self.names_index is not None:
+            return not self.names_index.get((name.locale, name.name), set()) - {self_id}
+
         return not self.repo.concepts_set.exclude(
             id=self_id
         ).exclude(names__type__in=LOCALES_SHORT).filter(
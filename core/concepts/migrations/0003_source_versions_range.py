@@ -0,0 +1,33 @@
+# Generated by Django 3.0.8 on 2020-07-27 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0002_auto_20200720_1450'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='concept',
+            name='source_versions_end',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='source_versions_start',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE concepts SET source_versions_start = (SELECT COALESCE(MAX(id), 0) + 1 FROM sources)
+            WHERE id IN (
+                SELECT concepts_sources.concept_id FROM concepts_sources
+                INNER JOIN sources ON sources.id = concepts_sources.source_id WHERE sources.version = 'HEAD'
+            )
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.0.8 on 2020-07-28 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0003_source_versions_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='concept',
+            name='iso_639_1_name',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='preferred_name',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='preferred_name_locale',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE concepts SET preferred_name = names.name, preferred_name_locale = names.locale
+            FROM (
+                SELECT DISTINCT ON (concepts_names.concept_id) concepts_names.concept_id, localized_texts.name,
+                localized_texts.locale
+                FROM concepts_names
+                INNER JOIN localized_texts ON localized_texts.id = concepts_names.localizedtext_id
+                ORDER BY concepts_names.concept_id, localized_texts.locale_preferred DESC,
+                localized_texts.created_at DESC
+            ) names
+            WHERE concepts.id = names.concept_id;
+            UPDATE concepts SET iso_639_1_name = names.name
+            FROM (
+                SELECT DISTINCT ON (concepts_names.concept_id) concepts_names.concept_id, localized_texts.name
+                FROM concepts_names
+                INNER JOIN localized_texts ON localized_texts.id = concepts_names.localizedtext_id
+                WHERE localized_texts.type = 'ISO 639-1'
+                ORDER BY concepts_names.concept_id, localized_texts.id
+            ) names
+            WHERE concepts.id = names.concept_id;
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.8 on 2020-07-29 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0004_concept_display_names'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='concept',
+            index=models.Index(fields=['updated_at', 'id'], name='concepts_updated_at_id'),
+        ),
+        migrations.AddIndex(
+            model_name='concept',
+            index=models.Index(fields=['mnemonic', 'id'], name='concepts_mnemonic_id'),
+        ),
+    ]
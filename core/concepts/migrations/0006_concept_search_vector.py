@@ -0,0 +1,66 @@
+# Generated by Django 3.0.8 on 2020-07-30 11:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='concept',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='concept',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='concepts_search_vector'),
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX localized_texts_upper_name ON localized_texts (UPPER(name));",
+            "DROP INDEX localized_texts_upper_name;"
+        ),
+        migrations.RunSQL(
+            """
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                    CREATE INDEX localized_texts_name_trgm ON localized_texts USING gin (name gin_trgm_ops);
+                END IF;
+            END $$;
+            """,
+            "DROP INDEX IF EXISTS localized_texts_name_trgm;"
+        ),
+        migrations.RunSQL(
+            "CREATE AGGREGATE tsvector_agg (tsvector) (SFUNC = tsvector_concat, STYPE = tsvector, INITCOND = '');",
+            "DROP AGGREGATE tsvector_agg (tsvector);"
+        ),
+        migrations.RunSQL(
+            """
+            WITH labels AS (
+                SELECT concepts_names.concept_id, localized_texts.name, CASE
+                    WHEN localized_texts.type IN ('FULLY_SPECIFIED', 'Fully Specified') THEN 'A'
+                    WHEN localized_texts.locale_preferred THEN 'B'
+                    ELSE 'C' END::"char" AS weight
+                FROM concepts_names
+                INNER JOIN localized_texts ON localized_texts.id = concepts_names.localizedtext_id
+                UNION ALL
+                SELECT concepts_descriptions.concept_id, localized_texts.name, 'D'::"char" AS weight
+                FROM concepts_descriptions
+                INNER JOIN localized_texts ON localized_texts.id = concepts_descriptions.localizedtext_id
+            )
+            UPDATE concepts SET search_vector = vectors.search_vector FROM (
+                SELECT concept_id, tsvector_agg(setweight(to_tsvector('simple', name), weight)) AS search_vector
+                FROM labels GROUP BY concept_id
+            ) vectors
+            WHERE concepts.id = vectors.concept_id;
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -1,12 +1,18 @@
+import re
+
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank, SearchVector
 from django.core.exceptions import ValidationError
-from django.db import models, IntegrityError, transaction
+from django.db import models, IntegrityError, transaction, connection
 from pydash import get, compact
 
-from core.common.constants import TEMP, ISO_639_1, INCLUDE_RETIRED_PARAM, ACCESS_TYPE_NONE
+from core.common.constants import TEMP, ISO_639_1, INCLUDE_RETIRED_PARAM, SEARCH_PARAM, LOCALE_PARAM, \
+    EXACT_MATCH_PARAM
+from core.common.identity_map import identity_map
 from core.common.mixins import SourceChildMixin
 from core.common.models import VersionedModel
-from core.common.utils import reverse_resource, parse_updated_since_param
+from core.common.utils import reverse_resource, parse_updated_since_param, compact_dict_by_values, has_db_extension
 from core.concepts.constants import CONCEPT_TYPE, LOCALES_FULLY_SPECIFIED, LOCALES_SHORT, LOCALES_SEARCH_INDEX_TERM, \
     CONCEPT_WAS_RETIRED, CONCEPT_IS_ALREADY_RETIRED, CONCEPT_IS_ALREADY_NOT_RETIRED, CONCEPT_WAS_UNRETIRED
 from core.concepts.mixins import ConceptValidationMixin
@@ -25,10 +31,42 @@ class LocalizedText(models.Model):
     locale_preferred = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    VALUE_FIELDS = ['external_id', 'name', 'type', 'locale', 'locale_preferred']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._state.saved_values = instance.get_values()  # pylint: disable=protected-access
+        return instance
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         if not self.internal_reference_id and self.id:
             self.internal_reference_id = str(self.id)
         super().save(force_insert, force_update, using, update_fields)
+        self._state.saved_values = self.get_values()
+
+    def get_values(self):
+        return tuple(getattr(self, field) for field in self.VALUE_FIELDS)
+
+    @property
+    def is_changed(self):
+        return not self.id or getattr(self._state, 'saved_values', None) != self.get_values()
+
+    def save_copy_on_write(self):
+        """
+        Rows are shared by the concept versions having the same label, so an unchanged row is kept as is
+        and a changed one is written as a new row, leaving the versions already using it untouched.
+        """
+        if not self.is_changed:
+            return
+        self.id = self.internal_reference_id = None
+        self.save()
+
+    @classmethod
+    def share_unchanged(cls, locales, saved_locales):
+        """Swaps each new locale for an identical saved one, so only changed labels get new rows."""
+        saved_by_values = {locale.get_values(): locale for locale in saved_locales if not locale.is_changed}
+        return [locale if locale.id else saved_by_values.pop(locale.get_values(), locale) for locale in locales]
 
     def clone(self):
         return LocalizedText(
@@ -92,6 +130,11 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
     class Meta:
         db_table = 'concepts'
         unique_together = ('mnemonic', 'version', 'parent')
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='concepts_updated_at_id'),
+            models.Index(fields=['mnemonic', 'id'], name='concepts_mnemonic_id'),
+            GinIndex(fields=['search_vector'], name='concepts_search_vector'),
+        ]
 
     external_id = models.TextField(null=True, blank=True)
     concept_class = models.TextField()
@@ -101,6 +144,12 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
     comment = models.TextField(null=True, blank=True)
     parent = models.ForeignKey('sources.Source', related_name='concepts_set', on_delete=models.DO_NOTHING)
     sources = models.ManyToManyField('sources.Source', related_name='concepts')
+    source_versions_start = models.BigIntegerField(null=True, blank=True)
+    source_versions_end = models.BigIntegerField(null=True, blank=True)
+    preferred_name = models.TextField(null=True, blank=True)
+    preferred_name_locale = models.TextField(null=True, blank=True)
+    search_vector = SearchVectorField(null=True, blank=True)
+    iso_639_1_name = models.TextField(null=True, blank=True)
 
     OBJECT_TYPE = CONCEPT_TYPE
 
@@ -118,21 +167,24 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
 
     @property
     def display_name(self):
-        return get(self.preferred_locale, 'name')
+        return self.preferred_name or get(self.preferred_locale, 'name')
 
     @property
     def display_locale(self):
-        return get(self.preferred_locale, 'locale')
+        return self.preferred_name_locale or get(self.preferred_locale, 'locale')
 
     @property
     def preferred_locale(self):
-        return get(self.__names_qs(dict(locale_preferred=True), 'created_at', 'desc'), '0') or \
-               get(self.__names_qs(dict(), 'created_at', 'desc'), '0')
+        return self.get_preferred_locale(self.__names_qs)
+
+    @staticmethod
+    def get_preferred_locale(names_qs):
+        return get(names_qs(dict(locale_preferred=True), 'created_at', 'desc'), '0') or \
+               get(names_qs(dict(), 'created_at', 'desc'), '0')
 
     def __names_qs(self, filters, order_by=None, order='desc'):
-        if getattr(self, '_prefetched_objects_cache', None) and \
-           'names' in self._prefetched_objects_cache:  # pragma: no cover
-            return self.__names_from_prefetched_object_cache(filters, order_by, order)
+        if getattr(self, '_prefetched_objects_cache', None) and 'names' in self._prefetched_objects_cache:
+            return self.filter_names(self.names.all(), filters, order_by, order)
 
         return self.__names_from_db(filters, order_by, order)
 
@@ -148,11 +200,12 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
 
         return names
 
-    def __names_from_prefetched_object_cache(self, filters, order_by=None, order='desc'):  # pragma: no cover
+    @staticmethod
+    def filter_names(names, filters, order_by=None, order='desc'):
         def is_eligible(name):
             return all([get(name, key) == value for key, value in filters.items()])
 
-        names = list(filter(is_eligible, self.names.all()))
+        names = list(filter(is_eligible, names))
         if order_by:
             names = sorted(names, key=lambda name: get(name, order_by), reverse=(order.lower() == 'desc'))
         return names
@@ -179,7 +232,7 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
 
     @property
     def iso_639_1_locale(self):
-        return get(self.__names_qs(dict(type=ISO_639_1)), '0.name')
+        return self.iso_639_1_name or get(self.__names_qs(dict(type=ISO_639_1)), '0.name')
 
     @property
     def custom_validation_schema(self):
@@ -228,7 +281,7 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         return unsaved_names
 
     @classmethod
-    def get_base_queryset(cls, params):
+    def get_base_queryset(cls, params, requesting_user=None):
         queryset = cls.objects.filter(is_active=True)
         user = params.get('user', None)
         org = params.get('org', None)
@@ -244,14 +297,16 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             queryset = queryset.filter(parent__user__username=user)
         if org:
             queryset = queryset.filter(parent__organization__mnemonic=org)
-        if source:
+        if source and container_version:
+            queryset = queryset.filter(
+                cls.get_source_versions_criteria(dict(source=source, version=container_version, user=user, org=org))
+            )
+        elif source:
             queryset = queryset.filter(sources__mnemonic=source)
         if collection:
-            queryset = queryset.filter(collection__mnemonic=collection)
-        if container_version and source:
-            queryset = queryset.filter(sources__version=container_version)
-        if container_version and collection:
-            queryset = queryset.filter(collection__version=container_version)
+            queryset = queryset.filter(cls.get_collection_criteria(collection, container_version, requesting_user))
+        elif requesting_user:
+            queryset = queryset.filter(cls.get_visibility_criteria(requesting_user))
         if concept:
             queryset = queryset.filter(mnemonic=concept)
         if concept_version:
@@ -262,15 +317,106 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             queryset = queryset.filter(retired=False)
         if updated_since:
             queryset = queryset.filter(updated_at__gte=updated_since)
+        if params.get(SEARCH_PARAM, None):
+            queryset = cls.search(
+                queryset, params[SEARCH_PARAM], params.get(LOCALE_PARAM, None), params.get(EXACT_MATCH_PARAM, None)
+            )
 
         return queryset.distinct()
 
+    UPDATE_SEARCH_VECTORS_SQL = """
+        WITH labels AS (
+            SELECT concepts_names.concept_id, localized_texts.name, CASE
+                WHEN localized_texts.type IN %(fully_specified)s THEN 'A'
+                WHEN localized_texts.locale_preferred THEN 'B'
+                ELSE 'C' END::"char" AS weight
+            FROM concepts_names
+            INNER JOIN localized_texts ON localized_texts.id = concepts_names.localizedtext_id
+            WHERE concepts_names.concept_id = ANY(%(ids)s)
+            UNION ALL
+            SELECT concepts_descriptions.concept_id, localized_texts.name, 'D'::"char" AS weight
+            FROM concepts_descriptions
+            INNER JOIN localized_texts ON localized_texts.id = concepts_descriptions.localizedtext_id
+            WHERE concepts_descriptions.concept_id = ANY(%(ids)s)
+        )
+        UPDATE concepts SET search_vector = vectors.search_vector FROM (
+            SELECT concept_id, tsvector_agg(setweight(to_tsvector('simple', name), weight)) AS search_vector
+            FROM labels GROUP BY concept_id
+        ) vectors
+        WHERE concepts.id = vectors.concept_id
+    """
+
+    @classmethod
+    def update_search_vectors(cls, ids):
+        """
+        Rebuilds search_vector of concepts from their labels, weighted A for fully specified names, B for other
+        locale preferred names, C for the other names (synonyms) and D for descriptions.
+        """
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(cls.UPDATE_SEARCH_VECTORS_SQL, dict(ids=list(ids), fully_specified=LOCALES_FULLY_SPECIFIED))
+
+    @classmethod
+    def search(cls, queryset, text, locale=None, exact_match=False):
+        """
+        Matches concepts whose name is text when exact_match, otherwise whose search_vector has every word of text
+        as a word prefix, or, with pg_trgm installed, that have a name similar to text.
+        locale restricts the matches to names in locale. Results are ranked by search_rank.
+        """
+        text = text.replace('*', '').strip()
+        names = LocalizedText.objects.filter(name_locales=models.OuterRef('id'))
+        if locale:
+            names = names.filter(locale=locale)
+        if exact_match:
+            return queryset.filter(models.Exists(names.filter(name__iexact=text)))
+
+        words = re.findall(r'\w+', text)
+        if not words:
+            return queryset.none()
+        query = SearchQuery(' & '.join(word + ':*' for word in words), config='simple', search_type='raw')
+        criteria = models.Q(search_vector=query)
+        if locale:
+            # search_vector has the words of every locale, the query must also match a single name in locale
+            criteria &= models.Exists(
+                names.annotate(name_vector=SearchVector('name', config='simple')).filter(name_vector=query)
+            )
+        if has_db_extension('pg_trgm'):
+            criteria |= models.Exists(names.filter(name__trigram_similar=text))
+
+        return queryset.filter(criteria).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query)
+        ).order_by('-search_rank', 'id')
+
+    @staticmethod
+    def get_source_versions_criteria(params):
+        from core.sources.models import Source
+        criteria = models.Q(id__in=[])
+        for source_version in Source.get_base_queryset(compact_dict_by_values(params)):
+            criteria |= source_version.get_children_criteria(source_version.concepts)
+
+        return criteria
+
+    @classmethod
+    def get_collection_criteria(cls, collection, version=None, requesting_user=None):
+        """A single Q, so that once in filter() version and visibility apply to the same collection row."""
+        criteria = models.Q(collection__mnemonic=collection)
+        if version:
+            criteria &= models.Q(collection__version=version)
+        if requesting_user:
+            criteria &= cls.get_visibility_criteria(requesting_user, in_collection=True)
+
+        return criteria
+
+    @staticmethod
+    def get_visibility_criteria(user, in_collection=False):
+        """Concepts are as visible as the source they belong to, or the collection they are listed from."""
+        from core.sources.models import Source
+        return Source.get_visibility_criteria(user, 'collection__' if in_collection else 'parent__')
+
     @classmethod
     def global_listing_queryset(cls, params, user):
-        queryset = cls.get_base_queryset(params)
-        if not user.is_staff:
-            queryset = queryset.exclude(public_access=ACCESS_TYPE_NONE)
-        return queryset
+        return cls.get_base_queryset(params, user)
 
     def clone(self):
         concept_version = Concept(
@@ -310,23 +456,46 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         names = get(self, 'cloned_names', [])
         descriptions = get(self, 'cloned_descriptions', [])
 
-        for name in names:
-            name.save()
-        for desc in descriptions:
-            desc.save()
+        for locale in [*names, *descriptions]:
+            locale.save_copy_on_write()
 
         self.names.set(names)
         self.descriptions.set(descriptions)
+        self.set_display_names(names)
+        self.update_search_vectors([self.id])
+
+    def set_display_names(self, names):
+        """Stores the preferred and ISO 639-1 names on the row, so listings don't need to query names."""
+        self.build_display_names(names)
+        Concept.objects.filter(id=self.id).update(
+            preferred_name=self.preferred_name, preferred_name_locale=self.preferred_name_locale,
+            iso_639_1_name=self.iso_639_1_name
+        )
+        identity_map.invalidate(self)
+
+    def build_display_names(self, names):
+        def names_qs(filters, order_by=None, order='desc'):
+            return self.filter_names(names, filters, order_by, order)
+
+        preferred_locale = self.get_preferred_locale(names_qs)
+        self.preferred_name = get(preferred_locale, 'name')
+        self.preferred_name_locale = get(preferred_locale, 'locale')
+        self.iso_639_1_name = get(names_qs(dict(type=ISO_639_1)), '0.name')
 
     def remove_locales(self):
-        self.names.all().delete()
-        self.descriptions.all().delete()
+        """Unlinks the locales, deleting the rows no other concept version shares."""
+        locale_ids = [*self.names.values_list('id', flat=True), *self.descriptions.values_list('id', flat=True)]
+        self.names.clear()
+        self.descriptions.clear()
+        LocalizedText.objects.filter(
+            id__in=locale_ids, name_locales__isnull=True, description_locales__isnull=True
+        ).delete()
 
     def __clone_name_locales(self):
-        return [name.clone() for name in self.names.all()]
+        return list(self.names.all())  # shared, see LocalizedText.save_copy_on_write
 
     def __clone_description_locales(self):
-        return [desc.clone() for desc in self.descriptions.all()]
+        return list(self.descriptions.all())
 
     @classmethod
     def persist_new(cls, data, user=None):
@@ -357,9 +526,6 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             parent_resource = concept.parent
             parent_resource_head = parent_resource.head
             concept.sources.set([parent_resource, parent_resource_head])
-
-            parent_resource.save()
-            parent_resource_head.save()
         except ValidationError as ex:
             concept.errors.update(ex.message_dict)
         except IntegrityError as ex:
@@ -390,12 +556,9 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             obj.clean()  # clean here to validate locales that can only be saved after obj is saved
             latest_versions = obj.versions.exclude(id=obj.id).filter(is_latest_version=True)
             latest_versions.update(is_latest_version=False)
+            identity_map.invalidate(obj)
             obj.sources.set(compact([parent, parent_head]))
 
-            # to update counts
-            parent.save()
-            parent_head.save()
-
             persisted = True
         except ValidationError as err:
             errors.update(err.message_dict)
@@ -437,13 +600,12 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
     def get_latest_versions_for_queryset(concepts_qs):
         """Takes any concepts queryset and returns queryset of latest_version of each of those concepts"""
 
-        if concepts_qs is None or not concepts_qs.exists():
+        if concepts_qs is None:
             return Concept.objects.none()
 
-        criteria_fields = list(concepts_qs.values('parent_id', 'mnemonic'))
-        criterion = [models.Q(**attrs, is_latest_version=True) for attrs in criteria_fields]
-        query = criterion.pop()
-        for criteria in criterion:
-            query |= criteria
-
-        return Concept.objects.filter(query)
+        # one correlated EXISTS, so the statement size doesn't grow with the number of concepts
+        return Concept.objects.filter(is_latest_version=True).filter(
+            models.Exists(
+                concepts_qs.filter(parent_id=models.OuterRef('parent_id'), mnemonic=models.OuterRef('mnemonic'))
+            )
+        )
@@ -1,4 +1,4 @@
-from pydash import compact
+from pydash import compact, get
 from rest_framework.fields import CharField, DateTimeField, BooleanField, URLField, JSONField, SerializerMethodField, \
     UUIDField
 from rest_framework.serializers import ModelSerializer
@@ -58,7 +58,7 @@ class ConceptNameSerializer(ConceptLabelSerializer):
     name_type = CharField(required=False, source='type')
 
     class Meta:
-        models = LocalizedText
+        model = LocalizedText
         fields = (*ConceptLabelSerializer.Meta.fields, 'name', 'name_type')
 
     def to_representation(self, instance):
@@ -160,8 +160,10 @@ class ConceptDetailSerializer(ModelSerializer):
             ) for desc in validated_data.get('descriptions', [])
         ]
 
-        instance.cloned_names = compact(new_names)
-        instance.cloned_descriptions = compact(new_descriptions)
+        instance.cloned_names = LocalizedText.share_unchanged(compact(new_names), get(instance, 'cloned_names', []))
+        instance.cloned_descriptions = LocalizedText.share_unchanged(
+            compact(new_descriptions), get(instance, 'cloned_descriptions', [])
+        )
         errors = Concept.persist_clone(instance, self.context.get('request').user)
         if errors:
             self._errors.update(errors)
@@ -0,0 +1,352 @@
+import json
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.exceptions import ValidationError
+from django.db import transaction, connection
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from pydash import get
+
+from core.common.constants import CUSTOM_VALIDATION_SCHEMA_OPENMRS, LOOKUP_SOURCES
+from core.concepts.constants import (
+    LOCALES_SHORT, OPENMRS_FULLY_SPECIFIED_NAME_UNIQUE_PER_SOURCE_LOCALE,
+    OPENMRS_PREFERRED_NAME_UNIQUE_PER_SOURCE_LOCALE, CONCEPT_MNEMONIC_ALREADY_EXISTS, INVALID_JSON_LINE,
+    INVALID_OPERATION, OPERATIONS_CANNOT_BE_EMPTY, LABEL_NOT_FOUND, EXTRA_NOT_FOUND, EXTRA_KEY_CANNOT_BE_EMPTY
+)
+from core.concepts.models import Concept, LocalizedText
+from core.concepts.serializers import ConceptNameSerializer, ConceptDescriptionSerializer
+from core.concepts.validators import (
+    BasicConceptValidator, ValidatorSpecifier, message_with_name_details, reference_values_registry
+)
+
+
+class BulkConceptImporter:
+    """
+    Imports concepts, given as JSON lines in the concept API format, into a HEAD source.
+    Each batch is validated in memory (source wide name checks are one query per batch), then concepts, names,
+    descriptions and their links are inserted with bulk_create. Source counts are refreshed once at the end.
+    Errors are reported per line number.
+    """
+    CONCEPT_FIELDS = dict(
+        id='mnemonic', external_id='external_id', concept_class='concept_class', datatype='datatype',
+        extras='extras', retired='retired', update_comment='comment', comment='comment'
+    )
+    UNIQUE_NAME_ATTRIBUTES = [
+        ('is_fully_specified', OPENMRS_FULLY_SPECIFIED_NAME_UNIQUE_PER_SOURCE_LOCALE),
+        ('locale_preferred', OPENMRS_PREFERRED_NAME_UNIQUE_PER_SOURCE_LOCALE),
+    ]
+
+    def __init__(self, source, user, batch_size=1000):
+        self.source = source
+        self.user = user
+        self.batch_size = batch_size
+        self.created = 0
+        self.errors = dict()
+        self.validators = []
+        self.mnemonics = set()
+
+    def run(self, lines):
+        self.mnemonics = set(self.source.concepts_set.values_list('mnemonic', flat=True))
+        if not settings.DISABLE_VALIDATION:
+            self.validators = [BasicConceptValidator()]
+            schema = self.source.custom_validation_schema
+            if schema:
+                self.validators.append(
+                    ValidatorSpecifier().with_validation_schema(schema).with_repo(
+                        self.source
+                    ).with_reference_values().get()
+                )
+
+        batch = []
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            batch.append((line_number, line))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        self.source.rebuild_children_counts()
+        if self.source.mnemonic in LOOKUP_SOURCES:
+            transaction.on_commit(reference_values_registry.invalidate)
+        return self.created, self.errors
+
+    @property
+    def is_openmrs(self):
+        return self.source.custom_validation_schema == CUSTOM_VALIDATION_SCHEMA_OPENMRS
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        concepts = []
+        for line_number, line in batch:
+            try:
+                concept = self.build(line)
+                concept.line_number = line_number
+                self.validate(concept)
+            except ValidationError as ex:
+                self.errors[line_number] = ex.message_dict
+                continue
+            self.mnemonics.add(concept.mnemonic)
+            concepts.append(concept)
+
+        concepts = self.exclude_non_unique_names(concepts)
+        if not concepts:
+            return
+
+        self.persist(concepts)
+        self.created += len(concepts)
+
+    def build(self, line):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise ValidationError({'__all__': [INVALID_JSON_LINE]})
+
+        concept = Concept(
+            **{field: data[key] for key, field in self.CONCEPT_FIELDS.items() if key in data},
+            name=data.get('id', None), parent=self.source, created_by=self.user, updated_by=self.user
+        )
+        concept.extras = concept.extras or dict()
+        concept.cloned_names = [
+            self.build_locale(name, name.get('name', None), name.get('name_type', None))
+            for name in data.get('names', None) or []
+        ]
+        concept.cloned_descriptions = [
+            self.build_locale(
+                desc, desc.get('description', desc.get('name', None)), desc.get('description_type', None)
+            ) for desc in data.get('descriptions', None) or []
+        ]
+        return concept
+
+    @staticmethod
+    def build_locale(data, name, _type):
+        return LocalizedText(
+            name=name, type=_type or data.get('type', None), locale=data.get('locale', None),
+            locale_preferred=bool(data.get('locale_preferred', False)), external_id=data.get('external_id', None)
+        )
+
+    def validate(self, concept):
+        concept.clean_fields(exclude=['version', 'parent', 'created_by', 'updated_by'])
+        if concept.mnemonic in self.mnemonics:
+            raise ValidationError({'mnemonic': [CONCEPT_MNEMONIC_ALREADY_EXISTS]})
+        for validator in self.validators:
+            validator.validate_concept_based(concept)
+
+    def exclude_non_unique_names(self, concepts):
+        """Batched equivalent of OpenMRSConceptValidator.validate_source_based."""
+        if not self.validators or not self.is_openmrs:
+            return concepts
+
+        taken_names = set(
+            self.source.concepts_set.filter(
+                is_active=True, retired=False, is_latest_version=True,
+                names__name__in={name.name for concept in concepts for name in concept.cloned_names}
+            ).exclude(names__type__in=LOCALES_SHORT).values_list('names__locale', 'names__name')
+        )
+
+        unique_concepts = []
+        for concept in concepts:
+            error = self.get_non_unique_name_error(concept, taken_names)
+            if error:
+                self.errors[concept.line_number] = error
+                self.mnemonics.discard(concept.mnemonic)
+                continue
+            taken_names.update((name.locale, name.name) for name in concept.cloned_names)
+            unique_concepts.append(concept)
+
+        return unique_concepts
+
+    def get_non_unique_name_error(self, concept, taken_names):
+        for attribute, error_message in self.UNIQUE_NAME_ATTRIBUTES:
+            for name in concept.cloned_names:
+                if getattr(name, attribute) and (name.locale, name.name) in taken_names:
+                    return {'names': [message_with_name_details(error_message, name)]}
+
+        return None
+
+    def persist(self, concepts):
+        head = self.source.head
+        source_versions_start = head.get_next_version_id() if self.source.id == head.id else None
+        locales = [locale for concept in concepts for locale in concept.cloned_names + concept.cloned_descriptions]
+        LocalizedText.objects.bulk_create(locales, batch_size=self.batch_size)
+
+        for concept, concept_id in zip(concepts, self.reserve_ids(len(concepts))):
+            concept.id = concept_id
+            concept.version = concept.internal_reference_id = str(concept_id)
+            concept.source_versions_start = source_versions_start
+            concept.encode_extras()
+            concept.uri = concept.calculate_uri()
+            concept.build_display_names(concept.cloned_names)
+        Concept.objects.bulk_create(concepts, batch_size=self.batch_size)
+
+        self.bulk_link(Concept.names.through, 'localizedtext_id', {
+            concept.id: [name.id for name in concept.cloned_names] for concept in concepts
+        })
+        self.bulk_link(Concept.descriptions.through, 'localizedtext_id', {
+            concept.id: [desc.id for desc in concept.cloned_descriptions] for concept in concepts
+        })
+        self.bulk_link(Concept.sources.through, 'source_id', {
+            concept.id: list({self.source.id, head.id}) for concept in concepts
+        })
+        Concept.update_search_vectors([concept.id for concept in concepts])
+
+    def bulk_link(self, through, column, ids_by_concept):
+        through.objects.bulk_create([
+            through(**{'concept_id': concept_id, column: _id})
+            for concept_id, ids in ids_by_concept.items() for _id in ids
+        ], batch_size=self.batch_size)
+
+    @staticmethod
+    def reserve_ids(count):
+        """Takes ids from the concepts sequence upfront, so version = str(id) is set without a second save."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                ['concepts', count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ConceptMutations:
+    """
+    Applies a list of label and extra operations to a clone of concept and saves it as a single new version,
+    so the version write, the validation and the recount of the parent happen once for the whole list.
+    Each operation is {"op": "add" | "update" | "delete", "target": "names" | "descriptions" | "extras", ...},
+    with "id" of the label to update or delete, "key" of the extra and "value", the label or the extra value.
+    Errors are reported per operation index and nothing is saved if any operation fails.
+    """
+    OPS = ['add', 'update', 'delete']
+    LABEL_SERIALIZERS = dict(names=ConceptNameSerializer, descriptions=ConceptDescriptionSerializer)
+
+    def __init__(self, concept, user):
+        self.concept = concept
+        self.user = user
+        self.new_version = None
+        self.comments = []
+        self.errors = dict()
+
+    def run(self, operations, comment=None):
+        if not operations or not isinstance(operations, list):
+            return dict(operations=[OPERATIONS_CANNOT_BE_EMPTY])
+
+        self.new_version = self.concept.clone()
+        self.new_version.extras = dict(self.new_version.extras)
+        for index, operation in enumerate(operations):
+            error = self.apply(operation)
+            if error:
+                self.errors[index] = error
+        if self.errors:
+            return dict(operations=self.errors)
+
+        self.new_version.comment = comment or ' '.join(self.comments)
+        return Concept.persist_clone(self.new_version, self.user)
+
+    def apply(self, operation):
+        op = get(operation, 'op')
+        target = get(operation, 'target')
+        if op not in self.OPS or (target not in self.LABEL_SERIALIZERS and target != 'extras'):
+            return [INVALID_OPERATION]
+        if target == 'extras':
+            return self.apply_extra(op, operation)
+        return self.apply_label(op, target, operation)
+
+    def apply_extra(self, op, operation):
+        key = operation.get('key', None)
+        extras = self.new_version.extras
+        if op == 'delete':
+            if key not in extras:
+                return [EXTRA_NOT_FOUND]
+            del extras[key]
+            self.comments.append('Deleted extra %s.' % key)
+            return None
+
+        if not key or 'value' not in operation:
+            return [EXTRA_KEY_CANNOT_BE_EMPTY]
+        extras[key] = operation['value']
+        self.comments.append('Updated extras: %s=%s.' % (key, operation['value']))
+        return None
+
+    def apply_label(self, op, target, operation):
+        attr = 'cloned_{}'.format(target)
+        labels = getattr(self.new_version, attr)
+        label = None
+        if op != 'add':
+            # labels added earlier in the same run are not saved yet, they can't be addressed by id
+            label_id = operation.get('id', None)
+            if label_id is not None:
+                label = next(
+                    (label for label in labels if label.id is not None and str(label.id) == str(label_id)), None
+                )
+            if not label:
+                return [LABEL_NOT_FOUND]
+
+        if op == 'delete':
+            setattr(self.new_version, attr, [_label for _label in labels if _label is not label])
+            self.comments.append('Deleted %s in %s.' % (label.name, target))
+            return None
+
+        serializer = self.LABEL_SERIALIZERS[target](data=operation.get('value', None), partial=op == 'update')
+        if not serializer.is_valid():
+            return serializer.errors
+
+        if op == 'add':
+            label = LocalizedText()
+            labels.append(label)
+        # saved by persist_clone, a changed label gets a new row, see LocalizedText.save_copy_on_write
+        for field, value in serializer.validated_data.items():
+            setattr(label, field, value)
+        self.comments.append(
+            ('Added to %s: %s.' % (target, label.name)) if op == 'add' else 'Updated %s in %s.' % (label.name, target)
+        )
+        return None
+
+
+def compact_localized_texts(batch_size=1000):
+    """
+    Deduplicates localized texts written before concept versions shared unchanged labels.
+    Only identical rows linked to versions of the same concept (same parent and mnemonic) are grouped, as a
+    label id is part of the concept's label URLs. Each group is collapsed into its oldest row: links of the
+    duplicates are moved to it (a concept linked to several of them keeps a single link) and the duplicates
+    are deleted. Returns the number of rows deleted.
+    """
+    owner = dict()
+    for field in ['parent_id', 'mnemonic']:
+        owner['owner_' + field] = Coalesce(*[
+            Subquery(Concept.objects.filter(**{link: OuterRef('id')}).order_by('id').values(field)[:1])
+            for link in ['names', 'descriptions']
+        ])
+    groups = LocalizedText.objects.annotate(**owner).filter(owner_mnemonic__isnull=False).values(
+        *LocalizedText.VALUE_FIELDS, *owner.keys()
+    ).annotate(
+        keep_id=Min('id'), ids=ArrayAgg('id'), count=Count('id')
+    ).filter(count__gt=1).order_by().values_list('keep_id', 'ids')
+
+    deleted = 0
+    batch = dict()
+    for keep_id, ids in groups.iterator():
+        batch.update({_id: keep_id for _id in ids if _id != keep_id})
+        if len(batch) >= batch_size:
+            deleted += merge_localized_texts(batch)
+            batch = dict()
+    if batch:
+        deleted += merge_localized_texts(batch)
+    return deleted
+
+
+@transaction.atomic
+def merge_localized_texts(keep_ids):
+    """Points the links of each localized text in keep_ids to keep_ids[id], then deletes it."""
+    for through in [Concept.names.through, Concept.descriptions.through]:
+        links = through.objects.filter(localizedtext_id__in=keep_ids.keys())
+        through.objects.bulk_create([
+            through(concept_id=concept_id, localizedtext_id=keep_ids[localizedtext_id])
+            for concept_id, localizedtext_id in links.values_list('concept_id', 'localizedtext_id')
+        ], ignore_conflicts=True)
+        links.delete()
+
+    return LocalizedText.objects.filter(id__in=keep_ids.keys()).delete()[0]
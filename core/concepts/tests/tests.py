@@ -1,19 +1,28 @@
+# pylint: disable=too-many-lines
 import factory
+from django.conf import settings
 from mock import patch
 from pydash import omit
 
-from core.common.constants import CUSTOM_VALIDATION_SCHEMA_OPENMRS, HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW
+from core.common.constants import (
+    CUSTOM_VALIDATION_SCHEMA_OPENMRS, HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW, ISO_639_1, ACCESS_TYPE_NONE
+)
 from core.common.tests import OCLTestCase
+from core.concepts.autocomplete import ConceptAutocompleteIndex, ConceptAutocompleteRegistry
 from core.concepts.constants import (
     OPENMRS_MUST_HAVE_EXACTLY_ONE_PREFERRED_NAME,
     OPENMRS_FULLY_SPECIFIED_NAME_UNIQUE_PER_SOURCE_LOCALE, OPENMRS_AT_LEAST_ONE_FULLY_SPECIFIED_NAME,
     OPENMRS_PREFERRED_NAME_UNIQUE_PER_SOURCE_LOCALE, OPENMRS_SHORT_NAME_CANNOT_BE_PREFERRED,
     SHORT, INDEX_TERM, OPENMRS_NAMES_EXCEPT_SHORT_MUST_BE_UNIQUE, OPENMRS_ONE_FULLY_SPECIFIED_NAME_PER_LOCALE,
     OPENMRS_NO_MORE_THAN_ONE_SHORT_NAME_PER_LOCALE, CONCEPT_IS_ALREADY_RETIRED, CONCEPT_IS_ALREADY_NOT_RETIRED,
-    OPENMRS_CONCEPT_CLASS, OPENMRS_DATATYPE, OPENMRS_DESCRIPTION_TYPE, OPENMRS_NAME_LOCALE, OPENMRS_DESCRIPTION_LOCALE)
-from core.concepts.models import Concept
+    OPENMRS_CONCEPT_CLASS, OPENMRS_DATATYPE, OPENMRS_DESCRIPTION_TYPE, OPENMRS_NAME_LOCALE, OPENMRS_DESCRIPTION_LOCALE,
+    CONCEPT_MNEMONIC_ALREADY_EXISTS, INVALID_JSON_LINE, INVALID_OPERATION, OPERATIONS_CANNOT_BE_EMPTY,
+    LABEL_NOT_FOUND, EXTRA_NOT_FOUND)
+from core.concepts.models import Concept, LocalizedText
+from core.concepts.services import BulkConceptImporter, ConceptMutations, compact_localized_texts
 from core.concepts.tests.factories import LocalizedTextFactory, ConceptFactory
-from core.concepts.validators import ValidatorSpecifier
+from core.concepts.validators import ValidatorSpecifier, ReferenceValuesRegistry, reference_values_registry
+from core.sources.models import Source
 from core.sources.tests.factories import SourceFactory
 
 
@@ -48,6 +57,34 @@ class ConceptTest(OCLTestCase):
 
         self.assertEqual(concept.display_locale, preferred_locale.locale)
 
+    def test_set_display_names(self):
+        concept = ConceptFactory(names=())
+        concept.cloned_names = [
+            LocalizedTextFactory.build(name='Fever', locale='en', locale_preferred=True),
+            LocalizedTextFactory.build(name='Fievre', locale='fr'),
+            LocalizedTextFactory.build(name='fr', locale='en', type=ISO_639_1),
+        ]
+
+        concept.set_locales()
+        concept = Concept.objects.get(id=concept.id)
+
+        self.assertEqual(concept.preferred_name, 'Fever')
+        self.assertEqual(concept.preferred_name_locale, 'en')
+        self.assertEqual(concept.iso_639_1_name, 'fr')
+        with self.assertNumQueries(0):
+            self.assertEqual(concept.display_name, 'Fever')
+            self.assertEqual(concept.display_locale, 'en')
+            self.assertEqual(concept.iso_639_1_locale, 'fr')
+
+    def test_display_names_from_prefetched_names(self):
+        concept = ConceptFactory(names=(LocalizedTextFactory(name='Fever', locale_preferred=True),))
+        concept = Concept.objects.prefetch_related('names').get(id=concept.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(concept.display_name, 'Fever')
+            self.assertEqual(concept.display_locale, 'en')
+            self.assertIsNone(concept.iso_639_1_locale)
+
     def test_default_name_locales(self):
         es_locale = LocalizedTextFactory(locale='es')
         en_locale = LocalizedTextFactory(locale='en')
@@ -124,7 +161,8 @@ class ConceptTest(OCLTestCase):
         self.assertEqual(cloned_concept.parent, concept.parent)
         self.assertEqual(len(cloned_concept.cloned_names), concept.names.count())
         self.assertEqual(len(cloned_concept.cloned_descriptions), concept.descriptions.count())
-        self.assertEqual(locale_clone_mock.call_count, 3)
+        self.assertCountEqual([desc.id for desc in cloned_concept.cloned_descriptions], [es_locale.id, en_locale.id])
+        self.assertEqual(locale_clone_mock.call_count, 0)
         self.assertTrue(cloned_concept.released)
 
     def test_version_for_concept(self):
@@ -185,6 +223,88 @@ class ConceptTest(OCLTestCase):
             persisted_concept.version_url, persisted_concept.uri
         )
 
+    def test_persist_clone_shares_unchanged_locales(self):
+        es_locale = LocalizedTextFactory(locale='es', name='Not English')
+        en_locale = LocalizedTextFactory(locale='en', name='English')
+        concept = ConceptFactory(names=(en_locale, es_locale), descriptions=(en_locale,))
+
+        cloned_concept = concept.clone()
+        es_name = [name for name in cloned_concept.cloned_names if name.id == es_locale.id][0]
+        es_name.name = 'No Ingles'
+        self.assertEqual(Concept.persist_clone(cloned_concept, concept.created_by), {})
+
+        new_names = cloned_concept.names.order_by('id')
+        self.assertEqual(new_names.count(), 2)
+        self.assertEqual(new_names.first().id, en_locale.id)
+        self.assertEqual(new_names.last().name, 'No Ingles')
+        self.assertNotEqual(new_names.last().id, es_locale.id)
+        self.assertEqual(list(cloned_concept.descriptions.values_list('id', flat=True)), [en_locale.id])
+        self.assertEqual(
+            sorted(concept.names.values_list('name', flat=True)), ['English', 'Not English']
+        )
+
+        cloned_concept.remove_locales()
+        self.assertEqual(cloned_concept.names.count(), 0)
+        self.assertEqual(sorted(concept.names.values_list('id', flat=True)), sorted([en_locale.id, es_locale.id]))
+        self.assertFalse(LocalizedText.objects.filter(name='No Ingles').exists())
+
+    def test_search(self):
+        malaria = ConceptFactory(
+            names=(
+                LocalizedTextFactory(name='Malaria Fever', type='FULLY_SPECIFIED'),
+                LocalizedTextFactory(name='Paludisme', type='SHORT', locale='fr'),
+            )
+        )
+        fever = ConceptFactory(
+            names=(LocalizedTextFactory(name='Fever', type='SHORT'),),
+            descriptions=(LocalizedTextFactory(name='Malaria is a common cause of fever'),)
+        )
+        ConceptFactory(names=(LocalizedTextFactory(name='Cough'),))
+        Concept.update_search_vectors(Concept.objects.values_list('id', flat=True))
+        concepts = Concept.objects.all()
+
+        self.assertEqual(list(Concept.search(concepts, 'malar')), [malaria, fever])
+        self.assertEqual(list(Concept.search(concepts, 'fever')), [malaria, fever])
+        self.assertEqual(list(Concept.search(concepts, '*fev*')), [malaria, fever])
+        self.assertEqual(list(Concept.search(concepts, 'malaria cause')), [fever])
+        self.assertEqual(list(Concept.search(concepts, 'palu', 'fr')), [malaria])
+        self.assertEqual(list(Concept.search(concepts, 'fever', 'fr')), [])
+        self.assertEqual(list(Concept.search(concepts, 'fever', 'en')), [malaria, fever])
+        self.assertEqual(list(Concept.search(concepts, 'malaria cause', 'en')), [])
+        self.assertEqual(list(Concept.search(concepts, 'cough', 'fr')), [])
+        self.assertEqual(list(Concept.search(concepts, 'FEVER', exact_match=True)), [fever])
+        self.assertEqual(list(Concept.search(concepts, '*')), [])
+        self.assertEqual(
+            list(Concept.get_base_queryset(dict(q='palu', exact_match=None, locale=None)).order_by('id')), [malaria]
+        )
+
+    def test_compact_localized_texts(self):
+        en_locale = LocalizedTextFactory(locale='en', name='English')
+        en_locale_duplicate = en_locale.clone()
+        en_locale_duplicate.save()
+        other_concept_duplicate = en_locale.clone()
+        other_concept_duplicate.save()
+        es_locale = LocalizedTextFactory(locale='es', name='Not English')
+        concept = ConceptFactory(names=(en_locale, es_locale))
+        version1 = ConceptFactory(
+            parent=concept.parent, mnemonic=concept.mnemonic, version='v1',
+            names=(en_locale_duplicate,), descriptions=(en_locale_duplicate,)
+        )
+        version2 = ConceptFactory(
+            parent=concept.parent, mnemonic=concept.mnemonic, version='v2', names=(en_locale, en_locale_duplicate)
+        )
+        other_concept = ConceptFactory(parent=concept.parent, names=(other_concept_duplicate,))
+
+        self.assertEqual(compact_localized_texts(), 1)
+
+        self.assertFalse(LocalizedText.objects.filter(id=en_locale_duplicate.id).exists())
+        self.assertCountEqual(concept.names.values_list('id', flat=True), [en_locale.id, es_locale.id])
+        self.assertEqual(list(version1.names.values_list('id', flat=True)), [en_locale.id])
+        self.assertEqual(list(version1.descriptions.values_list('id', flat=True)), [en_locale.id])
+        self.assertEqual(list(version2.names.values_list('id', flat=True)), [en_locale.id])
+        self.assertEqual(list(other_concept.names.values_list('id', flat=True)), [other_concept_duplicate.id])
+        self.assertEqual(compact_localized_texts(), 0)
+
     def test_retire(self):
         source = SourceFactory(version=HEAD)
         concept = Concept.persist_new({
@@ -310,6 +430,56 @@ class ConceptTest(OCLTestCase):
             [concept3_latest, concept6_latest]
         )
 
+    def test_get_latest_versions_for_queryset_statement_size(self):
+        source = SourceFactory()
+        ConceptFactory(parent=source)
+        queryset = Concept.objects.filter(parent=source)
+        statement = str(Concept.get_latest_versions_for_queryset(queryset).query)
+
+        ConceptFactory(parent=source)
+        ConceptFactory(parent=source)
+
+        self.assertEqual(str(Concept.get_latest_versions_for_queryset(queryset).query), statement)
+        self.assertEqual(Concept.get_latest_versions_for_queryset(queryset).count(), 3)
+
+    def test_get_base_queryset_visibility(self):
+        from django.contrib.auth.models import AnonymousUser
+        from core.collections.tests.factories import CollectionFactory
+        public_concept = ConceptFactory()
+        private_source = SourceFactory(public_access=ACCESS_TYPE_NONE)
+        private_concept = ConceptFactory(parent=private_source)
+        private_collection = CollectionFactory(public_access=ACCESS_TYPE_NONE)
+        public_collection = CollectionFactory()
+        for collection in [private_collection, public_collection]:
+            collection.concepts.add(public_concept, private_concept)
+        anonymous = AnonymousUser()
+
+        self.assertEqual(
+            list(Concept.global_listing_queryset(dict(), anonymous).filter(
+                id__in=[public_concept.id, private_concept.id]
+            )),
+            [public_concept]
+        )
+        self.assertEqual(
+            Concept.get_base_queryset(dict(collection=public_collection.mnemonic), anonymous).count(), 2
+        )
+        self.assertEqual(
+            Concept.get_base_queryset(dict(collection=private_collection.mnemonic), anonymous).count(), 0
+        )
+
+    def test_label_update_not_found(self):
+        from rest_framework.test import APIClient
+        from core.users.models import UserProfile
+        concept = ConceptFactory(names=(LocalizedTextFactory(name='Fever'),))
+        versions_count = concept.versions.count()
+        client = APIClient()
+        client.force_authenticate(UserProfile.objects.get(username='ocladmin'))
+
+        response = client.put(concept.uri + 'names/0/', dict(name='Pyrexia'), format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(concept.versions.count(), versions_count)
+
 
 class OpenMRSConceptValidatorTest(OCLTestCase):
     def setUp(self):
@@ -629,6 +799,7 @@ class OpenMRSConceptValidatorTest(OCLTestCase):
 
 class ValidatorSpecifierTest(OCLTestCase):
     def test_specifier_should_initialize_openmrs_validator_with_reference_values(self):
+        self.create_lookup_concept_classes()
         source = SourceFactory(custom_validation_schema=CUSTOM_VALIDATION_SCHEMA_OPENMRS, version=HEAD)
         expected_reference_values = {
             'DescriptionTypes': ['None', 'FULLY_SPECIFIED', 'Definition'],
@@ -650,3 +821,267 @@ class ValidatorSpecifierTest(OCLTestCase):
         self.assertEqual(
             sorted(expected_reference_values['DescriptionTypes']), sorted(actual_reference_values['DescriptionTypes'])
         )
+
+
+class ReferenceValuesRegistryTest(OCLTestCase):
+    def test_get(self):
+        self.create_lookup_concept_classes()
+
+        reference_values = reference_values_registry.get()
+
+        self.assertIsInstance(reference_values['Classes'], frozenset)
+        self.assertEqual(reference_values['Classes'], frozenset(['Diagnosis', 'Drug', 'Test', 'Procedure']))
+        with self.assertNumQueries(0):
+            self.assertIs(reference_values_registry.get(), reference_values)
+
+    def test_get_reloads_after_lookup_source_change(self):
+        self.create_lookup_concept_classes()
+        self.assertNotIn('Finding', reference_values_registry.get()['Classes'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ConceptFactory(
+                version=HEAD, parent=Source.objects.get(mnemonic='Classes'), concept_class='Concept Class',
+                names=[LocalizedTextFactory(name='Finding')]
+            )
+
+        self.assertIn('Finding', reference_values_registry.get()['Classes'])
+
+    def test_get_reloads_changes_of_other_processes_after_ttl(self):
+        self.create_lookup_concept_classes()
+        registry = ReferenceValuesRegistry()
+        self.assertNotIn('Finding', registry.get()['Classes'])
+
+        ConceptFactory(
+            version=HEAD, parent=Source.objects.get(mnemonic='Classes'), concept_class='Concept Class',
+            names=[LocalizedTextFactory(name='Finding')]
+        )
+        self.assertNotIn('Finding', registry.get()['Classes'])
+
+        registry.checked_at -= settings.REFERENCE_VALUES_TTL
+        self.assertIn('Finding', registry.get()['Classes'])
+
+    def test_get_is_not_invalidated_by_other_sources(self):
+        self.create_lookup_concept_classes()
+        reference_values_registry.get()
+        version = reference_values_registry.version
+
+        ConceptFactory(parent=SourceFactory(version=HEAD))
+        reference_values_registry.get()
+
+        self.assertEqual(reference_values_registry.version, version)
+
+
+class BulkConceptImporterTest(OCLTestCase):
+    def test_run(self):
+        source = SourceFactory(version=HEAD)
+        ConceptFactory(mnemonic='existing', parent=source)
+        names = '"names": [{"name": "Fever", "locale": "en"}]'
+        lines = [
+            '{"id": "c1", "concept_class": "Diagnosis", "datatype": "None", "extras": {"foo": "bar"}, '
+            '"names": [{"name": "Malaria", "locale": "en", "locale_preferred": true, "name_type": "FULLY_SPECIFIED"}],'
+            ' "descriptions": [{"description": "Fever", "locale": "en", "description_type": "Definition"}]}',
+            '',
+            '{"id": "c2", "concept_class": "Diagnosis", "datatype": "None", ' + names + '}',
+            'not json',
+            '{"id": "c3", "datatype": "None", ' + names + '}',
+            '{"id": "existing", "concept_class": "Diagnosis", "datatype": "None", ' + names + '}',
+            '{"id": "c2", "concept_class": "Diagnosis", "datatype": "None", ' + names + '}',
+        ]
+
+        created, errors = BulkConceptImporter(source, source.created_by, batch_size=2).run(lines)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(
+            errors, {
+                4: {'__all__': [INVALID_JSON_LINE]},
+                5: {'concept_class': ['This field cannot be blank.']},
+                6: {'mnemonic': [CONCEPT_MNEMONIC_ALREADY_EXISTS]},
+                7: {'mnemonic': [CONCEPT_MNEMONIC_ALREADY_EXISTS]},
+            }
+        )
+        concept = Concept.objects.get(mnemonic='c1')
+        self.assertEqual(concept.version, str(concept.id))
+        self.assertTrue(concept.is_latest_version)
+        self.assertEqual(concept.uri, '{}concepts/c1/{}/'.format(source.uri, concept.id))
+        self.assertEqual(concept.extras, {'foo': 'bar'})
+        self.assertEqual(concept.display_name, 'Malaria')
+        self.assertEqual(concept.preferred_name, 'Malaria')
+        self.assertEqual(list(concept.names.values_list('name', 'type')), [('Malaria', 'FULLY_SPECIFIED')])
+        self.assertEqual(list(concept.descriptions.values_list('name', 'type')), [('Fever', 'Definition')])
+        self.assertEqual(list(concept.sources.all()), [source])
+        source.refresh_from_db()
+        self.assertEqual(source.active_concepts, 3)
+        self.assertEqual(source.concepts.count(), 3)
+
+    def test_run_openmrs_names_unique_per_source(self):
+        self.create_lookup_concept_classes()
+        source = SourceFactory(custom_validation_schema=CUSTOM_VALIDATION_SCHEMA_OPENMRS, version=HEAD)
+        line = '{{"id": "{}", "concept_class": "Diagnosis", "datatype": "None", "names": [{{"name": "Malaria", ' \
+               '"locale": "en", "locale_preferred": true, "name_type": "FULLY_SPECIFIED"}}]}}'
+
+        created, errors = BulkConceptImporter(source, source.created_by).run([line.format('c1'), line.format('c2')])
+
+        self.assertEqual(created, 1)
+        self.assertEqual(list(errors.keys()), [2])
+        self.assertEqual(Concept.objects.filter(parent=source).count(), 1)
+
+
+class ConceptMutationsTest(OCLTestCase):
+    def test_run(self):
+        en_locale = LocalizedTextFactory(locale='en', name='English')
+        es_locale = LocalizedTextFactory(locale='es', name='Not English')
+        concept = ConceptFactory(
+            names=(en_locale, es_locale), descriptions=(en_locale,), extras=dict(foo='bar', old='value')
+        )
+        versions_count = concept.versions.count()
+
+        mutations = ConceptMutations(concept, concept.created_by)
+        errors = mutations.run([
+            dict(op='update', target='names', id=es_locale.id, value=dict(name='No Ingles')),
+            dict(op='add', target='names', value=dict(name='Francais', locale='fr', name_type='SHORT')),
+            dict(op='delete', target='descriptions', id=en_locale.id),
+            dict(op='update', target='extras', key='foo', value='baz'),
+            dict(op='delete', target='extras', key='old'),
+        ])
+
+        self.assertEqual(errors, {})
+        self.assertEqual(concept.versions.count(), versions_count + 1)
+        new_version = mutations.new_version
+        self.assertTrue(new_version.is_latest_version)
+        self.assertCountEqual(
+            new_version.names.values_list('name', 'locale', 'type'),
+            [('English', 'en', 'FULLY_SPECIFIED'), ('No Ingles', 'es', 'FULLY_SPECIFIED'), ('Francais', 'fr', 'SHORT')]
+        )
+        self.assertEqual(new_version.descriptions.count(), 0)
+        self.assertEqual(new_version.extras, dict(foo='baz'))
+        self.assertEqual(
+            new_version.comment,
+            'Updated No Ingles in names. Added to names: Francais. Deleted English in descriptions. '
+            'Updated extras: foo=baz. Deleted extra old.'
+        )
+        concept.refresh_from_db()
+        self.assertCountEqual(concept.names.values_list('name', flat=True), ['English', 'Not English'])
+        self.assertEqual(concept.extras, dict(foo='bar', old='value'))
+
+    def test_run_errors(self):
+        concept = ConceptFactory(names=(LocalizedTextFactory(),), extras=dict(foo='bar'))
+        versions_count = concept.versions.count()
+
+        self.assertEqual(
+            ConceptMutations(concept, concept.created_by).run(None), dict(operations=[OPERATIONS_CANNOT_BE_EMPTY])
+        )
+        errors = ConceptMutations(concept, concept.created_by).run([
+            dict(op='update', target='extras', key='foo', value='baz'),
+            dict(op='move', target='names'),
+            dict(op='delete', target='names', id=0),
+            dict(op='add', target='descriptions', value=dict(locale='en')),
+            dict(op='delete', target='extras', key='bar'),
+        ])
+
+        self.assertEqual(list(errors['operations'].keys()), [1, 2, 3, 4])
+        self.assertEqual(errors['operations'][1], [INVALID_OPERATION])
+        self.assertEqual(errors['operations'][2], [LABEL_NOT_FOUND])
+        self.assertIn('description', errors['operations'][3])
+        self.assertEqual(errors['operations'][4], [EXTRA_NOT_FOUND])
+        self.assertEqual(concept.versions.count(), versions_count)
+        concept.refresh_from_db()
+        self.assertEqual(concept.extras, dict(foo='bar'))
+
+        errors = ConceptMutations(concept, concept.created_by).run([
+            dict(op='add', target='names', value=dict(name='Pyrexia', locale='en')),
+            dict(op='delete', target='names'),
+            dict(op='update', target='names', id=None, value=dict(name='Fever')),
+        ])
+
+        self.assertEqual(errors, dict(operations={1: [LABEL_NOT_FOUND], 2: [LABEL_NOT_FOUND]}))
+        self.assertEqual(concept.versions.count(), versions_count)
+
+
+class ConceptAutocompleteTest(OCLTestCase):
+    def test_search(self):
+        source = SourceFactory(version=HEAD)
+        malaria = ConceptFactory(
+            parent=source, mnemonic='m1', preferred_name='Malaria',
+            names=(LocalizedTextFactory(name='Malaria'), LocalizedTextFactory(name='Paludisme Grave', locale='fr'))
+        )
+        fever = ConceptFactory(
+            parent=source, mnemonic='f1', preferred_name='Malarial Fever',
+            names=(LocalizedTextFactory(name='Malarial Fever'),)
+        )
+        ConceptFactory(parent=source, mnemonic='r1', retired=True, names=(LocalizedTextFactory(name='Malaise'),))
+        source.refresh_from_db()
+
+        index = ConceptAutocompleteIndex.build(source)
+
+        self.assertEqual(
+            index.search('MAL', 10), [
+                dict(id=malaria.mnemonic, display_name='Malaria', url=malaria.uri),
+                dict(id=fever.mnemonic, display_name='Malarial Fever', url=fever.uri),
+            ]
+        )
+        self.assertEqual([result['id'] for result in index.search('mal', 1)], ['m1'])
+        self.assertEqual([result['id'] for result in index.search('fev', 10)], ['f1'])
+        self.assertEqual([result['id'] for result in index.search('grave', 10)], ['m1'])
+        self.assertEqual([result['id'] for result in index.search('f1', 10)], ['f1'])
+        self.assertEqual(index.search('cough', 10), [])
+        self.assertEqual(index.search(' ', 10), [])
+
+    def test_search_released_version(self):
+        source = SourceFactory(version=HEAD)
+        concept = Concept.persist_new({
+            **factory.build(dict, FACTORY_CLASS=ConceptFactory), 'mnemonic': 'c1', 'parent': source,
+            'names': [LocalizedTextFactory.build(locale='en', name='Malaria', locale_preferred=True)]
+        })
+        new_version = concept.clone()
+        new_version.cloned_names[0].name = 'Malaria Fever'
+        Concept.persist_clone(new_version, concept.created_by)
+        version = Source(
+            mnemonic=source.mnemonic, name=source.name, version='v1', organization=source.organization,
+            released=True
+        )
+        Source.persist_new_version(version, source.created_by)
+
+        self.assertEqual(
+            [(result['id'], result['url']) for result in ConceptAutocompleteIndex.build(version).search('mal', 10)],
+            [('c1', new_version.uri)]
+        )
+
+    def test_max_entries(self):
+        index = ConceptAutocompleteIndex(
+            None, [(1, 'c1', 'Malaria Fever', '/c1/'), (2, 'c2', 'Fever', '/c2/')],
+            [(1, 'Malaria Fever'), (2, 'X' * 40 + 'b'), (3, 'Cough')], 4
+        )
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual([result['id'] for result in index.search('mal', 10)], ['c1'])
+        self.assertEqual([result['id'] for result in index.search('fev', 10)], [])
+        self.assertEqual([result['id'] for result in index.search('x' * 40 + 'b', 10)], ['c2'])
+        self.assertEqual(index.search('x' * 40 + 'a', 10), [])
+        self.assertEqual(index.search('cough', 10), [])
+
+    def test_registry(self):
+        from rest_framework.test import APIClient
+        source = SourceFactory(version=HEAD)
+        ConceptFactory(parent=source, mnemonic='c1', names=(LocalizedTextFactory(name='Cough'),))
+        source.refresh_from_db()
+        registry = ConceptAutocompleteRegistry()
+
+        index = registry.get(source)
+        with self.assertNumQueries(0):
+            self.assertIs(registry.get(source), index)
+
+        ConceptFactory(parent=source, mnemonic='c2', names=(LocalizedTextFactory(name='Cold'),))
+        source.refresh_from_db()
+        self.assertEqual([result['id'] for result in registry.get(source).search('co', 10)], ['c2', 'c1'])
+
+        other_source = SourceFactory(version=HEAD)
+        ConceptFactory(parent=other_source, mnemonic='c1', names=(LocalizedTextFactory(name='Cough'),))
+        other_source.refresh_from_db()
+        with patch.object(settings, 'AUTOCOMPLETE_ENTRIES', 5):
+            registry.get(other_source)
+        self.assertEqual(list(registry.indexes.keys()), [other_source.id])
+
+        response = APIClient().get(source.uri + 'autocomplete/?q=cou')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['id'] for result in response.data], ['c1'])
+        self.assertEqual(APIClient().get(source.uri + 'HEAD/autocomplete/?q=co&limit=1').data[0]['id'], 'c2')
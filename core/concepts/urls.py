@@ -40,6 +40,11 @@ urlpatterns = [
         views.ConceptExtraRetrieveUpdateDestroyView.as_view(),
         name='concept-extra'
     ),
+    re_path(
+        r'^(?P<concept>{pattern})/mutations/$'.format(pattern=NAMESPACE_PATTERN),
+        views.ConceptMutationsView.as_view(),
+        name='concept-mutations'
+    ),
     re_path(
         r"^(?P<concept>{pattern})/versions/$".format(pattern=NAMESPACE_PATTERN),
         views.ConceptVersionsView.as_view(),
@@ -1,10 +1,10 @@
-from django.core.cache import cache
+import time
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
 
-from core.common.constants import (
-    NA, YES, NO, CUSTOM_VALIDATION_SCHEMA_OPENMRS, FIVE_MINS, HEAD, REFERENCE_VALUE_SOURCE_MNEMONICS
-)
-from core.orgs.models import Organization
+from core.common.constants import NA, YES, NO, CUSTOM_VALIDATION_SCHEMA_OPENMRS, HEAD, LOOKUP_SOURCES
 from .constants import BASIC_DESCRIPTION_CANNOT_BE_EMPTY, BASIC_NAMES_CANNOT_BE_EMPTY
 
 
@@ -18,6 +18,54 @@ def message_with_name_details(message, name):
     return "{}: {} (locale: {}, preferred: {})".format(message, name_str, locale, preferred)
 
 
+class ReferenceValuesRegistry:
+    """
+    Keeps the concept names of the OCL lookup sources as frozensets in process memory.
+    The values are stamped with the state of the lookup source heads in the database (their count, updated_at and
+    last_child_update). Each process compares the stamp at most every REFERENCE_VALUES_TTL seconds and reloads the
+    values when it changed, so validation does no database work for lookups in between. A change committed by the
+    process itself drops its values right away (see invalidate).
+    """
+    def __init__(self):
+        self.version = None
+        self.values = dict()
+        self.checked_at = None
+
+    def get(self):
+        now = time.monotonic()
+        if self.version is None or now - self.checked_at >= settings.REFERENCE_VALUES_TTL:
+            version = self.get_version()
+            if version != self.version:
+                self.values = self.load()
+                self.version = version
+            self.checked_at = now
+
+        return self.values
+
+    def invalidate(self):
+        """Run on commit, once the changed concepts are linked to their names and sources."""
+        self.version = None
+
+    @staticmethod
+    def get_lookup_sources():
+        from core.sources.models import Source
+        return Source.objects.filter(organization__mnemonic='OCL', mnemonic__in=LOOKUP_SOURCES, version=HEAD)
+
+    def get_version(self):
+        return tuple(self.get_lookup_sources().aggregate(
+            count=Count('id'), updated_at=Max('updated_at'), last_child_update=Max('last_child_update')
+        ).values())
+
+    def load(self):
+        return {
+            source.mnemonic: frozenset(source.get_concept_name_locales().values_list('name', flat=True))
+            for source in self.get_lookup_sources()
+        }
+
+
+reference_values_registry = ReferenceValuesRegistry()
+
+
 class ValidatorSpecifier:
     def __init__(self):
         from core.concepts.custom_validators import OpenMRSConceptValidator
@@ -38,29 +86,10 @@ class ValidatorSpecifier:
         return self
 
     def with_reference_values(self):
-        ocl_org_filter = Organization.objects.get(mnemonic='OCL')
-        if 'reference_sources' not in cache:
-            cache.set(
-                'reference_sources',
-                ocl_org_filter.source_set.filter(mnemonic__in=REFERENCE_VALUE_SOURCE_MNEMONICS, version=HEAD),
-                FIVE_MINS
-            )
-
-        sources = cache.get('reference_sources')
-
-        self.reference_values = dict()
-        for source in sources:
-            if source.mnemonic not in cache:
-                cache.set(source.mnemonic, self._get_reference_values(source), FIVE_MINS)
-            reference_values = cache.get(source.mnemonic)
-            self.reference_values[source.mnemonic] = reference_values
+        self.reference_values = reference_values_registry.get()
 
         return self
 
-    @staticmethod
-    def _get_reference_values(reference_value_source):
-        return list(reference_value_source.get_concept_name_locales().values_list('name', flat=True))
-
     def get(self):
         validator_class = self.validator_map.get(self.validation_schema, BasicConceptValidator)
         return validator_class(repo=self.repo, reference_values=self.reference_values)
@@ -80,6 +109,16 @@ class BaseConceptValidator:
     def validate_source_based(self, concept):
         pass
 
+    def validate_in_batch(self, concepts):
+        failures = []
+        for concept in concepts:
+            try:
+                self.validate(concept)
+            except ValidationError as ex:
+                failures.append((concept, ex))
+
+        return failures
+
 
 class BasicConceptValidator(BaseConceptValidator):
     def validate_concept_based(self, concept):
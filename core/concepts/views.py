@@ -1,4 +1,3 @@
-from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
 from pydash import get
 from rest_framework import status
@@ -8,13 +7,14 @@ from rest_framework.mixins import CreateModelMixin
 from rest_framework.response import Response
 
 from core.common.constants import HEAD, INCLUDE_INVERSE_MAPPINGS_PARAM, INCLUDE_MAPPINGS_PARAM, LIMIT_PARAM
-from core.common.mixins import ListWithHeadersMixin, ConceptDictionaryMixin
+from core.common.mixins import ListWithHeadersMixin, ConceptDictionaryMixin, ResponseCacheMixin, FacetsMixin
 from core.common.utils import compact_dict_by_values
 from core.common.views import BaseAPIView
 from core.concepts.models import Concept, LocalizedText
 from core.concepts.permissions import CanViewParentDictionary, CanEditParentDictionary
 from core.concepts.serializers import ConceptDetailSerializer, ConceptListSerializer, ConceptDescriptionSerializer, \
     ConceptNameSerializer, ConceptVersionDetailSerializer
+from core.concepts.services import ConceptMutations
 
 
 class ConceptBaseView(BaseAPIView):
@@ -33,10 +33,10 @@ class ConceptBaseView(BaseAPIView):
         query_params = self.request.query_params.copy()
         query_params.update(kwargs)
 
-        return compact_dict_by_values(query_params.update(kwargs))
+        return compact_dict_by_values(query_params)
 
     def get_queryset(self):
-        return Concept.get_base_queryset(self.get_filter_params())
+        return Concept.get_base_queryset(self.get_filter_params(), self.request.user)
 
 
 class ConceptVersionListAllView(ConceptBaseView, ListWithHeadersMixin):
@@ -71,8 +71,24 @@ class ConceptVersionListAllView(ConceptBaseView, ListWithHeadersMixin):
         return self.list(request, *args, **kwargs)
 
 
-class ConceptListView(ConceptBaseView, ListWithHeadersMixin, CreateModelMixin):
+class ConceptListView(ResponseCacheMixin, ConceptBaseView, FacetsMixin, ListWithHeadersMixin, CreateModelMixin):
     serializer_class = ConceptListSerializer
+    cursor_pagination = True
+    facet_fields = dict(conceptClass='concept_class', datatype='datatype', locale='names__locale', retired='retired')
+
+    def get_conditional_container(self):
+        from core.collections.models import Collection
+        from core.sources.models import Source
+        params = self.get_filter_params()
+        model = Collection if 'collection' in params else Source
+        url_kwarg = model.get_resource_url_kwarg()
+        if url_kwarg not in params:
+            return None
+
+        return model.get_base_queryset(compact_dict_by_values(dict(
+            version=params.get('version', HEAD), user=params.get('user', None), org=params.get('org', None),
+            **{url_kwarg: params[url_kwarg]}
+        )), self.request.user).first()
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -179,6 +195,7 @@ class ConceptRetrieveUpdateDestroyView(ConceptBaseView, RetrieveAPIView, UpdateA
 class ConceptVersionsView(ConceptBaseView, ConceptDictionaryMixin, ListWithHeadersMixin):
     serializer_class = ConceptListSerializer
     permission_classes = (CanViewParentDictionary,)
+    cursor_pagination = True
 
     def get(self, request, *args, **kwargs):
         self.serializer_class = ConceptDetailSerializer if self.is_verbose(request) else ConceptListSerializer
@@ -262,21 +279,26 @@ class ConceptLabelRetrieveUpdateDestroyView(ConceptBaseView, RetrieveUpdateDestr
     def update(self, request, **_):
         partial = True
         instance = self.get_object()
+        if not instance:
+            return Response(dict(detail='Not found.'), status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
 
         if serializer.is_valid():
             resource_instance = self.get_resource_object()
             new_version = resource_instance.clone()
-            saved_instance = serializer.save()
             subject_label_attr = "cloned_{}".format(self.parent_list_attribute)
             labels = getattr(new_version, subject_label_attr, [])
-            labels.append(saved_instance)
-            setattr(new_version, subject_label_attr, labels)
-            new_version.comment = 'Updated %s in %s.' % (saved_instance.name, self.parent_list_attribute)
+            # the label row is shared with the previous versions, the new version gets a changed copy of it
+            label = next((label for label in labels if label.id == instance.id), None)
+            if not label:
+                return Response(dict(detail='Not found.'), status=status.HTTP_404_NOT_FOUND)
+            for attr, value in serializer.validated_data.items():
+                setattr(label, attr, value)
+            new_version.comment = 'Updated %s in %s.' % (label.name, self.parent_list_attribute)
             errors = Concept.persist_clone(new_version, request.user)
             if errors:
                 return Response(errors, status=status.HTTP_400_BAD_REQUEST)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(self.get_serializer(label).data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -287,9 +309,7 @@ class ConceptLabelRetrieveUpdateDestroyView(ConceptBaseView, RetrieveUpdateDestr
             resource_instance = self.get_resource_object()
             new_version = resource_instance.clone()
             subject_label_attr = "cloned_{}".format(self.parent_list_attribute)
-            labels = getattr(new_version, subject_label_attr, [])
-            if isinstance(labels, QuerySet):
-                labels = labels.exclude(id=instance.id)
+            labels = [label for label in getattr(new_version, subject_label_attr, []) if label.id != instance.id]
             setattr(new_version, subject_label_attr, labels)
             new_version.comment = 'Deleted %s in %s.' % (instance.name, self.parent_list_attribute)
             errors = Concept.persist_clone(new_version, request.user)
@@ -323,6 +343,27 @@ class ConceptExtrasBaseView(ConceptBaseView):
         return self.get_queryset().filter(is_latest_version=True).first()
 
 
+class ConceptMutationsView(ConceptExtrasBaseView):
+    permission_classes = (CanEditParentDictionary,)
+
+    def post(self, request, **_):
+        instance = self.get_object()
+        if not instance:
+            return Response(dict(detail='Not found.'), status=status.HTTP_404_NOT_FOUND)
+
+        mutations = ConceptMutations(instance, request.user)
+        errors = mutations.run(
+            request.data.get('operations', None),
+            request.data.get('update_comment', None) or request.data.get('comment', None)
+        )
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            ConceptDetailSerializer(mutations.new_version, context={'request': request}).data,
+            status=status.HTTP_200_OK
+        )
+
+
 class ConceptExtrasView(ConceptExtrasBaseView, ListAPIView):
     permission_classes = (CanViewParentDictionary,)
 
@@ -0,0 +1,19 @@
+JOB_PENDING = 'PENDING'
+JOB_RUNNING = 'RUNNING'
+JOB_SUCCESS = 'SUCCESS'
+JOB_FAILED = 'FAILED'
+JOB_STATUS_CHOICES = [(status, status) for status in [JOB_PENDING, JOB_RUNNING, JOB_SUCCESS, JOB_FAILED]]
+JOB_ACTIVE_STATUSES = [JOB_PENDING, JOB_RUNNING]
+
+SEED_VERSION = 'seed_version'
+VALIDATE_SCHEMA = 'validate_schema'
+ADD_REFERENCES = 'add_references'
+EXPORT_VERSION = 'export_version'
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 30
+UNKNOWN_TASK = 'Unknown task {}'
+RESOURCE_NOT_FOUND = 'Resource {} {} not found'
+JOB_LEASE_SECONDS = 60 * 60
+JOB_LEASE_EXPIRED = 'Worker stopped running the job, no attempts left'
+SCHEMA_VALIDATION_FAILED = 'Concepts failed validation against {} schema'
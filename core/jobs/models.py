@@ -0,0 +1,197 @@
+import json
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.postgres.fields import JSONField
+from django.db import models, transaction, connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from core.common.identity_map import identity_map
+from core.jobs.constants import (
+    JOB_STATUS_CHOICES, JOB_PENDING, JOB_RUNNING, JOB_SUCCESS, JOB_FAILED, JOB_ACTIVE_STATUSES,
+    DEFAULT_MAX_ATTEMPTS, RETRY_DELAY_SECONDS, JOB_LEASE_SECONDS, JOB_LEASE_EXPIRED, RESOURCE_NOT_FOUND
+)
+
+
+class Job(models.Model):
+    """
+    Background work queued in Postgres, run by `manage.py run_workers`.
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so they poll the same table without a broker.
+    A claimed job is leased until locked_until, which its worker keeps extending while the job runs, so the job is
+    only claimed again once its worker died, unless it has no attempts left. Failures are retried with a growing
+    delay up to max_attempts.
+    """
+    class Meta:
+        db_table = 'jobs'
+        indexes = [models.Index(fields=['status', 'run_at'], name='jobs_status_run_at')]
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    kwargs = JSONField(default=dict, blank=True)
+    resource_type = models.CharField(max_length=100, null=True, blank=True)
+    resource_id = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=JOB_STATUS_CHOICES, default=JOB_PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=DEFAULT_MAX_ATTEMPTS)
+    result = JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        'users.UserProfile', related_name='jobs', on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{} #{}'.format(self.name, self.id)
+
+    @property
+    def url(self):
+        return reverse('job-detail', kwargs=dict(job=self.id))
+
+    @property
+    def is_active(self):
+        return self.status in JOB_ACTIVE_STATUSES
+
+    @property
+    def task(self):
+        from core.jobs.tasks import get_task
+        return get_task(self.name)
+
+    @classmethod
+    def enqueue(cls, name, resource=None, user=None, unique=False, **kwargs):
+        """
+        Queues task name to run on resource, a model instance, with kwargs (JSON serializable).
+        unique: returns the queued job for the same task and resource, if any, instead of queuing another one.
+        Tasks changing their resource flag it as processing until they are done.
+        """
+        from core.jobs.tasks import get_task
+        task = get_task(name)
+        resource_fields = dict(
+            resource_type=resource._meta.label, resource_id=resource.id  # pylint: disable=protected-access
+        ) if resource else dict()
+        if unique:
+            job = cls.objects.filter(name=name, status__in=JOB_ACTIVE_STATUSES, **resource_fields).first()
+            if job:
+                return job
+
+        job = cls.objects.create(name=name, kwargs=kwargs, created_by=user, **resource_fields)
+        if resource is not None and task.processing:
+            resource.is_processing = True
+            resource.__class__.objects.filter(id=resource.id).update(is_processing=True)
+            identity_map.invalidate(resource)
+
+        return job
+
+    @classmethod
+    def claim(cls):
+        while True:
+            now = timezone.now()
+            with transaction.atomic():
+                job = cls.objects.select_for_update(skip_locked=True).filter(
+                    Q(status=JOB_PENDING, run_at__lte=now) | Q(status=JOB_RUNNING, locked_until__lt=now)
+                ).order_by('run_at', 'id').first()
+                if job is None:
+                    return None
+                if job.status == JOB_RUNNING and job.attempts >= job.max_attempts:
+                    # its last worker died running it, e.g. killed for running out of memory
+                    job.finish(JOB_FAILED, None, JOB_LEASE_EXPIRED)
+                    continue
+
+                job.status = JOB_RUNNING
+                job.attempts += 1
+                job.started_at = now
+                job.locked_until = now + timedelta(seconds=JOB_LEASE_SECONDS)
+                job.save(update_fields=['status', 'attempts', 'started_at', 'locked_until'])
+                return job
+
+    def renew_lease(self):
+        Job.objects.filter(id=self.id, status=JOB_RUNNING).update(
+            locked_until=timezone.now() + timedelta(seconds=JOB_LEASE_SECONDS)
+        )
+
+    @contextmanager
+    def leased(self):
+        """Renews the lease every third of JOB_LEASE_SECONDS from a thread, with its own connection."""
+        stopped = threading.Event()
+
+        def renew():
+            try:
+                while not stopped.wait(JOB_LEASE_SECONDS / 3):
+                    self.renew_lease()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def get_resource(self):
+        if not self.resource_type:
+            return None
+        return apps.get_model(self.resource_type).objects.filter(id=self.resource_id).first()
+
+    def run(self):
+        from core.jobs.tasks import TaskFailed
+        try:
+            resource = self.get_resource()
+            if self.resource_type and resource is None:
+                raise TaskFailed(RESOURCE_NOT_FOUND.format(self.resource_type, self.resource_id))
+            kwargs = dict(self.kwargs)
+            with self.leased(), transaction.atomic(), identity_map.scope():
+                result = self.task.func(resource, user=self.created_by, **kwargs)
+        except TaskFailed as ex:
+            self.finish(JOB_FAILED, ex.result, str(ex))
+        except Exception as ex:  # pylint: disable=broad-except
+            if self.attempts < self.max_attempts:
+                self.retry(ex)
+            else:
+                self.finish(JOB_FAILED, None, repr(ex))
+        else:
+            self.finish(JOB_SUCCESS, result)
+
+    def retry(self, ex):
+        self.status = JOB_PENDING
+        self.error = repr(ex)
+        self.run_at = timezone.now() + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** (self.attempts - 1))
+        self.locked_until = None
+        self.save(update_fields=['status', 'error', 'run_at', 'locked_until'])
+
+    def finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = json.loads(json.dumps(result, default=str)) if result is not None else None
+        self.error = error
+        self.finished_at = timezone.now()
+        self.locked_until = None
+        self.save(update_fields=['status', 'result', 'error', 'finished_at', 'locked_until'])
+        self.release_resource()
+
+    def release_resource(self):
+        """
+        Clears the processing flag of the resource once none of its jobs is queued or running, unless this job
+        failed leaving the resource incomplete, e.g. a version whose seeding was rolled back.
+        """
+        if not self.resource_type or not self.task.processing:
+            return
+        if self.status == JOB_FAILED and self.task.incomplete_on_failure:
+            return
+
+        resource = self.get_resource()
+        if resource is None:
+            return
+
+        resource.is_processing = Job.objects.filter(
+            resource_type=self.resource_type, resource_id=self.resource_id, status__in=JOB_ACTIVE_STATUSES
+        ).exists()
+        if not resource.is_processing:
+            resource.save(update_fields=['is_processing'])
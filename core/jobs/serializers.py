@@ -0,0 +1,18 @@
+from rest_framework.fields import CharField, DateTimeField
+from rest_framework.serializers import ModelSerializer
+
+from core.jobs.models import Job
+
+
+class JobSerializer(ModelSerializer):
+    created_by = CharField(source='created_by.username', read_only=True, default=None)
+    created_on = DateTimeField(source='created_at', read_only=True)
+    started_on = DateTimeField(source='started_at', read_only=True)
+    finished_on = DateTimeField(source='finished_at', read_only=True)
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'name', 'status', 'resource_type', 'resource_id', 'attempts', 'max_attempts', 'result', 'error',
+            'created_by', 'created_on', 'started_on', 'finished_on', 'url',
+        )
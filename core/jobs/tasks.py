@@ -0,0 +1,73 @@
+from collections import namedtuple
+
+from core.jobs.constants import (
+    SEED_VERSION, VALIDATE_SCHEMA, ADD_REFERENCES, EXPORT_VERSION, UNKNOWN_TASK, SCHEMA_VALIDATION_FAILED
+)
+
+Task = namedtuple('Task', ['func', 'processing', 'incomplete_on_failure'], defaults=[False])
+TASKS = dict()
+
+
+class TaskFailed(Exception):
+    """A failure retrying cannot fix (e.g. invalid data), the job fails right away with result."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+def task(name, processing=False, incomplete_on_failure=False):
+    """
+    Registers func as the task name, called by a worker as func(resource, user=..., **job kwargs) in a transaction.
+    processing: the task changes its resource, which is flagged as processing while the job is queued or running.
+    incomplete_on_failure: the resource is unusable until the task succeeds, so it stays flagged as processing
+    (hence is neither exported nor cached) when the job fails for good.
+    """
+    def register(func):
+        TASKS[name] = Task(func, processing, incomplete_on_failure)
+        return func
+
+    return register
+
+
+def get_task(name):
+    if name not in TASKS:
+        raise KeyError(UNKNOWN_TASK.format(name))
+    return TASKS[name]
+
+
+@task(SEED_VERSION, processing=True, incomplete_on_failure=True)
+def seed_version(version, user=None):  # pylint: disable=unused-argument
+    version.seed_concepts()
+    version.seed_references()
+
+
+@task(VALIDATE_SCHEMA, processing=True)
+def validate_schema(repo, user=None, custom_validation_schema=None):
+    """The new schema is only applied once all the concepts of repo validate against it."""
+    repo.custom_validation_schema = custom_validation_schema
+    failed_concept_validations = repo.validate_child_concepts() or []
+    if failed_concept_validations:
+        raise TaskFailed(
+            SCHEMA_VALIDATION_FAILED.format(custom_validation_schema),
+            dict(failed_concept_validations=failed_concept_validations)
+        )
+
+    if user:
+        repo.updated_by = user
+    repo.save()
+    return dict(custom_validation_schema=custom_validation_schema)
+
+
+@task(ADD_REFERENCES, processing=True)
+def add_references(collection, user=None, data=None, cascade_mappings=False):
+    added_references, errors = collection.add_expressions(data or dict(), user, cascade_mappings)
+    return dict(added=[reference.expression for reference in added_references], errors=errors)
+
+
+@task(EXPORT_VERSION)
+def export_version(version, user=None):  # pylint: disable=unused-argument
+    from core.common.exports import export_version as export
+    if version.is_exportable and not version.export_etag:
+        return dict(etag=export(version))
+    return None
@@ -0,0 +1,154 @@
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from mock import patch, Mock
+
+from core.collections.models import Collection
+from core.collections.tests.factories import CollectionFactory
+from core.common.constants import HEAD
+from core.common.tests import OCLTestCase
+from core.concepts.tests.factories import ConceptFactory
+from core.jobs.constants import (
+    JOB_PENDING, JOB_RUNNING, JOB_SUCCESS, JOB_FAILED, EXPORT_VERSION, SEED_VERSION, JOB_LEASE_EXPIRED
+)
+from core.jobs.models import Job
+from core.jobs.tasks import TASKS, Task, TaskFailed
+from core.sources.tests.factories import SourceFactory
+
+
+class JobTest(OCLTestCase):
+    def test_persist_new_version_in_background(self):
+        head = CollectionFactory()
+        source = SourceFactory()
+        concept = ConceptFactory(parent=source, sources=[source])
+        head.add_references([concept.uri])
+        version = Collection(
+            mnemonic=head.mnemonic, name=head.name, version='v1', organization=head.organization, released=True
+        )
+
+        Collection.persist_new_version(version, head.created_by, sync=False)
+
+        self.assertTrue(Collection.objects.get(id=version.id).is_processing)
+        self.assertEqual(version.concepts.count(), 0)
+        self.assertEqual(version.job.status, JOB_PENDING)
+        self.assertEqual(version.job.url, '/jobs/{}/'.format(version.job.id))
+
+        job = Job.claim()
+        self.assertEqual(job, version.job)
+        job.run()
+
+        version = Collection.objects.get(id=version.id)
+        self.assertEqual(job.status, JOB_SUCCESS)
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(version.is_processing)
+        self.assertEqual(version.concepts.count(), 1)
+        self.assertEqual(version.references.count(), 1)
+        export_job = Job.objects.get(name=EXPORT_VERSION)
+        self.assertEqual(export_job.get_resource(), version)
+        self.assertEqual(Job.claim(), export_job)
+
+    def test_version_failing_to_seed_stays_processing(self):
+        head = CollectionFactory()
+        version = Collection(
+            mnemonic=head.mnemonic, name=head.name, version='v1', organization=head.organization, released=True
+        )
+        Collection.persist_new_version(version, head.created_by, sync=False)
+        Job.objects.filter(id=version.job.id).update(max_attempts=1)
+
+        with patch('core.collections.models.Collection.seed_concepts', side_effect=ValueError('boom')):
+            Job.claim().run()
+
+        self.assertEqual(Job.objects.get(id=version.job.id).status, JOB_FAILED)
+        version = Collection.objects.get(id=version.id)
+        self.assertTrue(version.is_processing)
+        self.assertFalse(version.is_exportable)
+        self.assertFalse(Job.objects.filter(name=EXPORT_VERSION, resource_id=version.id).exists())
+
+        job = Job.enqueue(SEED_VERSION, version)
+        Job.claim().run()
+        job.refresh_from_db()
+
+        version = Collection.objects.get(id=version.id)
+        self.assertEqual(job.status, JOB_SUCCESS)
+        self.assertFalse(version.is_processing)
+        self.assertTrue(version.is_exportable)
+
+    def test_retry_until_max_attempts(self):
+        func = Mock(side_effect=ValueError('boom'))
+        with patch.dict(TASKS, failing=Task(func, False)):
+            job = Job.enqueue('failing', foo='bar')
+            Job.objects.filter(id=job.id).update(max_attempts=2)
+
+            Job.claim().run()
+            job.refresh_from_db()
+            self.assertEqual(job.status, JOB_PENDING)
+            self.assertEqual(job.error, "ValueError('boom')")
+            self.assertTrue(job.run_at > timezone.now())
+            self.assertIsNone(Job.claim())
+
+            Job.objects.filter(id=job.id).update(run_at=timezone.now())
+            Job.claim().run()
+            job.refresh_from_db()
+
+        self.assertEqual(job.status, JOB_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+        func.assert_called_with(None, user=None, foo='bar')
+
+    def test_task_failed_is_not_retried(self):
+        collection = CollectionFactory(version=HEAD)
+        func = Mock(side_effect=TaskFailed('invalid', dict(errors=['bad'])))
+        with patch.dict(TASKS, invalid=Task(func, True)):
+            job = Job.enqueue('invalid', collection)
+            self.assertTrue(Collection.objects.get(id=collection.id).is_processing)
+
+            Job.claim().run()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.error, 'invalid')
+        self.assertEqual(job.result, dict(errors=['bad']))
+        self.assertFalse(Collection.objects.get(id=collection.id).is_processing)
+
+    def test_claim_job_with_expired_lease(self):
+        head = CollectionFactory()
+        collection = CollectionFactory(
+            version='v1', mnemonic=head.mnemonic, organization=head.organization, released=True
+        )
+        job = Job.objects.get(name=EXPORT_VERSION, resource_id=collection.id)
+        self.assertEqual(Job.enqueue(EXPORT_VERSION, collection, unique=True), job)
+
+        self.assertEqual(Job.claim(), job)
+        self.assertIsNone(Job.claim())
+
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        job = Job.claim()
+
+        self.assertEqual(job.status, JOB_RUNNING)
+        self.assertEqual(job.attempts, 2)
+
+    def test_expired_lease_without_attempts_left_fails(self):
+        job = Job.enqueue(EXPORT_VERSION)
+        Job.objects.filter(id=job.id).update(
+            status=JOB_RUNNING, attempts=job.max_attempts, locked_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertIsNone(Job.claim())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_FAILED)
+        self.assertEqual(job.error, JOB_LEASE_EXPIRED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_lease_is_renewed_while_running(self):
+        func = Mock(side_effect=lambda *args, **kwargs: time.sleep(0.2))
+        with patch.dict(TASKS, slow=Task(func, False)), patch('core.jobs.models.JOB_LEASE_SECONDS', 0.03), \
+                patch.object(Job, 'renew_lease') as renew_lease:
+            job = Job.enqueue('slow')
+            Job.claim().run()
+
+        self.assertTrue(renew_lease.called)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_SUCCESS)
@@ -0,0 +1,8 @@
+from django.urls import re_path
+
+from . import views
+
+urlpatterns = [
+    re_path(r'^$', views.JobListView.as_view(), name='job-list'),
+    re_path(r'^(?P<job>\d+)/$', views.JobRetrieveView.as_view(), name='job-detail'),
+]
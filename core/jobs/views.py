@@ -0,0 +1,36 @@
+from rest_framework.generics import RetrieveAPIView
+
+from core.common.mixins import ListWithHeadersMixin
+from core.common.views import BaseAPIView
+from core.jobs.constants import JOB_ACTIVE_STATUSES
+from core.jobs.models import Job
+from core.jobs.serializers import JobSerializer
+
+
+class JobBaseView(BaseAPIView):
+    lookup_field = 'job'
+    pk_field = 'id'
+    model = Job
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    def get_queryset(self):
+        queryset = Job.objects.select_related('created_by')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+
+class JobListView(JobBaseView, ListWithHeadersMixin):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.query_params.get('active', None):
+            queryset = queryset.filter(status__in=JOB_ACTIVE_STATUSES)
+        return queryset.order_by('-id')
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class JobRetrieveView(JobBaseView, RetrieveAPIView):
+    pass
@@ -34,36 +34,15 @@ class OpenMRSMappingValidator:
         if intersection.exists():
             raise ValidationError(OPENMRS_SINGLE_MAPPING_BETWEEN_TWO_CONCEPTS)
 
-    def map_type_should_be_valid_attribute(self, org):
-        is_data_type_valid = self.is_attribute_valid(self.mapping.map_type, org, 'MapTypes', 'MapType')
-
-        if not is_data_type_valid:
+    def map_type_should_be_valid_attribute(self, map_types):
+        if (self.mapping.map_type or 'None') not in map_types:
             raise ValidationError({'map_type': [OPENMRS_INVALID_MAPTYPE]})
 
-    @staticmethod
-    def is_attribute_valid(attribute_property, org, source_mnemonic, concept_class):
-        from core.sources.models import Source
-        from core.concepts.models import Concept
-
-        attribute_types_source_filter = Source.objects.filter(parent_id=org.id, mnemonic=source_mnemonic)
-
-        if not attribute_types_source_filter.exists():
-            raise ValidationError({'non_field_errors': [LOOKUP_ATTRIBUTES_MUST_BE_IMPORTED]})
-
-        matching_attribute_types = {
-            'retired': False, 'is_active': True, 'concept_class': concept_class,
-            'parent_id': attribute_types_source_filter.first().id, 'names__name': attribute_property or 'None'
-        }
-
-        return Concept.objects.filter(matching_attribute_types).exists()
-
     def lookup_attributes_should_be_valid(self):
-        from core.orgs.models import Organization
-        ocl_org_filter = Organization.objects.filter(mnemonic='OCL')
+        from core.concepts.validators import reference_values_registry
+        reference_values = reference_values_registry.get()
 
-        if not ocl_org_filter.exists():
+        if 'MapTypes' not in reference_values:
             raise ValidationError({'non_field_errors': [LOOKUP_ATTRIBUTES_MUST_BE_IMPORTED]})
 
-        org = ocl_org_filter.first()
-
-        self.map_type_should_be_valid_attribute(org)
+        self.map_type_should_be_valid_attribute(reference_values['MapTypes'])
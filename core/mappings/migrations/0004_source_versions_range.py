@@ -0,0 +1,33 @@
+# Generated by Django 3.0.8 on 2020-07-27 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mappings', '0003_mapping_versioned_object_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mapping',
+            name='source_versions_end',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mapping',
+            name='source_versions_start',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE mappings SET source_versions_start = (SELECT COALESCE(MAX(id), 0) + 1 FROM sources)
+            WHERE id IN (
+                SELECT mappings_sources.mapping_id FROM mappings_sources
+                INNER JOIN sources ON sources.id = mappings_sources.source_id WHERE sources.version = 'HEAD'
+            )
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.8 on 2020-07-29 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mappings', '0004_source_versions_range'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mapping',
+            index=models.Index(fields=['updated_at', 'id'], name='mappings_updated_at_id'),
+        ),
+        migrations.AddIndex(
+            model_name='mapping',
+            index=models.Index(fields=['versioned_object_id', 'id'], name='mappings_versioned_id'),
+        ),
+    ]
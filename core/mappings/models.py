@@ -3,6 +3,7 @@ from django.db import models, IntegrityError, transaction
 from pydash import get, compact
 
 from core.common.constants import TEMP
+from core.common.identity_map import identity_map
 from core.common.mixins import SourceChildMixin
 from core.common.models import VersionedModel
 from core.mappings.constants import MAPPING_TYPE, MAPPING_IS_ALREADY_RETIRED, MAPPING_WAS_RETIRED, \
@@ -13,6 +14,10 @@ from core.mappings.mixins import MappingValidationMixin
 class Mapping(MappingValidationMixin, SourceChildMixin, VersionedModel):
     class Meta:
         db_table = 'mappings'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='mappings_updated_at_id'),
+            models.Index(fields=['versioned_object_id', 'id'], name='mappings_versioned_id'),
+        ]
 
     parent = models.ForeignKey('sources.Source', related_name='mappings_set', on_delete=models.DO_NOTHING)
     map_type = models.TextField()
@@ -28,6 +33,8 @@ class Mapping(MappingValidationMixin, SourceChildMixin, VersionedModel):
     to_concept_code = models.TextField(null=True, blank=True)
     to_concept_name = models.TextField(null=True, blank=True)
     sources = models.ManyToManyField('sources.Source', related_name='mappings')
+    source_versions_start = models.BigIntegerField(null=True, blank=True)
+    source_versions_end = models.BigIntegerField(null=True, blank=True)
     external_id = models.TextField(null=True, blank=True)
     comment = models.TextField(null=True, blank=True)
     versioned_object_id = models.BigIntegerField(null=True, blank=True)
@@ -197,10 +204,7 @@ class Mapping(MappingValidationMixin, SourceChildMixin, VersionedModel):
             mapping.versioned_object_id = mapping.id
             mapping.save()
             parent = mapping.parent
-            parent_head = parent.head
             mapping.sources.set([parent, parent.head])
-            parent.save()
-            parent_head.save()
         except ValidationError as ex:
             mapping.errors.update(ex.message_dict)
         except IntegrityError as ex:
@@ -232,12 +236,9 @@ class Mapping(MappingValidationMixin, SourceChildMixin, VersionedModel):
             obj.save()
             latest_versions = obj.versions.exclude(id=obj.id).filter(is_latest_version=True)
             latest_versions.update(is_latest_version=False)
+            identity_map.invalidate(obj)
             obj.sources.set(compact([parent, parent_head]))
 
-            # to update counts
-            parent.save()
-            parent_head.save()
-
             persisted = True
         except ValidationError as err:
             errors.update(err.message_dict)
@@ -35,7 +35,7 @@ class Organization(BaseResourceModel, SourceContainerMixin):
         return self.members.count()
 
     def is_member(self, userprofile):
-        return userprofile and self.members.filter(id=userprofile.id).exists()
+        return bool(userprofile) and self.id in userprofile.organization_ids
 
     @staticmethod
     def get_url_kwarg():
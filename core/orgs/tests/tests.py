@@ -106,3 +106,20 @@ class OrganizationTest(OCLTestCase):
         self.assertTrue(org.is_active)
         self.assertTrue(source.is_active)
         self.assertTrue(collection.is_active)
+
+    def test_is_member(self):
+        from core.users.models import UserProfile
+        from core.users.tests.factories import UserProfileFactory
+        org = OrganizationFactory()
+        user = UserProfileFactory()
+
+        self.assertFalse(org.is_member(user))
+        with self.assertNumQueries(0):
+            self.assertFalse(org.is_member(UserProfile(id=user.id)))
+
+        user.organizations.add(org)
+        self.assertTrue(org.is_member(user))
+
+        org.members.remove(user)
+        self.assertFalse(org.is_member(UserProfile(id=user.id)))
+        self.assertFalse(org.is_member(None))
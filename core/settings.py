@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'core.collections',
     'core.concepts',
     'core.mappings',
+    'core.jobs',
 ]
 
 REST_FRAMEWORK = {
@@ -52,7 +54,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'core.users.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
@@ -71,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.common.middlewares.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -107,6 +110,22 @@ DATABASES = {
     }
 }
 
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'locmem')  # or 'filesystem'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache' if RESPONSE_CACHE == 'filesystem' else
+                   'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', os.path.join(BASE_DIR, 'response_cache')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -195,3 +214,9 @@ AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'ocl-api-dev')
 DISABLE_VALIDATION = os.environ.get('DISABLE_VALIDATION', False)
+EXPORT_STORAGE = os.environ.get('EXPORT_STORAGE', 's3')  # or 'local'
+AUTH_CACHE_TIMEOUT = int(os.environ.get('AUTH_CACHE_TIMEOUT', 300))  # seconds tokens and memberships are cached
+EXPORT_LOCAL_ROOT = os.environ.get('EXPORT_LOCAL_ROOT', os.path.join(BASE_DIR, 'exports'))
+RESPONSE_CACHE_HEAD_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_HEAD_TIMEOUT', 60))  # HEAD and unreleased versions
+AUTOCOMPLETE_ENTRIES = int(os.environ.get('AUTOCOMPLETE_ENTRIES', 2000000))  # autocomplete word starts kept per process
+REFERENCE_VALUES_TTL = int(os.environ.get('REFERENCE_VALUES_TTL', 300))  # seconds between lookup values checks
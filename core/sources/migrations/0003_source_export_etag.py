@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2020-07-27 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0002_auto_20200720_1450'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='export_etag',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import UniqueConstraint, Max
 
 from core.common.models import ConceptContainerModel
 from core.common.utils import reverse_resource
@@ -28,9 +28,9 @@ class Source(ConceptContainerModel):
     OBJECT_TYPE = SOURCE_TYPE
 
     @classmethod
-    def get_base_queryset(cls, params):
+    def get_base_queryset(cls, params, requesting_user=None):
         source = params.pop('source', None)
-        queryset = super().get_base_queryset(params)
+        queryset = super().get_base_queryset(params, requesting_user)
         if source:
             queryset = queryset.filter(mnemonic=source)
 
@@ -68,7 +68,51 @@ class Source(ConceptContainerModel):
 
         return self.custom_validation_schema is not None and self.num_concepts > 0
 
-    def seed_concepts(self):
-        head = self.head
-        if head:
-            self.concepts.set(head.concepts.all())
+    def get_concepts_queryset(self):
+        from core.concepts.models import Concept
+        return Concept.objects.filter(self.get_children_criteria(self.concepts))
+
+    def get_mappings_queryset(self):
+        from core.mappings.models import Mapping
+        return Mapping.objects.filter(self.get_children_criteria(self.mappings))
+
+    def get_children_criteria(self, children):
+        """
+        Children linked to HEAD are not copied into every new version. Instead each child carries the range of
+        version ids [source_versions_start, source_versions_end) it belongs to, so a version is made of the
+        children linked to it directly plus the children whose range covers its id.
+        """
+        criteria = models.Q(id__in=children.values('id'))
+        if self.is_head or not self.id:
+            return criteria
+
+        return criteria | models.Q(
+            models.Q(source_versions_end__isnull=True) | models.Q(source_versions_end__gt=self.id),
+            parent__mnemonic=self.mnemonic, parent__organization_id=self.organization_id,
+            parent__user_id=self.user_id, source_versions_start__lte=self.id,
+        )
+
+    def track_linked_children(self, children):
+        next_version_id = self.get_next_version_id()
+        for child in children.filter(source_versions_end__isnull=False):
+            # linked again after being unlinked: a range can't have gaps, so pin the versions of the old range.
+            # These versions already count the child, so the links are inserted without m2m signals.
+            through = child.sources.through
+            through.objects.bulk_create([
+                through(**{child.__class__.__name__.lower() + '_id': child.id, 'source_id': version_id})
+                for version_id in self.versions.filter(
+                    id__gte=child.source_versions_start, id__lt=child.source_versions_end
+                ).values_list('id', flat=True)
+            ], ignore_conflicts=True)
+        children.filter(
+            models.Q(source_versions_start__isnull=True) | models.Q(source_versions_end__isnull=False)
+        ).update(source_versions_start=next_version_id, source_versions_end=None)
+
+    def track_unlinked_children(self, children):
+        children.filter(
+            source_versions_start__isnull=False, source_versions_end__isnull=True
+        ).update(source_versions_end=self.get_next_version_id())
+
+    def get_next_version_id(self):
+        """Lower bound for the id of any version created from now on."""
+        return self.versions.aggregate(Max('id'))['id__max'] + 1
@@ -65,7 +65,7 @@ class SourceCreateOrUpdateSerializer(ModelSerializer):
     def update(self, instance, validated_data):
         source = self.prepare_object(validated_data, instance)
         user = self.context['request'].user
-        errors = Source.persist_changes(source, user)
+        errors = Source.persist_changes(source, user, sync=validated_data.get('sync', True))
         self._errors.update(errors)
         return source
 
@@ -109,10 +109,10 @@ class SourceCreateSerializer(SourceCreateOrUpdateSerializer):
         self._errors.update(errors)
         return source
 
-    def create_version(self, validated_data):
+    def create_version(self, validated_data, sync=True):
         source = self.prepare_object(validated_data)
         user = self.context['request'].user
-        errors = Source.persist_new_version(source, user)
+        errors = Source.persist_new_version(source, user, sync=sync)
         self._errors.update(errors)
         return source
 
@@ -1,6 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
+from core.common.constants import HEAD, LOOKUP_SOURCES
+from core.concepts.models import Concept
+from core.concepts.validators import reference_values_registry
+from core.mappings.models import Mapping
 from core.sources.models import Source
 
 
@@ -11,3 +16,38 @@ def propagate_parent_attributes(sender, instance=None, created=False, **kwargs):
         instance.concepts_set.exclude(public_access=instance.public_access).update(public_access=instance.public_access)
         instance.mappings_set.exclude(is_active=instance.is_active).update(is_active=instance.is_active)
         instance.mappings_set.exclude(public_access=instance.public_access).update(public_access=instance.public_access)
+
+
+@receiver(m2m_changed, sender=Concept.sources.through)
+@receiver(m2m_changed, sender=Mapping.sources.through)
+def track_source_versions_range(  # pylint: disable=too-many-arguments
+        sender, instance=None, action=None, reverse=False, model=None, pk_set=None, **kwargs
+):  # pylint: disable=unused-argument
+    if action not in ['post_add', 'post_remove'] or not pk_set:
+        return
+
+    if reverse:
+        heads = [instance] if instance.is_head else []
+        children = model.objects.filter(id__in=pk_set)
+    else:
+        heads = Source.objects.filter(id__in=pk_set, version=HEAD)
+        children = instance.__class__.objects.filter(id=instance.id)
+
+    for head in heads:
+        if action == 'post_add':
+            head.track_linked_children(children)
+        else:
+            head.track_unlinked_children(children)
+
+    if heads and not reverse:
+        # keeps a later save of the instance from writing back the stale range
+        instance.refresh_from_db(fields=['source_versions_start', 'source_versions_end'])
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_delete, sender=Source)
+@receiver(post_save, sender=Concept)
+def invalidate_reference_values(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    source = instance if sender == Source else instance.parent
+    if source.mnemonic in LOOKUP_SOURCES:
+        transaction.on_commit(reference_values_registry.invalidate)
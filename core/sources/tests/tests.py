@@ -1,9 +1,15 @@
+from io import StringIO
+
 from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 
-from core.common.constants import HEAD
+from core.common.constants import HEAD, CUSTOM_VALIDATION_SCHEMA_OPENMRS
 from core.common.tests import OCLTestCase
-from core.concepts.tests.factories import ConceptFactory
+from core.concepts.constants import OPENMRS_FULLY_SPECIFIED_NAME_UNIQUE_PER_SOURCE_LOCALE
+from core.concepts.models import Concept
+from core.concepts.tests.factories import ConceptFactory, LocalizedTextFactory
+from core.concepts.validators import reference_values_registry
 from core.sources.models import Source
 from core.sources.tests.factories import SourceFactory
 from core.users.tests.factories import UserProfileFactory
@@ -184,9 +190,56 @@ class SourceTest(OCLTestCase):
         self.assertEqual(source.concepts_set.count(), 1)  # parent-child
         self.assertEqual(source.concepts.count(), 1)
         self.assertTrue(version1.is_latest_version)
-        self.assertEqual(version1.concepts.count(), 1)
+        self.assertEqual(version1.concepts.count(), 0)  # no copied links
+        self.assertEqual(version1.get_concepts_queryset().count(), 1)
         self.assertEqual(version1.concepts_set.count(), 0)  # no direct child
 
+    def test_persist_new_version_membership_by_range(self):
+        source = SourceFactory(version=HEAD)
+        concept1 = ConceptFactory(mnemonic='concept1', parent=source)
+        version1 = SourceFactory.build(
+            name='version1', version='v1', mnemonic=source.mnemonic, organization=source.organization
+        )
+        Source.persist_new_version(version1, source.created_by)
+        concept2 = ConceptFactory(mnemonic='concept2', parent=source)
+        version2 = SourceFactory.build(
+            name='version2', version='v2', mnemonic=source.mnemonic, organization=source.organization
+        )
+        Source.persist_new_version(version2, source.created_by)
+        concept3 = ConceptFactory(mnemonic='concept3', parent=source)
+
+        self.assertEqual(list(version1.get_concepts_queryset()), [concept1])
+        self.assertEqual(list(version2.get_concepts_queryset().order_by('id')), [concept1, concept2])
+        self.assertEqual(
+            list(source.get_concepts_queryset().order_by('id')), [concept1, concept2, concept3]
+        )
+        version2.update_active_counts()
+        self.assertEqual(version2.active_concepts, 2)
+        self.assertEqual(
+            list(Concept.get_base_queryset(dict(source=source.mnemonic, version='v1'))), [concept1]
+        )
+        self.assertEqual(
+            list(Concept.get_base_queryset(
+                dict(source=source.mnemonic, version='v2', org=source.organization.mnemonic)
+            ).order_by('id')),
+            [concept1, concept2]
+        )
+        self.assertEqual(Concept.get_base_queryset(dict(source=source.mnemonic, version='v3')).count(), 0)
+
+        source.concepts.remove(concept1)
+        version3 = SourceFactory.build(
+            name='version3', version='v3', mnemonic=source.mnemonic, organization=source.organization
+        )
+        Source.persist_new_version(version3, source.created_by)
+
+        self.assertEqual(list(version3.get_concepts_queryset().order_by('id')), [concept2, concept3])
+        self.assertEqual(list(version2.get_concepts_queryset().order_by('id')), [concept1, concept2])
+
+        source.concepts.add(concept1)
+
+        self.assertEqual(list(version2.get_concepts_queryset().order_by('id')), [concept1, concept2])
+        self.assertEqual(list(version3.get_concepts_queryset().order_by('id')), [concept2, concept3])
+
     def test_source_version_delete(self):
         source = SourceFactory(version=HEAD)
         concept = ConceptFactory(mnemonic='concept1', version=HEAD, sources=[source], parent=source)
@@ -200,7 +253,7 @@ class SourceTest(OCLTestCase):
         Source.persist_new_version(version1, source.created_by)
         source.refresh_from_db()
 
-        self.assertEqual(concept.sources.count(), 2)
+        self.assertEqual(concept.sources.count(), 1)
         self.assertTrue(version1.is_latest_version)
         self.assertFalse(source.is_latest_version)
 
@@ -209,7 +262,7 @@ class SourceTest(OCLTestCase):
             version='v1',
         )
         self.assertTrue(source_versions.exists())
-        self.assertEqual(version1.concepts.count(), 1)
+        self.assertEqual(version1.get_concepts_queryset().count(), 1)
 
         version1.delete()
         source.refresh_from_db()
@@ -242,6 +295,28 @@ class SourceTest(OCLTestCase):
         self.assertEqual(source.last_concept_update, concept.updated_at)
         self.assertEqual(source.last_child_update, source.last_concept_update)
 
+    def test_child_counts_are_tracked_on_link_and_unlink(self):
+        source = SourceFactory(version=HEAD)
+        concept = ConceptFactory(parent=source)
+        ConceptFactory(parent=source, retired=True)
+        source.refresh_from_db()
+
+        self.assertEqual(source.active_concepts, 1)
+        self.assertEqual(source.active_mappings, 0)
+
+        source.concepts.remove(concept)
+        source.refresh_from_db()
+
+        self.assertEqual(source.active_concepts, 0)
+
+        source.concepts.add(concept)
+        Source.objects.filter(id=source.id).update(active_concepts=10, last_concept_update=None)
+        call_command('rebuild_children_counts', source=source.mnemonic, stdout=StringIO())
+        source.refresh_from_db()
+
+        self.assertEqual(source.active_concepts, 1)
+        self.assertIsNotNone(source.last_concept_update)
+
     def test_source_active_inactive_should_affect_children(self):
         source = SourceFactory(is_active=True)
         concept = ConceptFactory(parent=source, is_active=True)
@@ -259,3 +334,72 @@ class SourceTest(OCLTestCase):
 
         self.assertTrue(source.is_active)
         self.assertTrue(concept.is_active)
+
+    def test_validate_child_concepts(self):
+        self.create_lookup_concept_classes()
+        source = SourceFactory(version=HEAD)
+        concept1 = ConceptFactory(
+            parent=source, names=[LocalizedTextFactory(name='Malaria', locale_preferred=True)]
+        )
+        concept2 = ConceptFactory(
+            parent=source, names=[LocalizedTextFactory(name='Malaria', locale_preferred=True)]
+        )
+        ConceptFactory(parent=source, names=[LocalizedTextFactory(name='Fever', locale_preferred=True)])
+        ConceptFactory(parent=source, names=[LocalizedTextFactory(name='Cough', locale_preferred=True)])
+        source.custom_validation_schema = CUSTOM_VALIDATION_SCHEMA_OPENMRS
+        reference_values_registry.get()
+
+        with self.assertNumQueries(4):
+            failed_concept_validations = source.validate_child_concepts()
+
+        error = dict(names=[
+            OPENMRS_FULLY_SPECIFIED_NAME_UNIQUE_PER_SOURCE_LOCALE + ': Malaria (locale: en, preferred: yes)'
+        ])
+        self.assertCountEqual(
+            failed_concept_validations, [
+                dict(mnemonic=concept1.mnemonic, url=concept1.url, errors=error),
+                dict(mnemonic=concept2.mnemonic, url=concept2.url, errors=error),
+            ]
+        )
+
+    def test_csv_rows(self):
+        from core.sources.views import SourceListView
+        source1 = SourceFactory(mnemonic='s1', supported_locales=['en', 'fr'])
+        source2 = SourceFactory(mnemonic='s2', organization=None, user=self.user)
+
+        with self.assertNumQueries(1):
+            rows = list(SourceListView().get_csv_rows(Source.objects.filter(id__in=[source1.id, source2.id])))
+
+        rows = sorted(rows, key=lambda row: row['Source ID'])
+        self.assertEqual([row['Owner'] for row in rows], [source1.organization.mnemonic, self.user.username])
+        self.assertEqual(rows[0]['Supported Locales'], 'en,fr')
+        self.assertEqual(rows[0]['URI'], source1.uri)
+
+    def test_get_base_queryset_visibility(self):
+        from django.contrib.auth.models import AnonymousUser
+        from core.common.constants import ACCESS_TYPE_NONE
+        from core.common.permissions import CanViewConceptDictionary
+        public = SourceFactory(mnemonic='public')
+        private_user = SourceFactory(
+            mnemonic='private-user', organization=None, user=self.user, public_access=ACCESS_TYPE_NONE
+        )
+        private_member = SourceFactory(mnemonic='private-member', public_access=ACCESS_TYPE_NONE)
+        private_other = SourceFactory(mnemonic='private-other', public_access=ACCESS_TYPE_NONE)
+        self.user.organizations.add(private_member.organization)
+        all_ids = [public.id, private_user.id, private_member.id, private_other.id]
+
+        def visible_ids(user):
+            return sorted(Source.get_base_queryset(dict(), user).filter(id__in=all_ids).values_list('id', flat=True))
+
+        self.assertEqual(visible_ids(AnonymousUser()), [public.id])
+        self.assertEqual(visible_ids(self.user), [public.id, private_user.id, private_member.id])
+        self.assertEqual(visible_ids(UserProfileFactory(is_staff=True)), sorted(all_ids))
+
+        request = type('Request', (), dict(user=self.user))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [CanViewConceptDictionary().has_object_permission(request, None, source) for source in [
+                    public, private_user, private_member, private_other
+                ]],
+                [True, True, True, False]
+            )
@@ -15,6 +15,11 @@ urlpatterns = [
         views.SourceVersionListView.as_view(),
         name='source-version-list'
     ),
+    re_path(
+        r"^(?P<source>{pattern})/autocomplete/$".format(pattern=NAMESPACE_PATTERN),
+        views.SourceConceptAutocompleteView.as_view(),
+        name='source-concept-autocomplete'
+    ),
     re_path(r"^(?P<source>{pattern})/concepts/".format(pattern=NAMESPACE_PATTERN), include('core.concepts.urls')),
     re_path(r"^(?P<source>{pattern})/mappings/".format(pattern=NAMESPACE_PATTERN), include('core.mappings.urls')),
     re_path(
@@ -22,6 +27,16 @@ urlpatterns = [
         views.SourceExtrasView.as_view(),
         name='source-extras'
     ),
+    re_path(
+        r'^(?P<source>{pattern})/(?P<version>{pattern})/export/$'.format(pattern=NAMESPACE_PATTERN),
+        views.SourceVersionExportView.as_view(),
+        name='source-version-export'
+    ),
+    re_path(
+        r'^(?P<source>{pattern})/(?P<version>{pattern})/autocomplete/$'.format(pattern=NAMESPACE_PATTERN),
+        views.SourceConceptAutocompleteView.as_view(),
+        name='sourceversion-concept-autocomplete'
+    ),
     re_path(
         r'^(?P<source>{pattern})/(?P<version>{pattern})/$'.format(pattern=NAMESPACE_PATTERN),
         views.SourceVersionRetrieveUpdateDestroyView.as_view(),
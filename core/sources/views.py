@@ -1,5 +1,6 @@
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.db.models.functions import Coalesce
 from pydash import get
 from rest_framework import status, mixins
 from rest_framework.generics import (
@@ -7,11 +8,15 @@ from rest_framework.generics import (
 )
 from rest_framework.response import Response
 
-from core.common.constants import HEAD, RELEASED_PARAM, PROCESSING_PARAM
-from core.common.mixins import ListWithHeadersMixin, ConceptDictionaryCreateMixin, ConceptDictionaryUpdateMixin
+from core.common.constants import HEAD, RELEASED_PARAM, PROCESSING_PARAM, SEARCH_PARAM, LIMIT_PARAM
+from core.common.mixins import (
+    ListWithHeadersMixin, ConceptDictionaryCreateMixin, ConceptDictionaryUpdateMixin, VersionExportMixin,
+    ConditionalVersionListMixin, ResponseCacheMixin
+)
 from core.common.permissions import CanViewConceptDictionary, CanEditConceptDictionary, HasAccessToVersionedObject
 from core.common.utils import parse_boolean_query_param, compact_dict_by_values
 from core.common.views import BaseAPIView
+from core.concepts.autocomplete import concept_autocomplete_registry
 from core.sources.models import Source
 from core.sources.serializers import (
     SourceDetailSerializer, SourceListSerializer, SourceCreateSerializer, SourceVersionDetailSerializer
@@ -43,7 +48,7 @@ class SourceBaseView(BaseAPIView):
         return params
 
     def get_queryset(self):
-        return Source.get_base_queryset(compact_dict_by_values(self.get_filter_params()))
+        return Source.get_base_queryset(compact_dict_by_values(self.get_filter_params()), self.request.user)
 
 
 class SourceVersionBaseView(SourceBaseView):
@@ -66,36 +71,37 @@ class SourceListView(SourceBaseView, ConceptDictionaryCreateMixin, ListWithHeade
         return self.list(request, *args, **kwargs)
 
     def get_csv_rows(self, queryset=None):
-        if not queryset:
+        if queryset is None:
             queryset = self.get_queryset()
 
-        values = queryset.values('mnemonic', 'name', 'full_name', 'source_type', 'description', 'default_locale',
-                                 'supported_locales', 'website', 'external_id', 'updated_at', 'updated_by', 'uri')
-
-        for value in values:
-            value['Owner'] = Source.objects.get(uri=value['uri']).parent.mnemonic
-            value['Source ID'] = value.pop('mnemonic')
-            value['Source Name'] = value.pop('name')
-            value['Source Full Name'] = value.pop('full_name')
-            value['Source Type'] = value.pop('source_type')
-            value['Description'] = value.pop('description')
-            value['Default Locale'] = value.pop('default_locale')
-            value['Supported Locales'] = ",".join(value.pop('supported_locales'))
-            value['Website'] = value.pop('website')
-            value['External ID'] = value.pop('external_id')
-            value['Last Updated'] = value.pop('updated_at')
-            value['Updated By'] = value.pop('updated_by')
-            value['URI'] = value.pop('uri')
-
-        values.field_names.extend([
-            'Owner', 'Source ID', 'Source Name', 'Source Full Name', 'Source Type', 'Description', 'Default Locale',
-            'Supported Locales', 'Website', 'External ID', 'Last Updated', 'Updated By', 'URI'
-        ])
-        del values.field_names[0:12]
-        return values
-
-
-class SourceRetrieveUpdateDestroyView(SourceBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView):
+        values = queryset.annotate(
+            owner=Coalesce('organization__mnemonic', 'user__username')
+        ).values(
+            'owner', 'mnemonic', 'name', 'full_name', 'source_type', 'description', 'default_locale',
+            'supported_locales', 'website', 'external_id', 'updated_at', 'updated_by', 'uri'
+        )
+
+        for value in values.iterator():
+            yield {
+                'Owner': value['owner'],
+                'Source ID': value['mnemonic'],
+                'Source Name': value['name'],
+                'Source Full Name': value['full_name'],
+                'Source Type': value['source_type'],
+                'Description': value['description'],
+                'Default Locale': value['default_locale'],
+                'Supported Locales': ",".join(value['supported_locales'] or []),
+                'Website': value['website'],
+                'External ID': value['external_id'],
+                'Last Updated': value['updated_at'],
+                'Updated By': value['updated_by'],
+                'URI': value['uri'],
+            }
+
+
+class SourceRetrieveUpdateDestroyView(
+        ResponseCacheMixin, SourceBaseView, ConceptDictionaryUpdateMixin, RetrieveAPIView, DestroyAPIView
+):
     serializer_class = SourceDetailSerializer
 
     def get_object(self, queryset=None):
@@ -117,7 +123,9 @@ class SourceRetrieveUpdateDestroyView(SourceBaseView, ConceptDictionaryUpdateMix
         return Response({'detail': 'Successfully deleted source.'}, status=status.HTTP_204_NO_CONTENT)
 
 
-class SourceVersionListView(SourceVersionBaseView, mixins.CreateModelMixin, ListWithHeadersMixin):
+class SourceVersionListView(
+        ConditionalVersionListMixin, SourceVersionBaseView, mixins.CreateModelMixin, ListWithHeadersMixin
+):
     released_filter = None
     processing_filter = None
 
@@ -147,10 +155,12 @@ class SourceVersionListView(SourceVersionBaseView, mixins.CreateModelMixin, List
         serializer = self.get_serializer(data=payload)
         if serializer.is_valid():
             try:
-                instance = serializer.create_version(payload)
+                instance = serializer.create_version(payload, sync=False)
                 if serializer.is_valid():
                     serializer = SourceDetailSerializer(instance, context={'request': request})
-                    return Response(serializer.data, status=status.HTTP_201_CREATED)
+                    return Response(
+                        serializer.data, status=status.HTTP_202_ACCEPTED, headers=dict(Location=instance.job.url)
+                    )
             except IntegrityError as ex:
                 return Response(
                     dict(error=str(ex), detail='Source version  \'%s\' already exist. ' % serializer.data.get('id')),
@@ -163,10 +173,16 @@ class SourceVersionListView(SourceVersionBaseView, mixins.CreateModelMixin, List
         queryset = super().get_queryset()
         if self.released_filter is not None:
             queryset = queryset.filter(released=self.released_filter)
+        if self.processing_filter is not None:
+            queryset = queryset.filter(is_processing=self.processing_filter)
         return queryset.order_by('-created_at')
 
 
-class SourceVersionRetrieveUpdateDestroyView(SourceBaseView, RetrieveAPIView, UpdateAPIView):
+class SourceVersionExportView(VersionExportMixin, SourceBaseView):
+    permission_classes = (HasAccessToVersionedObject,)
+
+
+class SourceVersionRetrieveUpdateDestroyView(ResponseCacheMixin, SourceBaseView, RetrieveAPIView, UpdateAPIView):
     permission_classes = (HasAccessToVersionedObject,)
     serializer_class = SourceDetailSerializer
 
@@ -200,6 +216,31 @@ class SourceVersionRetrieveUpdateDestroyView(SourceBaseView, RetrieveAPIView, Up
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class SourceConceptAutocompleteView(SourceBaseView):
+    default_limit = 10
+    max_limit = 100
+
+    def get_object(self, queryset=None):
+        return self.get_queryset().first()
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get(LIMIT_PARAM, self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+
+        return min(max(limit, 1), self.max_limit)
+
+    def get(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        version = self.get_object()
+        if not version:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        self.check_object_permissions(request, version)
+
+        index = concept_autocomplete_registry.get(version)
+        return Response(index.search(request.query_params.get(SEARCH_PARAM, ''), self.get_limit()))
+
+
 class SourceExtrasBaseView(SourceBaseView):
     def get_object(self, queryset=None):
         return self.get_queryset().filter(version=HEAD).first()
@@ -23,5 +23,6 @@ urlpatterns = [
     path('orgs/', include('core.orgs.urls')),
     path('sources/', include('core.sources.urls')),
     path('collections/', include('core.collections.urls')),
+    path('jobs/', include('core.jobs.urls')),
     path('concepts/', concept_views.ConceptVersionListAllView.as_view(), name='all-concepts'),
 ]
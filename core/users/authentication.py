@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from core.users.constants import AUTH_TOKEN_CACHE_KEY
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication keeping the token, with its user, in the cache for AUTH_CACHE_TIMEOUT seconds, so repeated
+    requests don't join authtoken_token to user_profiles.
+    Entries are dropped when the token is deleted (refresh_token) or its user is saved.
+    """
+    def authenticate_credentials(self, key):
+        cache_key = AUTH_TOKEN_CACHE_KEY.format(key)
+        token = cache.get(cache_key)
+        if token is None:
+            _, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.AUTH_CACHE_TIMEOUT)
+
+        return token.user, token
+
+
+def invalidate_tokens(*keys):
+    cache.delete_many([AUTH_TOKEN_CACHE_KEY.format(key) for key in keys])
@@ -1 +1,3 @@
 USER_OBJECT_TYPE = 'User'
+AUTH_TOKEN_CACHE_KEY = 'auth_token:{}'
+USER_ORGANIZATION_IDS_CACHE_KEY = 'user_organization_ids:{}'
@@ -1,12 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
 from rest_framework.authtoken.models import Token
 
 from core.common.mixins import SourceContainerMixin
 from core.common.models import BaseModel
-from .constants import USER_OBJECT_TYPE
+from .constants import USER_OBJECT_TYPE, USER_ORGANIZATION_IDS_CACHE_KEY
 
 
 class UserProfile(AbstractUser, BaseModel, SourceContainerMixin):
@@ -40,6 +43,24 @@ class UserProfile(AbstractUser, BaseModel, SourceContainerMixin):
     def get_url_kwarg():
         return 'user'
 
+    @cached_property
+    def organization_ids(self):
+        """
+        Read once per user instance, so once per request for request.user, from the cache shared across requests,
+        which membership changes invalidate.
+        """
+        cache_key = USER_ORGANIZATION_IDS_CACHE_KEY.format(self.id)
+        organization_ids = cache.get(cache_key)
+        if organization_ids is None:
+            organization_ids = list(self.organizations.values_list('id', flat=True))
+            cache.set(cache_key, organization_ids, settings.AUTH_CACHE_TIMEOUT)
+
+        return organization_ids
+
+    @staticmethod
+    def invalidate_organization_ids(*user_ids):
+        cache.delete_many([USER_ORGANIZATION_IDS_CACHE_KEY.format(user_id) for user_id in user_ids])
+
     @property
     def organizations_url(self):
         return reverse('userprofile-orgs', kwargs={'user': self.mnemonic})
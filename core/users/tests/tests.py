@@ -115,3 +115,28 @@ class UserProfileTest(OCLTestCase):
 
         self.assertIsNotNone(user.id)
         self.assertEqual(user.internal_reference_id, str(user.id))
+
+    def test_cached_token_authentication(self):
+        from rest_framework.authtoken.models import Token
+        from rest_framework.exceptions import AuthenticationFailed
+        from core.users.authentication import CachedTokenAuthentication
+        user = UserProfileFactory()
+        user.refresh_token()
+        key = Token.objects.get(user=user).key
+        authentication = CachedTokenAuthentication()
+
+        self.assertEqual(authentication.authenticate_credentials(key)[0], user)
+        with self.assertNumQueries(0):
+            self.assertEqual(authentication.authenticate_credentials(key)[0], user)
+
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(key)
+
+        user.is_active = True
+        user.save()
+        authentication.authenticate_credentials(key)
+        user.refresh_token()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(key)